@@ -0,0 +1,76 @@
+"""
+Benchmark the derivatives on regular lat-lon grids.
+
+Compares `grid_func.compute_gradient_and_laplacian_on_latlon` together with
+`grid_func.compute_hor_wind_conv_on_latlon` to the fused
+`grid_func.compute_derivatives_on_latlon` and reports the peak memory
+(traced with tracemalloc) and the throughput in time steps per second.
+
+Usage: python benchmark_latlon_derivatives.py [n_time] [resolution_deg]
+"""
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+import grid_func
+
+N_TIME = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+RESOLUTION = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+TROPICAL_BELT = (-30., 30.)
+
+
+def derivatives_separate(var, ua, va):
+    gradient, laplacian = grid_func.compute_gradient_and_laplacian_on_latlon(
+        var
+        )
+    absolute_gradient = grid_func.absolute_gradient(gradient)
+    convergence = grid_func.compute_hor_wind_conv_on_latlon(ua, va)
+    return gradient, absolute_gradient, laplacian, convergence
+
+
+def derivatives_fused(var, ua, va):
+    return grid_func.compute_derivatives_on_latlon(
+        var, ua, va, derivatives=grid_func.LATLON_DERIVATIVES
+        )
+
+
+def run(name, func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:>8s}: {elapsed:8.3f} s  {N_TIME/elapsed:8.2f} steps/s  "
+        f"peak {peak/2**20:10.1f} MiB"
+        )
+    return elapsed
+
+
+def get_field(rng, lats, lons):
+    return xr.DataArray(
+        rng.standard_normal((N_TIME, lats.size, lons.size)),
+        dims=('time', 'lat', 'lon'),
+        coords={'lat': lats, 'lon': lons},
+    )
+
+
+if __name__ == '__main__':
+    lats = np.arange(TROPICAL_BELT[0], TROPICAL_BELT[1] + RESOLUTION, RESOLUTION)
+    lons = np.arange(0., 360., RESOLUTION)
+    rng = np.random.default_rng(42)
+    var, ua, va = (get_field(rng, lats, lons) for _ in range(3))
+
+    print(
+        f"{N_TIME} time steps on {lats.size} x {lons.size} lat-lon grid "
+        f"({var.nbytes/2**20:.1f} MiB per field)"
+        )
+    t_separate = run('separate', derivatives_separate, var, ua, va)
+    t_fused = run('fused', derivatives_fused, var, ua, va)
+    print(f"speed-up: {t_separate/t_fused:.1f}x")
@@ -0,0 +1,92 @@
+"""
+Benchmark the construction of circular MCS trigger areas.
+
+Compares the per-track, per-radius `hp.query_disc` loop with the batched
+engine used by `mcs_utils.add_circular_trigger_areas` (exact and stencil
+method) and reports the throughput in tracks per second.
+
+Usage: python benchmark_trigger_areas.py [n_tracks] [zoom]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import healpy as hp
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+import mcs_utils
+
+N_TRACKS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+ZOOM = int(sys.argv[2]) if len(sys.argv) > 2 else 9
+TROPICAL_BELT = (-15., 15.)
+RADII = np.arange(1.5, 0., -0.1)    # Radius around trigger location in degrees
+
+
+def trigger_areas_loop(nside, nest, cell_idxs, radii):
+    # Reference implementation: one disc query per track and radius
+    return [
+        [mcs_utils._get_trigger_area_idxs(nside, nest, cell_idx, radius)
+         for cell_idx in cell_idxs]
+        for radius in radii
+        ]
+
+
+def trigger_areas_batch(nside, nest, cell_idxs, radii):
+    # Use an empty cache so that every distinct trigger cell is computed
+    return mcs_utils._get_trigger_area_idxs_batch(
+        nside, nest, cell_idxs, radii, mcs_utils.TriggerAreaCache()
+        )
+
+
+def trigger_areas_stencil(nside, nest, cell_idxs, radii):
+    return mcs_utils._get_trigger_area_idxs_stencil(
+        nside, nest, cell_idxs, radii, mcs_utils.TriggerAreaCache()
+        )
+
+
+def trigger_areas_cached(nside, nest, cell_idxs, radii, cache):
+    return mcs_utils._get_trigger_area_idxs_batch(
+        nside, nest, cell_idxs, radii, cache
+        )
+
+
+def run(name, func, *args):
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>7s}: {elapsed:8.3f} s  {N_TRACKS/elapsed:12.1f} tracks/s"
+        )
+    return elapsed
+
+
+if __name__ == '__main__':
+    nside = 2**ZOOM
+    rng = np.random.default_rng(42)
+    cell_idxs = hp.ang2pix(
+        nside,
+        rng.uniform(0., 360., N_TRACKS),
+        rng.uniform(*TROPICAL_BELT, N_TRACKS),
+        nest=True, lonlat=True,
+        )
+
+    print(
+        f"{N_TRACKS} tracks, zoom {ZOOM}, {RADII.size} radii up to "
+        f"{RADII.max():.1f} degree"
+        )
+    t_loop = run('loop', trigger_areas_loop, nside, True, cell_idxs, RADII)
+    t_batch = run('batch', trigger_areas_batch, nside, True, cell_idxs, RADII)
+    print(f"speed-up: {t_loop/t_batch:.1f}x")
+    t_stencil = run(
+        'stencil', trigger_areas_stencil, nside, True, cell_idxs, RADII
+        )
+    print(f"speed-up: {t_loop/t_stencil:.1f}x")
+
+    # Second run over the same trigger cells with a warm cache
+    cache = mcs_utils.TriggerAreaCache()
+    trigger_areas_cached(nside, True, cell_idxs, RADII, cache)
+    t_cached = run(
+        'cached', trigger_areas_cached, nside, True, cell_idxs, RADII, cache
+        )
+    print(f"speed-up: {t_loop/t_cached:.1f}x  cache: {cache.info()}")
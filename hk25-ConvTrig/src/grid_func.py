@@ -1,8 +1,11 @@
+from functools import lru_cache
 from pathlib import Path
+from typing import NamedTuple, Optional
 import xarray as xr
 import numpy as np
 import healpix as hp
 import easygems.healpix as egh
+from scipy import sparse
 
 from constants import EARTH_RADIUS
 
@@ -49,7 +52,11 @@ def _nest2ring_index(var: xr.DataArray, nside: int) -> np.ndarray:
     numpy.ndarray
         An array of ring indices corresponding to the nested indices.
     """
-    return np.array([hp.ring2nest(nside, i) for i in var.cell.values])
+    permutation = _get_ring2nest_permutation(nside)
+    cells = var.cell.values
+    if _is_global_grid(cells, nside):
+        return permutation
+    return permutation[cells]
 
 
 def _ring2nest_index(var: xr.DataArray, nside: int) -> np.ndarray:
@@ -69,7 +76,125 @@ def _ring2nest_index(var: xr.DataArray, nside: int) -> np.ndarray:
     numpy.ndarray
         An array of nested indices corresponding to the ring indices.
     """
-    return np.array([hp.nest2ring(nside, i) for i in np.arange(len(var))])
+    permutation = _get_nest2ring_permutation(nside)
+    if len(var) == permutation.size:
+        return permutation
+    return permutation[:len(var)]
+
+
+@lru_cache(maxsize=None)
+def _get_ring2nest_permutation(nside: int) -> np.ndarray:
+    """
+    Nested index of every ring index of the HEALPix map with the given nside.
+
+    The permutation is computed once per nside and cached. It is returned 
+    read-only as it is shared by all callers.
+    """
+    permutation = hp.ring2nest(nside, np.arange(12*nside**2))
+    permutation.flags.writeable = False
+    return permutation
+
+
+@lru_cache(maxsize=None)
+def _get_nest2ring_permutation(nside: int) -> np.ndarray:
+    """
+    Ring index of every nested index of the HEALPix map with the given nside.
+
+    The permutation is computed once per nside and cached. It is returned 
+    read-only as it is shared by all callers.
+    """
+    permutation = hp.nest2ring(nside, np.arange(12*nside**2))
+    permutation.flags.writeable = False
+    return permutation
+
+
+def _is_global_grid(cells: np.ndarray, nside: int) -> bool:
+    """
+    Check whether the cell indices cover the whole HEALPix map in order.
+    """
+    return cells.size == 12*nside**2 and \
+        np.array_equal(cells, np.arange(cells.size))
+
+
+# Offsets of the neighbours (SW, W, NW, N, NE, E, SE, S) in the (x, y) 
+# coordinates of a base face, and the base face and coordinate flips of 
+# neighbours that lie on an adjacent base face, as in the HEALPix C++ library
+_NEIGHBOUR_X_OFFSET = np.array([-1, -1, 0, 1, 1, 1, 0, -1])
+_NEIGHBOUR_Y_OFFSET = np.array([0, 1, 1, 1, 0, -1, -1, -1])
+_NEIGHBOUR_FACES = np.array([
+    [8, 9, 10, 11, -1, -1, -1, -1, 10, 11, 8, 9],   # S
+    [5, 6, 7, 4, 8, 9, 10, 11, 9, 10, 11, 8],       # SE
+    [-1, -1, -1, -1, 5, 6, 7, 4, -1, -1, -1, -1],   # E
+    [4, 5, 6, 7, 11, 8, 9, 10, 11, 8, 9, 10],       # SW
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11],         # center
+    [1, 2, 3, 0, 0, 1, 2, 3, 5, 6, 7, 4],           # NE
+    [-1, -1, -1, -1, 7, 4, 5, 6, -1, -1, -1, -1],   # W
+    [3, 0, 1, 2, 3, 0, 1, 2, 4, 5, 6, 7],           # NW
+    [2, 3, 0, 1, -1, -1, -1, -1, 0, 1, 2, 3],       # N
+    ])
+_NEIGHBOUR_SWAPS = np.array([
+    [0, 0, 3], [0, 0, 6], [0, 0, 0], [0, 0, 5], [0, 0, 0],
+    [5, 0, 0], [0, 0, 0], [6, 0, 0], [3, 0, 0],
+    ])
+
+
+def _get_all_neighbours(
+        nside: int,
+        cells: np.ndarray,
+        nest: bool = True,
+        ) -> np.ndarray:
+    """
+    Get the 8 neighbours (SW, W, NW, N, NE, E, SE, S) of HEALPix cells.
+
+    Equivalent to `healpy.get_all_neighbours`: returns an array of shape 
+    (8, cells.size), which is -1 where a cell has only 7 neighbours.
+    """
+    cells = np.asarray(cells, dtype=np.int64)
+    if not nest:
+        cells = hp.ring2nest(nside, cells)
+    order = int(nside).bit_length() - 1
+
+    # Coordinates of the cells and their neighbours on the base faces
+    face = cells >> (2*order)
+    x = _compact_bits(cells, order)[np.newaxis, :] + \
+        _NEIGHBOUR_X_OFFSET[:, np.newaxis]
+    y = _compact_bits(cells >> 1, order)[np.newaxis, :] + \
+        _NEIGHBOUR_Y_OFFSET[:, np.newaxis]
+
+    # Neighbours beyond the edge of the base face of the cell
+    direction = 4 + (x >= nside).astype(int) - (x < 0) + \
+        3*((y >= nside).astype(int) - (y < 0))
+    x, y = x % nside, y % nside
+    neighbour_face = _NEIGHBOUR_FACES[direction, face]
+    swaps = _NEIGHBOUR_SWAPS[direction, face >> 2]
+    x = np.where(swaps & 1, nside - x - 1, x)
+    y = np.where(swaps & 2, nside - y - 1, y)
+    x, y = np.where(swaps & 4, y, x), np.where(swaps & 4, x, y)
+
+    neighbours = (neighbour_face << (2*order)) + \
+        _spread_bits(x, order) + (_spread_bits(y, order) << 1)
+    is_neighbour = neighbour_face >= 0
+    if not nest:
+        neighbours[is_neighbour] = hp.nest2ring(
+            nside, neighbours[is_neighbour]
+            )
+    return np.where(is_neighbour, neighbours, -1)
+
+
+def _compact_bits(values: np.ndarray, order: int) -> np.ndarray:
+    """Collect the even bits of the lowest 2*order bits of values."""
+    result = np.zeros_like(values)
+    for bit in range(order):
+        result |= ((values >> (2*bit)) & 1) << bit
+    return result
+
+
+def _spread_bits(values: np.ndarray, order: int) -> np.ndarray:
+    """Spread the lowest order bits of values to the even bits."""
+    result = np.zeros_like(values)
+    for bit in range(order):
+        result |= ((values >> bit) & 1) << (2*bit)
+    return result
 
 
 # ------------------------------------------------------------------------------
@@ -104,14 +229,146 @@ def remap_nn_hp2latlon(
     xr.DataArray
         The remapped data array on a regular or rectilinear latitude-longitude
         grid.
+
+    Notes
+    -----
+    The remapping index is cached for the most recently used grids (see 
+    `Remapper`), so repeated calls for the same target grid only gather.
     """
-    idx = _get_nn_lon_lat_index(
-        egh.get_nside(var_hp),
-        np.linspace(lons[0], lons[1], lons[2]*supersampling['lon']),
-        np.linspace(lats[0], lats[1], lats[2]*supersampling['lat'])
-    )
-    return var_hp.drop(['lat', 'lon']).isel(cell=idx).coarsen(
-        supersampling).mean(skipna=False)
+    remapper = _get_remapper(
+        egh.get_nside(var_hp), tuple(lats), tuple(lons),
+        supersampling['lon'], supersampling['lat'],
+        )
+    return remapper(var_hp)
+
+
+class Remapper:
+    """
+    Reusable nearest neighbor remapping from a (nested) HEALPix grid to a 
+    regular or rectilinear latitude-longitude grid.
+
+    The nearest neighbor index of the (supersampled) target grid is computed
+    once and then applied to any number of variables and time steps. It can
+    be saved to and loaded from NetCDF to reuse it across runs.
+
+    Parameters
+    ----------
+    nside : int
+        The nside parameter of the HEALPix grid.
+    lats : tuple[int, int, int]
+        A tuple specifying the latitude range and resolution as
+        (start, end, num_points).
+    lons : tuple[int, int, int]
+        A tuple specifying the longitude range and resolution as
+        (start, end, num_points).
+    supersampling : dict, optional
+        A dictionary specifying the supersampling factors for longitude and
+        latitude. Default is {"lon": 1, "lat": 1}.
+
+    Examples
+    --------
+    >>> remapper = Remapper(nside, (-30, 30, 61), (0, 359, 360))
+    >>> pr_latlon = remapper(ds['pr'])
+    >>> remapper.save('remap_index.nc')
+    >>> remapper = Remapper.load('remap_index.nc')
+    """
+    def __init__(
+            self,
+            nside: int,
+            lats: tuple[int, int, int],
+            lons: tuple[int, int, int],
+            supersampling: dict={"lon": 1, "lat": 1},
+            ):
+        self.nside = nside
+        self.lats = tuple(lats)
+        self.lons = tuple(lons)
+        self.supersampling = {
+            "lon": supersampling["lon"], "lat": supersampling["lat"]
+            }
+        self.index = _get_nn_lon_lat_index(
+            nside,
+            np.linspace(lons[0], lons[1], lons[2]*supersampling['lon']),
+            np.linspace(lats[0], lats[1], lats[2]*supersampling['lat'])
+        )
+
+    def __call__(self, var_hp: xr.DataArray) -> xr.DataArray:
+        """
+        Remap a variable with a 'cell' dimension and any further dimensions
+        (e.g. time, level).
+
+        All cells are gathered in a single indexing operation. For 
+        dask-backed variables, the gather is done lazily per chunk of the
+        other dimensions, without rechunking the 'cell' dimension.
+        """
+        remapped = var_hp.drop_vars(
+            ['lat', 'lon'], errors='ignore'
+            ).isel(cell=self.index)
+        if self.supersampling["lon"] == 1 and self.supersampling["lat"] == 1:
+            return remapped
+        # np.mean propagates NaN like mean(skipna=False), which coarsen no
+        # longer accepts in recent xarray versions
+        return remapped.coarsen(self.supersampling).reduce(np.mean)
+
+    def save(self, path: Path):
+        """
+        Save the remapping index to NetCDF.
+
+        Parameters
+        ----------
+        path : str or Path
+            The output path.
+        """
+        self.index.to_dataset(name='cell_index').assign_attrs(
+            healpix_nside=self.nside,
+            lats=list(self.lats),
+            lons=list(self.lons),
+            supersampling_lon=self.supersampling["lon"],
+            supersampling_lat=self.supersampling["lat"],
+        ).to_netcdf(path)
+
+    @classmethod
+    def load(cls, path: Path) -> 'Remapper':
+        """
+        Load a remapping index written by `save`.
+
+        Parameters
+        ----------
+        path : str or Path
+            The input path.
+
+        Returns
+        -------
+        Remapper
+            The remapper, without recomputing the index.
+        """
+        with xr.open_dataset(path) as remap_file:
+            remap_file = remap_file.load()
+        remapper = cls.__new__(cls)
+        remapper.nside = int(remap_file.attrs['healpix_nside'])
+        remapper.lats = tuple(np.atleast_1d(remap_file.attrs['lats']).tolist())
+        remapper.lons = tuple(np.atleast_1d(remap_file.attrs['lons']).tolist())
+        remapper.supersampling = {
+            "lon": int(remap_file.attrs['supersampling_lon']),
+            "lat": int(remap_file.attrs['supersampling_lat']),
+            }
+        remapper.index = remap_file['cell_index']
+        return remapper
+
+
+@lru_cache(maxsize=16)
+def _get_remapper(
+        nside: int,
+        lats: tuple[int, int, int],
+        lons: tuple[int, int, int],
+        supersampling_lon: int,
+        supersampling_lat: int,
+        ) -> Remapper:
+    """
+    Get the (cached) remapper for the given HEALPix and lat-lon grids.
+    """
+    return Remapper(
+        nside, lats, lons, {"lon": supersampling_lon, "lat": supersampling_lat}
+        )
 
 
 def _get_nn_lon_lat_index(
@@ -205,6 +462,14 @@ def compute_laplacian_on_latlon(var: xr.DataArray) -> xr.DataArray:
     -------
     xr.DataArray
         The cartesian Laplacian of the input variable.
+
+    Notes
+    -----
+    The Laplacian on the sphere of radius R with latitude phi and longitude
+    lambda,
+        (d2f/dphi2 - tan(phi) df/dphi + 1/cos(phi)**2 d2f/dlambda2)/R**2,
+    e.g. -2 sin(phi)/R**2 for f = sin(phi). `compute_laplacian_on_hp` 
+    uses the same convention.
     """
     var = _deg2rad_coordinates(var)
     dvar_dphi, dvar_dlambda = _compute_hder_on_latlon(var)
@@ -304,12 +569,13 @@ def _compute_laplacian_on_latlon(
     Returns
     -------
     xr.DataArray
-        The cartesian Laplacian of the input variable.
+        The cartesian Laplacian of the input variable, see 
+        `compute_laplacian_on_latlon`.
     """
     d2var_dphi2 = dvar_dphi.differentiate('lon_rad') * 1/np.cos(var['lat_rad'])
     d2var_dlambda2 = dvar_dlambda.differentiate('lat_rad')
     dvar_dtheta_tanlat = dvar_dlambda * np.tan(var['lat_rad'])
-    return -(d2var_dlambda2 + dvar_dtheta_tanlat - d2var_dphi2)/\
+    return (d2var_dlambda2 - dvar_dtheta_tanlat + d2var_dphi2)/\
         (EARTH_RADIUS**2)
 
 
@@ -342,6 +608,145 @@ def compute_hor_wind_conv_on_latlon(
     return convergence
 
 
+LATLON_DERIVATIVES = ('dx', 'dy', 'abs_gradient', 'laplacian', 'convergence')
+
+
+def compute_derivatives_on_latlon(
+        var: Optional[xr.DataArray] = None,
+        ua: Optional[xr.DataArray] = None,
+        va: Optional[xr.DataArray] = None,
+        derivatives: tuple[str, ...] = ('dx', 'dy'),
+        ) -> dict[str, xr.DataArray]:
+    """
+    Computes any subset of the cartesian gradient components, the absolute
+    gradient, the cartesian Laplacian and the horizontal wind convergence on
+    regular or rectilinear lat-lon grids in a single pass.
+
+    The results are the same as those of `compute_gradient_on_latlon`, 
+    `compute_laplacian_on_latlon` and `compute_hor_wind_conv_on_latlon`, but
+    the metric factors are computed once per latitude and the derivatives 
+    are shared between the requested quantities, which avoids most of the 
+    full-size temporaries.
+
+    Parameters
+    ----------
+    var : xr.DataArray, optional
+        The input data array on a regular or rectilinear lat-lon grid. 
+        Required for 'dx', 'dy', 'abs_gradient' and 'laplacian'.
+    ua, va : xr.DataArray, optional
+        The zonal and meridional wind on the same grid. Required for 
+        'convergence'.
+    derivatives : tuple[str, ...], optional
+        The quantities to compute, any of `LATLON_DERIVATIVES`. Default is
+        ('dx', 'dy').
+
+    Returns
+    -------
+    dict[str, xr.DataArray]
+        The requested quantities by name.
+
+    Notes
+    -----
+    Dask-backed arrays are processed lazily chunk by chunk; they must have a
+    single chunk along 'lat' and 'lon'.
+    """
+    unknown = set(derivatives) - set(LATLON_DERIVATIVES)
+    if unknown:
+        raise ValueError(
+            f"Unknown derivatives {sorted(unknown)}, must be any of "
+            f"{LATLON_DERIVATIVES}"
+            )
+    scalar_derivatives = [d for d in derivatives if d != 'convergence']
+    if scalar_derivatives and var is None:
+        raise ValueError(f"var is required to compute {scalar_derivatives}")
+    if 'convergence' in derivatives and (ua is None or va is None):
+        raise ValueError("ua and va are required to compute 'convergence'")
+
+    results = {}
+    if scalar_derivatives:
+        outputs = xr.apply_ufunc(
+            _latlon_scalar_derivatives_kernel,
+            var, np.deg2rad(var['lat']), np.deg2rad(var['lon']),
+            kwargs={'derivatives': tuple(scalar_derivatives)},
+            input_core_dims=[['lat', 'lon'], ['lat'], ['lon']],
+            output_core_dims=[['lat', 'lon']]*len(scalar_derivatives),
+            dask='parallelized',
+            output_dtypes=[np.float64]*len(scalar_derivatives),
+        )
+        if len(scalar_derivatives) == 1:
+            outputs = (outputs,)
+        results.update(zip(scalar_derivatives, outputs))
+    if 'convergence' in derivatives:
+        results['convergence'] = xr.apply_ufunc(
+            _latlon_convergence_kernel,
+            ua, va, np.deg2rad(ua['lat']), np.deg2rad(ua['lon']),
+            input_core_dims=[['lat', 'lon'], ['lat', 'lon'], ['lat'], ['lon']],
+            output_core_dims=[['lat', 'lon']],
+            dask='parallelized',
+            output_dtypes=[np.float64],
+        )
+    return {name: results[name] for name in derivatives}
+
+
+def _latlon_scalar_derivatives_kernel(
+        values: np.ndarray,
+        lat_rad: np.ndarray,
+        lon_rad: np.ndarray,
+        derivatives: tuple[str, ...],
+        ) -> tuple[np.ndarray, ...]:
+    """
+    Fused kernel of `compute_derivatives_on_latlon` for a scalar field with
+    (lat, lon) as the last two axes.
+    """
+    inv_cos_lat = (1/np.cos(lat_rad))[:, np.newaxis]
+
+    # Spherical horizontal derivatives, see `_compute_hder_on_latlon`
+    dvar_dphi = np.gradient(values, lon_rad, axis=-1, edge_order=1)
+    dvar_dphi *= inv_cos_lat
+    dvar_dlambda = np.gradient(values, lat_rad, axis=-2, edge_order=1)
+
+    results = {}
+    if 'laplacian' in derivatives:
+        # See `_compute_laplacian_on_latlon`
+        laplacian = np.gradient(dvar_dlambda, lat_rad, axis=-2, edge_order=1)
+        laplacian -= dvar_dlambda*np.tan(lat_rad)[:, np.newaxis]
+        d2var_dphi2 = np.gradient(dvar_dphi, lon_rad, axis=-1, edge_order=1)
+        d2var_dphi2 *= inv_cos_lat
+        laplacian += d2var_dphi2
+        del d2var_dphi2
+        laplacian /= EARTH_RADIUS**2
+        results['laplacian'] = laplacian
+    if 'abs_gradient' in derivatives:
+        results['abs_gradient'] = np.hypot(dvar_dphi, dvar_dlambda)
+        results['abs_gradient'] /= EARTH_RADIUS
+    dvar_dphi /= EARTH_RADIUS
+    dvar_dlambda /= EARTH_RADIUS
+    results['dx'] = dvar_dphi
+    results['dy'] = dvar_dlambda
+    if len(derivatives) == 1:
+        # apply_ufunc expects a single array for a single output
+        return results[derivatives[0]]
+    return tuple(results[name] for name in derivatives)
+
+
+def _latlon_convergence_kernel(
+        ua: np.ndarray,
+        va: np.ndarray,
+        lat_rad: np.ndarray,
+        lon_rad: np.ndarray,
+        ) -> np.ndarray:
+    """
+    Fused kernel of `compute_derivatives_on_latlon` for the horizontal wind
+    convergence, see `compute_hor_wind_conv_on_latlon`.
+    """
+    convergence = np.gradient(ua, lon_rad, axis=-1, edge_order=1)
+    convergence *= (1/np.cos(lat_rad))[:, np.newaxis]
+    convergence += np.gradient(va, lat_rad, axis=-2, edge_order=1)
+    convergence -= va*np.tan(lat_rad)[:, np.newaxis]
+    convergence *= -1/EARTH_RADIUS
+    return convergence
+
+
 def _deg2rad_coordinates(var_latlon: xr.DataArray) -> xr.DataArray:
     """
     Converts the coordinates of a variable from degrees to radians.
@@ -362,6 +767,342 @@ def _deg2rad_coordinates(var_latlon: xr.DataArray) -> xr.DataArray:
         })
 
 
+# ------------------------------------------------------------------------------
+# Derivatives on the HEALPix grid
+# -------------------------------
+class HpOperators(NamedTuple):
+    """
+    Finite-difference operators on the cells of a HEALPix grid.
+
+    Each operator is a sparse (cell x cell) matrix acting on the values of a 
+    field in the order of the cells it was built for (see 
+    `get_hp_operators`).
+    """
+    ddx: sparse.csr_matrix          # Derivative eastwards [1/m]
+    ddy: sparse.csr_matrix          # Derivative northwards [1/m]
+    laplacian: sparse.csr_matrix    # Laplacian [1/m^2]
+    tan_lat: np.ndarray             # Tangent of the latitude of the cells
+
+
+def compute_gradient_on_hp(
+        var: xr.DataArray
+        ) -> tuple[xr.DataArray, xr.DataArray]:
+    """
+    Computes the cartesian gradient of a variable directly on the HEALPix 
+    grid.
+
+    Parameters
+    ----------
+    var : xr.DataArray
+        The input data array with a 'cell' dimension on a HEALPix grid. It 
+        may cover a subset of the cells and have any further dimensions. 
+        Dask arrays must have a single chunk along 'cell'.
+
+    Returns
+    -------
+    tuple[xr.DataArray, xr.DataArray]
+        A tuple containing:
+        - dvar_dx: Cartesian gradient of the variable in the longitude direction.
+        - dvar_dy: Cartesian gradient of the variable in the latitude direction.
+    """
+    operators = _get_hp_operators_of_var(var)
+    return (
+        _apply_hp_operator(operators.ddx, var),
+        _apply_hp_operator(operators.ddy, var),
+        )
+
+
+def compute_laplacian_on_hp(var: xr.DataArray) -> xr.DataArray:
+    """
+    Computes the Laplacian of a variable directly on the HEALPix grid.
+
+    Parameters
+    ----------
+    var : xr.DataArray
+        The input data array with a 'cell' dimension on a HEALPix grid. It 
+        may cover a subset of the cells and have any further dimensions. 
+        Dask arrays must have a single chunk along 'cell'.
+
+    Returns
+    -------
+    xr.DataArray
+        The Laplacian of the input variable.
+
+    Notes
+    -----
+    The same convention as `compute_laplacian_on_latlon`: the Laplacian on
+    the sphere, e.g. -2 sin(phi)/R**2 for f = sin(phi) at latitude phi.
+    """
+    operators = _get_hp_operators_of_var(var)
+    return _apply_hp_operator(operators.laplacian, var)
+
+
+def compute_gradient_and_laplacian_on_hp(
+        var: xr.DataArray
+        ) -> tuple[tuple[xr.DataArray, xr.DataArray], xr.DataArray]:
+    """
+    Computes both the cartesian gradient and the Laplacian of a variable 
+    directly on the HEALPix grid.
+
+    Parameters
+    ----------
+    var : xr.DataArray
+        The input data array with a 'cell' dimension on a HEALPix grid. It 
+        may cover a subset of the cells and have any further dimensions. 
+        Dask arrays must have a single chunk along 'cell'.
+
+    Returns
+    -------
+    tuple[tuple[xr.DataArray, xr.DataArray], xr.DataArray]
+        A tuple containing:
+        - gradient: A tuple with the cartesian gradient components
+                    (dvar_dx, dvar_dy).
+        - laplacian: The Laplacian of the input variable.
+    """
+    return compute_gradient_on_hp(var), compute_laplacian_on_hp(var)
+
+
+def compute_hor_wind_conv_on_hp(
+        ua: xr.DataArray,
+        va: xr.DataArray,
+        ) -> xr.DataArray:
+    """
+    Computes the horizontal wind convergence directly on the HEALPix grid.
+
+    Parameters
+    ----------
+    ua : xr.DataArray
+        The eastward wind with a 'cell' dimension on a HEALPix grid. Dask 
+        arrays must have a single chunk along 'cell'.
+    va : xr.DataArray
+        The northward wind on the same cells as ua.
+
+    Returns
+    -------
+    xr.DataArray
+        The horizontal wind convergence.
+    """
+    operators = _get_hp_operators_of_var(ua)
+    tan_lat = xr.DataArray(operators.tan_lat, dims='cell')
+    dua_dx = _apply_hp_operator(operators.ddx, ua)
+    dva_dy = _apply_hp_operator(operators.ddy, va)
+    return -(dua_dx + dva_dy - va*tan_lat/EARTH_RADIUS)
+
+
+def get_hp_operators(
+        nside: int,
+        nest: bool = True,
+        cells: Optional[np.ndarray] = None,
+        ) -> HpOperators:
+    """
+    Get the finite-difference operators of a HEALPix grid.
+
+    The derivatives at a cell are obtained from a least-squares fit of a 
+    quadratic polynomial to the values at the cell and its (up to 8) 
+    neighbours, in the gnomonic projection onto the tangent plane of the 
+    cell. As the metric of this projection is Euclidean to second order at
+    the tangent point, the fitted first and second derivatives give the 
+    gradient and the Laplacian on the sphere. Only the operators of the 
+    most recently used grid are cached, as they take several GB at high 
+    zoom levels.
+
+    Parameters
+    ----------
+    nside : int
+        The nside parameter of the HEALPix grid.
+    nest : bool, optional
+        Whether the cells are in nested (default) or ring ordering.
+    cells : np.ndarray, optional
+        Cell indices the field is given on, by default all cells in order. 
+        Cells with a neighbour outside of the subset get NaN derivatives.
+
+    Returns
+    -------
+    HpOperators
+        The gradient and Laplacian operators on the cells.
+    """
+    if cells is None:
+        return _get_hp_operators(nside, nest, None)
+    cells = np.asarray(cells, dtype=np.int64)
+    return _get_hp_operators(nside, nest, _HashableCells(cells))
+
+
+class _HashableCells:
+    """Wrapper to use an array of cell indices as a cache key."""
+    def __init__(self, cells: np.ndarray):
+        self.cells = cells
+        self._hash = hash(cells.tobytes())
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, _HashableCells) and \
+            np.array_equal(self.cells, other.cells)
+
+
+@lru_cache(maxsize=1)
+def _get_hp_operators(
+        nside: int,
+        nest: bool,
+        cells: Optional[_HashableCells],
+        ) -> HpOperators:
+    """
+    Build the finite-difference operators, see `get_hp_operators`.
+    """
+    if cells is None:
+        cells = np.arange(12*nside**2)
+    else:
+        cells = cells.cells
+    n_cells = cells.size
+
+    # Neighbours of every cell as positions in cells, -1 if a cell has only 7
+    # neighbours and -2 if the neighbour is not part of cells
+    neighbours = _get_all_neighbours(nside, cells, nest=nest).T
+    if n_cells == 12*nside**2 and np.array_equal(cells, np.arange(n_cells)):
+        neighbour_pos = neighbours
+    else:
+        sorter = np.argsort(cells)
+        pos = np.searchsorted(cells, neighbours, sorter=sorter).clip(
+            max=n_cells - 1
+            )
+        pos = sorter[pos]
+        neighbour_pos = np.where(
+            neighbours < 0, -1, np.where(cells[pos] == neighbours, pos, -2)
+            )
+    is_incomplete = np.any(neighbour_pos == -2, axis=1)
+
+    # Cell spacing, to keep the least-squares problem well conditioned
+    spacing = np.sqrt(4*np.pi/(12*nside**2))
+
+    data = {name: np.zeros((n_cells, 9)) for name in ('ddx', 'ddy', 'laplacian')}
+    tan_lat = np.zeros(n_cells)
+    block_size = 2**16
+    for start in range(0, n_cells, block_size):
+        block = slice(start, start + block_size)
+        weights, tan_lat[block] = _get_hp_stencil_weights(
+            nside, nest, cells[block], neighbours[block], spacing
+            )
+        # Weights of the fitted derivatives on the differences to the cell
+        ddx, ddy = weights[:, 0], weights[:, 1]
+        laplacian = weights[:, 2] + weights[:, 4]
+        for name, stencil, scale in (
+                ('ddx', ddx, spacing*EARTH_RADIUS),
+                ('ddy', ddy, spacing*EARTH_RADIUS),
+                ('laplacian', laplacian, (spacing*EARTH_RADIUS)**2),
+                ):
+            data[name][block, 1:] = stencil/scale
+            data[name][block, 0] = -stencil.sum(axis=1)/scale
+
+    # Cells at the edge of the subset have no complete stencil
+    for name in data:
+        data[name][is_incomplete, 0] = np.nan
+        data[name][:, 1:][neighbour_pos < 0] = 0.
+
+    rows = np.repeat(np.arange(n_cells), 9)
+    cols = np.concatenate(
+        [np.arange(n_cells)[:, np.newaxis], neighbour_pos], axis=1
+        )
+    cols = np.where(cols < 0, rows.reshape(n_cells, 9), cols).ravel()
+    operators = {
+        name: sparse.csr_matrix(
+            (values.ravel(), (rows, cols)), shape=(n_cells, n_cells)
+            )
+        for name, values in data.items()
+        }
+    return HpOperators(tan_lat=tan_lat, **operators)
+
+
+def _get_hp_stencil_weights(
+        nside: int,
+        nest: bool,
+        cells: np.ndarray,
+        neighbours: np.ndarray,
+        spacing: float,
+        ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Least-squares weights of the derivatives at the cells on the differences
+    of the neighbour values to the cell value.
+
+    Returns the weights (cell, [dx, dy, dxx, dxy, dyy], neighbour) in units 
+    of the cell spacing and the tangent of the latitude of the cells.
+    """
+    center = np.stack(hp.pix2vec(nside, cells, nest=nest), axis=-1)
+    neighbour_vec = np.stack(
+        hp.pix2vec(nside, neighbours.clip(min=0), nest=nest), axis=-1
+        )
+
+    # Local east and north unit vectors
+    lon = np.arctan2(center[:, 1], center[:, 0])
+    sin_lat = center[:, 2]
+    cos_lat = np.sqrt(1. - sin_lat**2)
+    east = np.stack([-np.sin(lon), np.cos(lon), np.zeros_like(lon)], axis=-1)
+    north = np.stack(
+        [-sin_lat*np.cos(lon), -sin_lat*np.sin(lon), cos_lat], axis=-1
+        )
+
+    # Gnomonic projection of the neighbours onto the tangent plane
+    projected = neighbour_vec/np.einsum(
+        'nkj,nj->nk', neighbour_vec, center
+        )[..., np.newaxis]
+    x = np.einsum('nkj,nj->nk', projected, east)/spacing
+    y = np.einsum('nkj,nj->nk', projected, north)/spacing
+
+    # Quadratic fit f - f_0 = a x + b y + c x^2/2 + d x y + e y^2/2
+    design = np.stack([x, y, x**2/2, x*y, y**2/2], axis=-1)
+    design[neighbours < 0] = 0.
+    design_t = design.transpose(0, 2, 1)
+    weights = np.linalg.solve(design_t @ design, design_t)
+    return weights, sin_lat/cos_lat
+
+
+def _get_hp_operators_of_var(var: xr.DataArray) -> HpOperators:
+    """
+    Get the finite-difference operators for the cells of a variable.
+    """
+    cells = var['cell'].values
+    nside = egh.get_nside(var)
+    nest = bool(egh.get_nest(var))
+    if _is_global_grid(cells, nside):
+        return get_hp_operators(nside, nest)
+    return get_hp_operators(nside, nest, cells)
+
+
+def _apply_hp_operator(
+        operator: sparse.csr_matrix,
+        var: xr.DataArray,
+        ) -> xr.DataArray:
+    """
+    Apply a HEALPix operator to a variable, batched over all dimensions 
+    other than 'cell'.
+
+    Raises
+    ------
+    ValueError
+        If the variable is a dask array with more than one chunk along 
+        'cell', as the stencils of the cells at the chunk borders reach 
+        into the neighbouring chunks.
+    """
+    if var.chunks is not None and len(var.chunksizes['cell']) > 1:
+        raise ValueError(
+            "The derivatives on the HEALPix grid need a single chunk along "
+            "'cell', please rechunk with var.chunk(cell=-1)."
+            )
+
+    def _apply(values):
+        shape = values.shape
+        values = values.reshape(-1, shape[-1])
+        return np.asarray(operator @ values.T).T.reshape(shape)
+
+    return xr.apply_ufunc(
+        _apply, var,
+        input_core_dims=[['cell']],
+        output_core_dims=[['cell']],
+        dask='parallelized',
+        output_dtypes=[np.float64],
+    )
+
+
 # ------------------------------------------------------------------------------
 # Helper functions
 # ------------------------------------------------------------------------------
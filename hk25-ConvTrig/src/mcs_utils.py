@@ -2,7 +2,9 @@ import xarray as xr
 import numpy as np
 import healpy as hp
 import easygems.healpix as egh
-from typing import Tuple, Optional
+from collections import OrderedDict
+from pathlib import Path
+from typing import Tuple, Optional, Union
 
 MCS_TRACK_FILES = {
     "icon_ngc4008": \
@@ -15,6 +17,10 @@ MCS_TRACK_FILES = {
         "./../data/um_glm_n2560_RAL3p3/mcs_tracks_final_20200201.0000_20210301.0000.nc",
     }
 
+# Maximum number of time steps of a data field that are read at once when
+# extracting variables in the MCS trigger areas
+MAX_TIME_STEPS_PER_READ = 32
+
 # ------------------------------------------------------------------------------
 # Functions to determine triggering area of MCSs
 # ------------------------------------------------------------------------------
@@ -22,6 +28,8 @@ def add_circular_trigger_areas(
         mcs_trigger_locs: xr.DataArray,
         RADII: np.ndarray,
         hp_grid: str,
+        cache: Optional['TriggerAreaCache'] = None,
+        method: str = 'exact',
         ) -> xr.DataArray:
     """
     Add circular trigger areas to the MCS trigger locations.
@@ -43,45 +51,71 @@ def add_circular_trigger_areas(
     hp_grid : str
         String specifying the Healpix grid configuration. This is used to 
         determine the nside and nesting scheme of the grid.
+    cache : TriggerAreaCache, optional
+        Cache of trigger area geometries to reuse them across calls, e.g. 
+        the module-wide `TRIGGER_AREA_CACHE`. By default, the trigger areas 
+        are only shared within this call.
+    method : str, optional
+        'exact' (default) queries the disc around every distinct trigger 
+        cell. 'stencil' queries one disc per ring of the equatorial belt and 
+        translates it to all trigger cells of the ring, which is much faster 
+        for large numbers of trigger cells (see 
+        `_get_trigger_area_idxs_stencil`). Both give the same trigger areas.
 
     Returns
     -------
     xr.DataArray
-        Updated DataArray with an additional coordinate 'trigger_area_idxs', 
-        which contains the indices of the Healpix cells within the trigger 
-        areas for each radius in RADII.
+        Updated DataArray with the trigger areas stored in a compressed 
+        sparse row (CSR) layout:
+        - 'trigger_area_cells' ('trigger_area_cell'): Healpix cell indices of 
+            the largest trigger area of every distinct trigger cell, each 
+            sorted by increasing distance to the trigger cell.
+        - 'trigger_area_offsets' ('tracks'): Offset of the trigger area of 
+            each track in 'trigger_area_cells'.
+        - 'trigger_area_sizes' ('tracks', 'radius'): Number of cells of the 
+            trigger area of each track for each radius in RADII.
 
     Notes
     -----
     - The Healpix grid attributes (nside and nest) are determined using 
         helper functions from the `egh` module.
-    - The trigger areas are initialized and stored in a new coordinate 
-        'trigger_area_idxs', which is a 3D array with dimensions corresponding 
-        to the number of tracks, the maximum number of cells in any trigger 
-        area, and the number of radii in RADII.
+    - Because the cells are sorted by distance, the trigger area of a track 
+        for any radius is the first 'trigger_area_sizes' cells starting at 
+        'trigger_area_offsets' (see `_select_trigger_area_idxs`). Tracks that 
+        trigger in the same cell share their entries.
+    - The cells of a trigger area are therefore no longer in the (ascending)
+        order of `hp.query_disc`, and neither is the 'cell' dimension of 
+        `get_var_in_trigger_area`. The sets of cells are the same, so 
+        reductions over 'cell' (e.g. composite means) are unchanged.
+    - The trigger areas of all tracks and radii are computed in one batch, 
+        which queries the largest disc only once per distinct trigger cell 
+        (see `_get_trigger_area_idxs_batch`).
     """
     # Determine attributes of the healpix grid
     nside = egh.get_nside(hp_grid)
     nest = True if egh.get_nest(hp_grid) else False
 
-    for i, radius in enumerate(RADII):
-        # Get all pixels within radius around triggering location, i.e. get the
-        # 'triggering area'
-        trigger_area_idxs = [
-            _get_trigger_area_idxs(nside, nest, cell_idx, radius)
-            for cell_idx in mcs_trigger_locs['trigger_idx'].values
-            ]
-
-        if i == 0:
-            # Initialize data_array to save cell indices of the trigger area
-            mcs_trigger_locs['trigger_area_idxs'] = \
-                _init_trigger_area_idxs_array(
-                    mcs_trigger_locs['tracks'].values, trigger_area_idxs,
-                    RADII
-                    )
+    # Get all pixels within each radius around the triggering locations, i.e.
+    # get the 'triggering areas', for all tracks at once
+    if method == 'exact':
+        get_trigger_area_idxs = _get_trigger_area_idxs_batch
+    elif method == 'stencil':
+        get_trigger_area_idxs = _get_trigger_area_idxs_stencil
+    else:
+        raise ValueError(
+            f"Unknown method '{method}', must be 'exact' or 'stencil'"
+            )
+    cells, offsets, sizes = get_trigger_area_idxs(
+        nside, nest, mcs_trigger_locs['trigger_idx'].values, RADII, cache
+        )
 
-        for j, idxs in enumerate(trigger_area_idxs):
-            mcs_trigger_locs['trigger_area_idxs'][j, :idxs.shape[0], i] = idxs
+    # Save cell indices of the trigger areas
+    mcs_trigger_locs.update(
+        _init_trigger_area_csr(
+            mcs_trigger_locs['tracks'].values, cells, offsets, sizes, RADII,
+            nside, nest,
+            )
+        )
 
     return mcs_trigger_locs
 
@@ -116,48 +150,633 @@ def _get_trigger_area_idxs(
         inclusive=False, nest=nest,
     )
 
-def _init_trigger_area_idxs_array(
+def _get_trigger_area_idxs_batch(
+        nside: int,
+        nest: bool,
+        cell_idxs: np.ndarray,
+        radii_deg: np.ndarray,
+        cache: Optional['TriggerAreaCache'] = None,
+        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get the indices of the trigger areas for many cell indices and radii.
+
+    Every distinct trigger cell is queried only once with the largest radius.
+    The pixels of this disc are sorted by their angular distance to the
+    trigger cell, so that the trigger area of any smaller radius is a prefix
+    of the largest one. This reproduces `hp.query_disc(..., inclusive=False)`
+    (pixel centers within the radius) for every radius.
+
+    Parameters
+    ----------
+    nside : int
+        The nside parameter for the HEALPix map.
+    nest : bool
+        If True, use nested indexing. If False, use ring indexing.
+    cell_idxs : np.ndarray
+        The indices of the cells for which to get the trigger area indices.
+    radii_deg : np.ndarray
+        The radii in degrees for the trigger areas.
+    cache : TriggerAreaCache, optional
+        The cache of the largest trigger areas. By default, a temporary cache
+        that is only used for this call.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray, np.ndarray]
+        A tuple containing:
+        - cells: The concatenated, distance-sorted indices of the largest 
+            trigger area of every distinct cell in `cell_idxs`.
+        - offsets: The offset of the trigger area of each entry of 
+            `cell_idxs` in `cells`, shape (cell_idxs.size,).
+        - sizes: The number of cells of the trigger area of each entry of 
+            `cell_idxs` for each radius, shape (cell_idxs.size, radii.size).
+    """
+    if cache is None:
+        cache = TriggerAreaCache()
+    radii_deg = np.atleast_1d(np.asarray(radii_deg, dtype=float))
+    unique_cells, inverse = np.unique(
+        np.asarray(cell_idxs).astype(np.int64), return_inverse=True
+        )
+    cos_radii = np.cos(np.radians(radii_deg))
+    is_max_radius = radii_deg == radii_deg.max()
+
+    # Query the largest disc once per distinct trigger cell, sort its pixels
+    # by distance and count how many of them fall into each radius
+    discs = []
+    unique_sizes = np.zeros((unique_cells.size, radii_deg.size), dtype=np.int64)
+    for k, cell_idx in enumerate(unique_cells):
+        disc, cos_dist = cache.get(nside, nest, cell_idx, radii_deg.max())
+        discs.append(disc)
+        unique_sizes[k] = _count_trigger_area_sizes(
+            nside, nest, cell_idx, disc, cos_dist, cos_radii
+            )
+        unique_sizes[k, is_max_radius] = disc.size
+
+    unique_offsets = np.zeros(unique_cells.size, dtype=np.int64)
+    unique_offsets[1:] = np.cumsum([disc.size for disc in discs[:-1]])
+    cells = np.concatenate(discs) if discs else np.empty(0, dtype=np.int64)
+
+    # Tracks that trigger in the same cell share the same trigger area
+    inverse = inverse.ravel()
+    return (
+        cells.astype(_get_cell_dtype(nside)), unique_offsets[inverse],
+        unique_sizes[inverse],
+        )
+
+
+def _get_trigger_area_idxs_stencil(
+        nside: int,
+        nest: bool,
+        cell_idxs: np.ndarray,
+        radii_deg: np.ndarray,
+        cache: Optional['TriggerAreaCache'] = None,
+        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get the indices of the trigger areas for many cell indices and radii by
+    translating precomputed disc stencils.
+
+    In the ring scheme, all pixels of the equatorial belt (|z| <= 2/3) lie on
+    rings with 4*nside pixels each, and a rotation about the polar axis by a
+    multiple of the pixel spacing maps these rings onto themselves. The disc
+    around any pixel of a ring is therefore the disc around the first pixel
+    of that ring, shifted along all its rings by the position of the pixel.
+    The disc is computed once per ring (the stencil) and translated to all
+    cells of the ring. Cells whose disc reaches into the polar caps fall back
+    to an exact `hp.query_disc`.
+
+    Parameters and returns are the same as for `_get_trigger_area_idxs_batch`.
+    """
+    if cache is None:
+        cache = TriggerAreaCache()
+    radii_deg = np.atleast_1d(np.asarray(radii_deg, dtype=float))
+    unique_cells, inverse = np.unique(
+        np.asarray(cell_idxs).astype(np.int64), return_inverse=True
+        )
+    cos_radii = np.cos(np.radians(radii_deg))
+    is_max_radius = radii_deg == radii_deg.max()
+
+    # Ring number (1-based) and position within the ring of the cells in the
+    # equatorial belt
+    n_ring = 4*nside
+    n_cap = 2*nside*(nside - 1)
+    ring_idxs = hp.nest2ring(nside, unique_cells) if nest else unique_cells
+    is_equatorial = (ring_idxs >= n_cap) & \
+        (ring_idxs < hp.nside2npix(nside) - n_cap)
+    rings = np.where(is_equatorial, (ring_idxs - n_cap) // n_ring + nside, 0)
+    positions = (ring_idxs - n_cap) % n_ring
+
+    discs, unique_offsets = [], np.zeros(unique_cells.size, dtype=np.int64)
+    unique_sizes = np.zeros((unique_cells.size, radii_deg.size), dtype=np.int64)
+    n_disc_cells = 0
+    is_translated = np.zeros(unique_cells.size, dtype=bool)
+    for ring in np.unique(rings[is_equatorial]):
+        # Stencil: the (distance-sorted) disc around the first pixel of the
+        # ring in the ring scheme
+        ring_start = n_cap + (ring - nside)*n_ring
+        stencil, cos_dist = cache.get(nside, False, ring_start, radii_deg.max())
+        if np.any(stencil < n_cap) or \
+                np.any(stencil >= hp.nside2npix(nside) - n_cap):
+            continue
+
+        # Translate the stencil along its rings to all cells of the ring
+        members = np.flatnonzero(is_equatorial & (rings == ring))
+        stencil_ring_starts = n_cap + (stencil - n_cap) // n_ring * n_ring
+        ring_discs = stencil_ring_starts[np.newaxis, :] + (
+            stencil[np.newaxis, :] - stencil_ring_starts[np.newaxis, :] +
+            positions[members, np.newaxis]
+            ) % n_ring
+        if nest:
+            ring_discs = hp.ring2nest(nside, ring_discs)
+
+        discs.append(ring_discs.ravel())
+        unique_offsets[members] = n_disc_cells + \
+            np.arange(members.size)*stencil.size
+        unique_sizes[members] = _count_trigger_area_sizes(
+            nside, False, ring_start, stencil, cos_dist, cos_radii
+            )
+        unique_sizes[members[:, np.newaxis], np.flatnonzero(is_max_radius)] = \
+            stencil.size
+        n_disc_cells += ring_discs.size
+        is_translated[members] = True
+
+    # Exact query for the cells near the poles
+    for k in np.flatnonzero(~is_translated):
+        disc, cos_dist = cache.get(nside, nest, unique_cells[k], radii_deg.max())
+        discs.append(disc)
+        unique_offsets[k] = n_disc_cells
+        unique_sizes[k] = _count_trigger_area_sizes(
+            nside, nest, unique_cells[k], disc, cos_dist, cos_radii
+            )
+        unique_sizes[k, is_max_radius] = disc.size
+        n_disc_cells += disc.size
+
+    cells = np.concatenate(discs) if discs else np.empty(0, dtype=np.int64)
+
+    # Tracks that trigger in the same cell share the same trigger area
+    inverse = inverse.ravel()
+    return (
+        cells.astype(_get_cell_dtype(nside)), unique_offsets[inverse],
+        unique_sizes[inverse],
+        )
+
+
+def _get_sorted_trigger_area_idxs(
+        nside: int,
+        nest: bool,
+        cell_idx: int,
+        radius_deg: float,
+        ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the indices of the trigger area for a given cell index and radius,
+    sorted by increasing angular distance to the cell.
+
+    Parameters
+    ----------
+    nside : int
+        The nside parameter for the HEALPix map.
+    nest : bool
+        If True, use nested indexing. If False, use ring indexing.
+    cell_idx : int
+        The index of the cell for which to get the trigger area indices.
+    radius_deg : float
+        The radius in degrees for the trigger area.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        A tuple containing the sorted indices of the trigger area and the 
+        cosine of their angular distance to the cell.
+    """
+    disc = _get_trigger_area_idxs(nside, nest, cell_idx, radius_deg)
+    cos_dist = _get_cos_dist(nside, nest, cell_idx, disc)
+    order = np.argsort(-cos_dist, kind='stable')
+    return disc[order], cos_dist[order]
+
+
+def _get_cos_dist(
+        nside: int,
+        nest: bool,
+        cell_idx: int,
+        idxs: np.ndarray,
+        ) -> np.ndarray:
+    """
+    Get the cosine of the angular distance between the centers of the cells
+    `idxs` and the cell `cell_idx`.
+
+    The dot product is evaluated element-wise, so that the result for a cell
+    does not depend on the other cells in `idxs`.
+    """
+    x, y, z = hp.pix2vec(nside, idxs, nest=nest)
+    x0, y0, z0 = hp.pix2vec(nside, cell_idx, nest=nest)
+    return x*x0 + y*y0 + z*z0
+
+
+def _count_trigger_area_sizes(
+        nside: int,
+        nest: bool,
+        cell_idx: int,
+        disc: np.ndarray,
+        cos_dist: np.ndarray,
+        cos_radii: np.ndarray,
+        ) -> np.ndarray:
+    """
+    Count the cells of a distance-sorted trigger area within each radius.
+
+    The cached `cos_dist` is stored in single precision (see 
+    `TriggerAreaCache`). Cells whose distance is too close to a radius to 
+    decide in single precision are re-evaluated in double precision, so 
+    that the counts agree with `hp.query_disc` for every radius.
+
+    Parameters
+    ----------
+    nside : int
+        The nside parameter for the HEALPix map.
+    nest : bool
+        If True, use nested indexing. If False, use ring indexing.
+    cell_idx : int
+        The index of the cell at the center of the trigger area.
+    disc : np.ndarray
+        The indices of the trigger area, sorted by increasing distance.
+    cos_dist : np.ndarray
+        The cosine of the angular distance of `disc` to the cell.
+    cos_radii : np.ndarray
+        The cosine of the radii.
+
+    Returns
+    -------
+    np.ndarray
+        The number of cells within each radius, shape (cos_radii.size,).
+    """
+    if cos_dist.dtype == np.float64:
+        return np.count_nonzero(
+            cos_dist[:, np.newaxis] >= cos_radii[np.newaxis, :], axis=0
+            )
+
+    # As `cos_dist` is sorted, the cells of ambiguous distance lie between 
+    # the cells that are surely within and the cells that are possibly 
+    # within a radius
+    tol = np.finfo(cos_dist.dtype).eps
+    n_within = np.count_nonzero(
+        cos_dist[:, np.newaxis] >= cos_radii[np.newaxis, :] + tol, axis=0
+        )
+    n_possibly_within = np.count_nonzero(
+        cos_dist[:, np.newaxis] >= cos_radii[np.newaxis, :] - tol, axis=0
+        )
+    for i in np.flatnonzero(n_possibly_within > n_within):
+        ambiguous = disc[n_within[i]:n_possibly_within[i]]
+        n_within[i] += np.count_nonzero(
+            _get_cos_dist(nside, nest, cell_idx, ambiguous) >= cos_radii[i]
+            )
+    return n_within
+
+
+class TriggerAreaCache:
+    """
+    Bounded LRU cache of trigger area geometries.
+
+    The distance-sorted trigger area of a cell (see 
+    `_get_sorted_trigger_area_idxs`) is stored under the key 
+    (nside, nest, cell index, radius), so that MCSs that trigger in the same
+    cell, e.g. over a multi-year record, do not recompute it. The cache can 
+    be saved to and loaded from an npz file to reuse it across runs.
+
+    To save memory, the cell indices are stored with the smallest integer 
+    dtype of the grid (see `_get_cell_dtype`) and the cosine of their 
+    distance in single precision (see `_count_trigger_area_sizes`).
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Maximum memory of the cached trigger areas in bytes, by default 
+        128 MiB. The least recently used trigger area is discarded first.
+    path : str or Path, optional
+        Path of an npz file. If it exists, the cache is initialized from it.
+
+    Examples
+    --------
+    >>> cache = TriggerAreaCache(path='trigger_areas_cache.npz')
+    >>> mcs_trigger_locs = add_circular_trigger_areas(
+    ...     mcs_trigger_locs, RADII, hp_grid, cache=cache)
+    >>> cache.info()['hit_rate']
+    >>> cache.save()
+    """
+    def __init__(
+            self,
+            max_bytes: int = 2**27,
+            path: Optional[Union[str, Path]] = None,
+            ):
+        self.max_bytes = max_bytes
+        self.path = None if path is None else Path(path)
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._trigger_areas = OrderedDict()
+        if self.path is not None and self.path.exists():
+            self.load(self.path)
+
+    def __len__(self) -> int:
+        return len(self._trigger_areas)
+
+    def get(
+            self,
+            nside: int,
+            nest: bool,
+            cell_idx: int,
+            radius_deg: float,
+            ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the distance-sorted trigger area of a cell, computing it if it
+        is not cached yet. See `_get_sorted_trigger_area_idxs`.
+        """
+        key = (int(nside), bool(nest), int(cell_idx), float(radius_deg))
+        if key in self._trigger_areas:
+            self.hits += 1
+            self._trigger_areas.move_to_end(key)
+            return self._trigger_areas[key]
+
+        self.misses += 1
+        return self._add(key, *_get_sorted_trigger_area_idxs(*key))
+
+    def _add(
+            self,
+            key: tuple,
+            idxs: np.ndarray,
+            cos_dist: np.ndarray,
+            ) -> Tuple[np.ndarray, np.ndarray]:
+        trigger_area = (
+            idxs.astype(_get_cell_dtype(key[0])), cos_dist.astype(np.float32)
+            )
+        for array in trigger_area:
+            array.setflags(write=False)
+
+        if key in self._trigger_areas:
+            self.nbytes -= sum(
+                array.nbytes for array in self._trigger_areas[key]
+                )
+        self._trigger_areas[key] = trigger_area
+        self._trigger_areas.move_to_end(key)
+        self.nbytes += sum(array.nbytes for array in trigger_area)
+        while self.nbytes > self.max_bytes and self._trigger_areas:
+            _, removed = self._trigger_areas.popitem(last=False)
+            self.nbytes -= sum(array.nbytes for array in removed)
+        return trigger_area
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups that were served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else np.nan
+
+    def info(self) -> dict:
+        """
+        Get the statistics of the cache.
+
+        Returns
+        -------
+        dict
+            Dictionary with the number of 'hits' and 'misses', the 
+            'hit_rate', the number of cached trigger areas ('size') and their
+            current and maximum memory in bytes ('nbytes' and 'max_bytes').
+        """
+        return {
+            'hits': self.hits, 'misses': self.misses,
+            'hit_rate': self.hit_rate, 'size': len(self),
+            'nbytes': self.nbytes, 'max_bytes': self.max_bytes,
+            }
+
+    def clear(self):
+        """Remove all trigger areas and reset the statistics."""
+        self._trigger_areas.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, path: Optional[Union[str, Path]] = None):
+        """
+        Save the cached trigger areas to an npz file.
+
+        Parameters
+        ----------
+        path : str or Path, optional
+            The output path. Defaults to the path the cache was created with.
+        """
+        path = self.path if path is None else Path(path)
+        if path is None:
+            raise ValueError("Please provide a path to save the cache to.")
+
+        keys = list(self._trigger_areas.keys())
+        trigger_areas = list(self._trigger_areas.values())
+        sizes = np.array([idxs.size for idxs, _ in trigger_areas], dtype=np.int64)
+        np.savez(
+            path,
+            nside=np.array([key[0] for key in keys], dtype=np.int64),
+            nest=np.array([key[1] for key in keys], dtype=bool),
+            cell_idx=np.array([key[2] for key in keys], dtype=np.int64),
+            radius=np.array([key[3] for key in keys], dtype=float),
+            sizes=sizes,
+            idxs=np.concatenate(
+                [idxs for idxs, _ in trigger_areas] + [np.empty(0, np.int64)]
+                ),
+            cos_dist=np.concatenate(
+                [cos_dist for _, cos_dist in trigger_areas] +
+                [np.empty(0, np.float32)]
+                ),
+            )
+
+    def load(self, path: Union[str, Path]):
+        """
+        Add the trigger areas of an npz file written by `save` to the cache.
+
+        Parameters
+        ----------
+        path : str or Path
+            The input path.
+        """
+        with np.load(path) as cache_file:
+            offsets = np.cumsum(cache_file['sizes']) - cache_file['sizes']
+            idxs, cos_dist = cache_file['idxs'], cache_file['cos_dist']
+            for key, offset, size in zip(
+                    zip(
+                        cache_file['nside'].tolist(), cache_file['nest'].tolist(),
+                        cache_file['cell_idx'].tolist(),
+                        cache_file['radius'].tolist(),
+                        ),
+                    offsets, cache_file['sizes'],
+                    ):
+                self._add(
+                    key, idxs[offset:offset+size], cos_dist[offset:offset+size]
+                    )
+
+
+# Module-wide cache of trigger areas, which can be passed to
+# `add_circular_trigger_areas` to reuse the trigger areas across calls
+TRIGGER_AREA_CACHE = TriggerAreaCache()
+
+
+def _get_cell_dtype(nside: int) -> np.dtype:
+    """
+    Get the smallest integer dtype that can hold all cell indices of a
+    HEALPix map with the given nside.
+    """
+    if hp.nside2npix(nside) <= np.iinfo(np.int32).max:
+        return np.dtype(np.int32)
+    return np.dtype(np.int64)
+
+
+def _init_trigger_area_csr(
         tracks: np.ndarray,
-        trigger_area_idxs: list,
+        cells: np.ndarray,
+        offsets: np.ndarray,
+        sizes: np.ndarray,
         radii: np.ndarray,
-        ) -> xr.DataArray:
+        nside: int,
+        nest: bool,
+        ) -> xr.Dataset:
     """
-    Initialize a DataArray to store trigger area indices.
-    This function creates an xarray DataArray with dimensions corresponding to 
-    tracks, cells, and radius degrees. The array is initialized with NaN values 
-    and is intended to store indices of trigger areas for each track and radius.
+    Initialize a Dataset that stores the trigger area indices in a compressed
+    sparse row (CSR) layout.
+
     Parameters
     ----------
     tracks : np.ndarray
         An array representing the tracks for which the trigger area indices 
         are being initialized.
-    trigger_area_idxs_list : list
-        A list of arrays, where each array contains the indices of trigger areas 
-        for a specific track.
-    radii_degree : np.ndarray
+    cells : np.ndarray
+        The concatenated, distance-sorted cell indices of the largest trigger 
+        areas.
+    offsets : np.ndarray
+        The offset of the trigger area of each track in `cells`.
+    sizes : np.ndarray
+        The number of cells of the trigger area of each track and radius.
+    radii : np.ndarray
         An array of radius values (in degrees) for which the trigger area
         indices are calculated.
+    nside : int
+        The nside parameter for the HEALPix map.
+    nest : bool
+        If True, the cell indices refer to the nested indexing scheme.
+
     Returns
     -------
-    xr.DataArray
-        A DataArray with dimensions ['tracks', 'cell', 'radius'],
-        initialized with NaN values, and coordinates corresponding to the input
+    xr.Dataset
+        A Dataset containing 'trigger_area_cells', 'trigger_area_offsets' and
+        'trigger_area_sizes' with coordinates corresponding to the input
         parameters.
-    """    
-    cells = np.arange(
-        0, np.array([l.shape[0] for l in trigger_area_idxs]).max()
+    """
+    trigger_area_csr = xr.Dataset(
+        data_vars={
+            'trigger_area_cells': (
+                'trigger_area_cell', cells,
+                {'healpix_nside': nside, 'healpix_nest': int(nest)},
+                ),
+            'trigger_area_offsets': ('tracks', offsets),
+            'trigger_area_sizes': (['tracks', 'radius'], sizes),
+            },
+        coords={'tracks': tracks, 'radius': radii},
         )
+    trigger_area_csr['radius'].attrs['units'] = 'degree'
+    return trigger_area_csr
 
-    trigger_area_idxs_array = xr.DataArray(
-        data=np.full(
-            shape=(tracks.size, cells.size, radii.size),
-            fill_value=np.nan,
-        ),
-        dims=['tracks', 'cell', 'radius'],
-        coords={'tracks': tracks, 'cell': cells, 'radius': radii},
+
+def get_trigger_area_file(track_file: Union[str, Path]) -> Path:
+    """
+    Get the path of the trigger area file that belongs to an MCS track file.
+
+    Parameters
+    ----------
+    track_file : str or Path
+        Path to the MCS track file, e.g. an entry of `MCS_TRACK_FILES`.
+
+    Returns
+    -------
+    Path
+        Path to the trigger area file next to the track file.
+    """
+    track_file = Path(track_file)
+    return track_file.with_name(f"{track_file.stem}_trigger_areas.nc")
+
+
+def save_trigger_areas(
+        mcs_trigger_locs: xr.DataArray,
+        outpath: Union[str, Path],
+        ):
+    """
+    Save MCS trigger locations including their trigger areas to NetCDF.
+
+    Parameters
+    ----------
+    mcs_trigger_locs : xr.DataArray
+        DataArray containing the MCS trigger locations and their trigger 
+        areas as returned by `add_circular_trigger_areas`.
+    outpath : str or Path
+        The output path, e.g. as returned by `get_trigger_area_file`.
+    """
+    mcs_trigger_locs.to_netcdf(outpath)
+
+
+def load_trigger_areas(inpath: Union[str, Path]) -> xr.DataArray:
+    """
+    Load MCS trigger locations including their trigger areas from NetCDF.
+
+    Parameters
+    ----------
+    inpath : str or Path
+        The input path, e.g. as returned by `get_trigger_area_file`.
+
+    Returns
+    -------
+    xr.DataArray
+        DataArray containing the MCS trigger locations and their trigger
+        areas as saved by `save_trigger_areas`.
+    """
+    with xr.open_dataset(inpath) as mcs_trigger_locs:
+        return mcs_trigger_locs.load()
+
+
+def compact_trigger_areas(mcs_trigger_locs: xr.DataArray) -> xr.DataArray:
+    """
+    Drop trigger area cells that are not referenced by any track anymore.
+
+    Selecting a subset of tracks keeps the shared 'trigger_area_cells' of all
+    original tracks. This function rebuilds the compressed sparse row layout
+    so that it only contains the trigger areas of the remaining tracks, e.g.
+    before sending a subset of tracks to another process.
+
+    Parameters
+    ----------
+    mcs_trigger_locs : xr.DataArray
+        DataArray containing the MCS trigger locations and their trigger 
+        areas as returned by `add_circular_trigger_areas`.
+
+    Returns
+    -------
+    xr.DataArray
+        DataArray with the same tracks and trigger areas but a minimal
+        'trigger_area_cells' variable.
+    """
+    offsets = mcs_trigger_locs['trigger_area_offsets'].values
+    max_sizes = mcs_trigger_locs['trigger_area_sizes'].values.max(
+        axis=1, initial=0
         )
-    trigger_area_idxs_array['radius'].attrs['units'] = 'degree'
-    return trigger_area_idxs_array
+
+    # Tracks that share a trigger area share the same offset
+    unique_offsets, first, inverse = np.unique(
+        offsets, return_index=True, return_inverse=True
+        )
+    unique_sizes = max_sizes[first]
+    new_offsets = np.cumsum(unique_sizes) - unique_sizes
+    cell_idxs = np.repeat(unique_offsets - new_offsets, unique_sizes) + \
+        np.arange(unique_sizes.sum())
+
+    cells = mcs_trigger_locs['trigger_area_cells']
+    mcs_trigger_locs = mcs_trigger_locs.drop_vars('trigger_area_cells')
+    mcs_trigger_locs['trigger_area_cells'] = cells.isel(
+        trigger_area_cell=cell_idxs
+        )
+    mcs_trigger_locs['trigger_area_offsets'] = (
+        'tracks', new_offsets[inverse.ravel()]
+        )
+    return mcs_trigger_locs
 
 
 # ------------------------------------------------------------------------------
@@ -189,17 +808,19 @@ def remove_land_triggers(
         A filtered xarray DataArray containing only the MCS trigger locations
         that are entirely over the ocean. The returned DataArray has the same
         structure as the input but excludes land-based triggers.
+
+    See Also
+    --------
+    get_trigger_area_ocean_fraction : Ocean fraction of the trigger area of
+        each track and radius.
     """
-    mcs_trigger_locs['is_trigger_area_all_ocean'] = (
-        'tracks', _is_max_trigger_area_all_ocean(
-            mcs_trigger_locs, ocean_mask
-            )
+    is_trigger_area_all_ocean = _is_max_trigger_area_all_ocean(
+        mcs_trigger_locs, ocean_mask
         )
-    mcs_trigger_locs_ocean = mcs_trigger_locs.where(
-        mcs_trigger_locs['is_trigger_area_all_ocean'] == True, drop=True
-        )
-    mcs_trigger_locs_ocean = mcs_trigger_locs_ocean.drop(
-        'is_trigger_area_all_ocean'
+    # Select by position so that the trigger area cells, which are shared
+    # between tracks, are kept as they are
+    mcs_trigger_locs_ocean = mcs_trigger_locs.isel(
+        tracks=np.flatnonzero(is_trigger_area_all_ocean)
         )
     mcs_trigger_locs_ocean['trigger_idx'] = \
         mcs_trigger_locs_ocean['trigger_idx'].astype(int)
@@ -210,22 +831,99 @@ def remove_land_triggers(
 def _is_max_trigger_area_all_ocean(
         mcs_trigger_locs: xr.DataArray,
         ocean_mask: xr.DataArray
+        ) -> np.ndarray:
+    i_max_radius = np.argmax(mcs_trigger_locs['radius'].values)
+    n_ocean_cells = _count_ocean_cells_in_trigger_area(
+        mcs_trigger_locs, ocean_mask
+        )
+    return n_ocean_cells[:, i_max_radius] == \
+        mcs_trigger_locs['trigger_area_sizes'].values[:, i_max_radius]
+
+
+def get_trigger_area_ocean_fraction(
+        mcs_trigger_locs: xr.DataArray,
+        ocean_mask: xr.DataArray,
         ) -> xr.DataArray:
-    is_max_trigger_area_all_ocean = []
-    for track in mcs_trigger_locs['tracks']:
-        # Get the trigger area cell indices for current track without filling
-        # NaNs
-        trigger_area_idxs = mcs_trigger_locs['trigger_area_idxs'].sel(
-            radius=mcs_trigger_locs['radius'].max().values,
-            tracks=track,
+    """
+    Calculate the fraction of ocean cells in the trigger area of each MCS 
+    track and radius.
+
+    Parameters
+    ----------
+    mcs_trigger_locs : xr.DataArray
+        An xarray DataArray containing the trigger locations for MCS and 
+        their trigger areas as returned by `add_circular_trigger_areas`.
+    ocean_mask : xr.DataArray
+        An xarray DataArray representing the ocean mask, which is NaN over 
+        land.
+
+    Returns
+    -------
+    xr.DataArray
+        A DataArray with dimensions ['tracks', 'radius'] containing the 
+        fraction of cells in the trigger area that are ocean. Empty trigger 
+        areas have an ocean fraction of NaN.
+    """
+    sizes = mcs_trigger_locs['trigger_area_sizes']
+    n_ocean_cells = _count_ocean_cells_in_trigger_area(
+        mcs_trigger_locs, ocean_mask
+        )
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sizes.copy(data=n_ocean_cells / sizes.values).rename(
+            'ocean_fraction'
             )
-        trigger_area_idxs = trigger_area_idxs[~np.isnan(trigger_area_idxs)]
-        
-        # Check if all cells in the trigger area are ocean
-        is_max_trigger_area_all_ocean.append(
-            all(~np.isnan(ocean_mask.sel(cell=trigger_area_idxs)))
+
+
+def _count_ocean_cells_in_trigger_area(
+        mcs_trigger_locs: xr.DataArray,
+        ocean_mask: xr.DataArray,
+        ) -> np.ndarray:
+    """
+    Count the ocean cells in the trigger area of each MCS track and radius.
+
+    The ocean mask is evaluated for all stored trigger area cells with a 
+    single `np.take`. As the trigger area of each radius is a prefix of the
+    distance-sorted largest trigger area, the number of ocean cells follows
+    from the cumulative sum of the mask without any loop over tracks.
+
+    Parameters
+    ----------
+    mcs_trigger_locs : xr.DataArray
+        An xarray DataArray containing the trigger locations for MCS and 
+        their trigger areas.
+    ocean_mask : xr.DataArray
+        An xarray DataArray with a 'cell' dimension representing the ocean 
+        mask, which is NaN over land. A cell only counts as ocean if it is
+        not NaN along all other dimensions (e.g. 'time').
+
+    Returns
+    -------
+    np.ndarray
+        Integer array of shape (tracks, radius) containing the number of 
+        ocean cells in each trigger area.
+    """
+    if 'cell' not in ocean_mask.dims:
+        raise ValueError(
+            f"ocean_mask must have a 'cell' dimension, got {ocean_mask.dims}"
             )
-    return is_max_trigger_area_all_ocean
+    is_ocean_cell = ocean_mask.notnull()
+    other_dims = [dim for dim in ocean_mask.dims if dim != 'cell']
+    if other_dims:
+        is_ocean_cell = is_ocean_cell.all(dim=other_dims)
+
+    offsets = mcs_trigger_locs['trigger_area_offsets'].values
+    sizes = mcs_trigger_locs['trigger_area_sizes'].values
+
+    is_ocean = np.take(
+        is_ocean_cell.values,
+        _get_cell_positions(
+            ocean_mask['cell'].values,
+            mcs_trigger_locs['trigger_area_cells'].values,
+            ),
+        )
+    n_ocean_cumulative = np.concatenate([[0], np.cumsum(is_ocean)])
+    return n_ocean_cumulative[offsets[:, np.newaxis] + sizes] - \
+        n_ocean_cumulative[offsets[:, np.newaxis]]
 
 
 # ------------------------------------------------------------------------------
@@ -235,6 +933,7 @@ def get_var_in_trigger_area(
         *vars,
         times_before_trigger: Optional[np.timedelta64] = None,
         analysis_time: Optional[Tuple[np.datetime64]] = None,
+        time_step: Optional[np.timedelta64] = None,
         ) -> xr.DataArray:
     """
     Retrieve variable values in the triggering area of MCSs.
@@ -248,14 +947,19 @@ def get_var_in_trigger_area(
     ----------
     mcs_trigger_locs : xr.DataArray
         DataArray containing the MCS trigger locations. It must include 
-        the 'trigger_area_idxs' coordinate, which specifies the Healpix 
-        cell indices of the trigger areas.
+        the trigger areas as returned by `add_circular_trigger_areas`, 
+        which specify the Healpix cell indices of the trigger areas.
     data_field : xr.DataArray
         DataArray containing the simulation data. It must include a 
         'cell' dimension corresponding to the Healpix grid.
     times_before_trigger : np.timedelta64, optional
         Time range before the triggering to retrieve variable values. If 
         None, only the values at the triggering time are retrieved.
+    time_step : np.timedelta64, optional
+        Time step of the full simulation data. If given, the number of time
+        steps before the triggering is derived from it instead of from the
+        time axis of `data_field`, so that data fields that only cover a
+        part of the simulation period give the same 'time' dimension.
 
     Returns
     -------
@@ -264,12 +968,14 @@ def get_var_in_trigger_area(
         for each track, radius, and optionally time. The dimensions are 
         ['tracks', 'cell', 'radius'] if no time range is specified, or 
         ['tracks', 'cell', 'radius', 'time'] if a time range is provided.
+        Along 'cell', the cells of each trigger area are sorted by 
+        increasing distance to the trigger cell and padded with NaN.
     """
     if times_before_trigger is None:
         return _get_var_in_trigger_area(*vars)
     else:
         return _get_var_in_trigger_area_multiple(
-            *vars, times_before_trigger, analysis_time
+            *vars, times_before_trigger, analysis_time, time_step
             )
 
 
@@ -284,6 +990,11 @@ def _get_var_in_trigger_area(
     for each track and radius. The trigger area is determined based on the
     indices corresponding to the MCS trigger locations and the specified radius.
 
+    The tracks are grouped by the time step of the data field at their
+    triggering. Each needed time step is read only once (in blocks of
+    `MAX_TIME_STEPS_PER_READ` time steps) and the trigger area cells of all
+    tracks in a block are extracted with a single `np.take`.
+
     Parameters
     ----------
     mcs_trigger_locs : xr.DataArray
@@ -304,22 +1015,39 @@ def _get_var_in_trigger_area(
         trigger area for each radius.
     """
     var_in_trigger_area = _init_var_in_trigger_area(mcs_trigger_locs)
-    
-    for j, track in enumerate(mcs_trigger_locs['tracks']):
-        # Subsample the data field for analysis
-        mcs_start_basetime = mcs_trigger_locs.sel(tracks=track)\
-            ['start_basetime'].values
-        var_before_trigger = data_field.sel(
-            time=mcs_start_basetime, method='pad'
+
+    # Position of the trigger area cells along the cell axis of the data field
+    cell_positions = _get_trigger_area_cell_positions(
+        mcs_trigger_locs, data_field
+        )
+
+    # Time step of the data field at (or right before) the triggering
+    time_idxs = _get_pad_time_idxs(
+        data_field, mcs_trigger_locs['start_basetime'].values
+        )
+
+    # Group the tracks by their time step and read each needed time step once
+    values = np.full(cell_positions.shape, np.nan)
+    unique_time_idxs, time_group = np.unique(time_idxs, return_inverse=True)
+    for start in range(0, unique_time_idxs.size, MAX_TIME_STEPS_PER_READ):
+        stop = start + MAX_TIME_STEPS_PER_READ
+        data_slices = np.asarray(
+            data_field.isel(time=unique_time_idxs[start:stop])
+            .transpose('time', 'cell').values
             )
 
-        for i, radius in enumerate(mcs_trigger_locs['radius']):
-            trigger_area_idxs = _select_trigger_area_idxs(
-                mcs_trigger_locs, track, radius
-                )
-            var_in_trigger_area[j, :trigger_area_idxs.shape[0], i] = \
-                var_before_trigger.sel(cell=trigger_area_idxs).data
-    
+        # Gather the cells of all tracks in this group of time steps at once
+        tracks = np.flatnonzero((time_group >= start) & (time_group < stop))
+        flat_idxs = (
+            (time_group[tracks, np.newaxis] - start) * data_slices.shape[1] +
+            cell_positions[tracks]
+            )
+        values[tracks] = np.take(data_slices, flat_idxs)
+
+    var_in_trigger_area[:] = _mask_trigger_area_radii(
+        np.where(cell_positions >= 0, values, np.nan),
+        mcs_trigger_locs['trigger_area_sizes'].values,
+        )
     return var_in_trigger_area
 
 
@@ -328,12 +1056,18 @@ def _get_var_in_trigger_area_multiple(
         data_field: xr.DataArray,
         times_before_trigger: np.timedelta64,
         analysis_time: np.datetime64,
+        time_step: Optional[np.timedelta64] = None,
         ) -> xr.DataArray:
     """
     Extracts and aggregates data from a specified field within the trigger area 
     of multiple MCS (Mesoscale Convective Systems) tracks over a given time 
     period before the trigger event.
 
+    The integer time indices of the pre-trigger periods are computed once via
+    `np.searchsorted` on the (uniform) time axis. Tracks with overlapping
+    pre-trigger periods are batched, so that each time step of the data field
+    is read only once.
+
     Parameters
     ----------
     mcs_trigger_locs : xr.DataArray
@@ -347,6 +1081,9 @@ def _get_var_in_trigger_area_multiple(
     analysis_time : np.datetime64
         The start time of the analysis period. Data before this time will be 
         excluded.
+    time_step : np.timedelta64, optional
+        Time step of the full simulation data. If None, it is derived from 
+        the time axis of the data field.
 
     Returns
     -------
@@ -354,37 +1091,122 @@ def _get_var_in_trigger_area_multiple(
         A DataArray containing the extracted data field values within the 
         trigger area for each track and radius over the specified time period.
     """
-    _check_time_before_trigger_validity(data_field, times_before_trigger)
+    if time_step is None:
+        _check_time_before_trigger_validity(data_field, times_before_trigger)
+        i_time_before_trigger = _get_i_time_before_trigger(
+            data_field, times_before_trigger
+            )
+    else:
+        _check_time_before_trigger_validity(
+            data_field, times_before_trigger, sample_frequency=time_step
+            )
+        i_time_before_trigger = int(times_before_trigger // time_step)
     var_in_trigger_area = _init_var_in_trigger_area_multiple(
-        mcs_trigger_locs, data_field, times_before_trigger
+        mcs_trigger_locs, i_time_before_trigger
         )
-    
-    for j, track in enumerate(mcs_trigger_locs['tracks']):
-        # Subsample the data fileld for analysis
-        mcs_start_basetime = mcs_trigger_locs.sel(tracks=track)\
-            ['start_basetime'].values
-        pre_mcs_start_basetime = mcs_start_basetime - times_before_trigger
-        if pre_mcs_start_basetime < analysis_time[0]: continue
-
-        analysis_period_end_time = data_field['time'].sel(
-            time=mcs_start_basetime, method='pad'
+
+    # Only consider tracks whose pre-trigger period lies within the analysis
+    # period
+    mcs_start_basetime = mcs_trigger_locs['start_basetime'].values
+    tracks = np.flatnonzero(
+        mcs_start_basetime - times_before_trigger >= analysis_time[0]
+        )
+
+    # Integer index of the last time step of the pre-trigger period of each
+    # track. As the time axis is uniform, the period covers the
+    # 'i_time_before_trigger' time steps up to and including this index.
+    end_idxs = _get_pad_time_idxs(data_field, mcs_start_basetime[tracks])
+    start_idxs = end_idxs - i_time_before_trigger + 1
+    tracks, start_idxs, end_idxs = [
+        x[start_idxs >= 0] for x in (tracks, start_idxs, end_idxs)
+        ]
+
+    # Position of the trigger area cells along the cell axis of the data field
+    cell_positions = _get_trigger_area_cell_positions(
+        mcs_trigger_locs, data_field
+        )
+    values = np.full(cell_positions.shape + (i_time_before_trigger,), np.nan)
+
+    # Batch tracks with overlapping pre-trigger periods and read their time 
+    # steps as one slab. Time steps shared with the previous slab are reused, 
+    # so that each time step is read only once.
+    order = np.argsort(end_idxs, kind='stable')
+    tracks, start_idxs, end_idxs = [
+        x[order] for x in (tracks, start_idxs, end_idxs)
+        ]
+    max_slab_size = max(MAX_TIME_STEPS_PER_READ, i_time_before_trigger)
+    slab, slab_start = None, 0
+    i = 0
+    while i < tracks.size:
+        batch_start = start_idxs[i]
+        j = np.searchsorted(
+            end_idxs, batch_start + max_slab_size - 1, side='right'
             )
-        analysis_period_start_time = analysis_period_end_time - times_before_trigger
-        var_before_trigger = data_field.where(
-            (data_field['time'] > analysis_period_start_time) &
-            (data_field['time'] <= analysis_period_end_time), drop=True
+        batch_end = end_idxs[j-1] + 1
+        slab, slab_start = _read_time_slab(
+            data_field, slab, slab_start, batch_start, batch_end
+            ), batch_start
+
+        # Gather the pre-trigger periods of all tracks in the batch at once
+        batch = tracks[i:j]
+        time_idxs = (start_idxs[i:j] - slab_start)[:, np.newaxis] + \
+            np.arange(i_time_before_trigger)[np.newaxis, :]
+        flat_idxs = (
+            time_idxs[:, np.newaxis, :] * slab.shape[1] +
+            cell_positions[batch][:, :, np.newaxis]
             )
+        values[batch] = np.take(slab, flat_idxs)
+        i = j
 
-        for i, radius in enumerate(mcs_trigger_locs['radius']):
-            trigger_area_idxs = _select_trigger_area_idxs(
-                mcs_trigger_locs, track, radius
-                )
-            var_in_trigger_area[j, :trigger_area_idxs.shape[0], i, :] = \
-                var_before_trigger.sel(cell=trigger_area_idxs).data.transpose()
-    
+    var_in_trigger_area[:] = _mask_trigger_area_radii(
+        np.where(cell_positions[:, :, np.newaxis] >= 0, values, np.nan),
+        mcs_trigger_locs['trigger_area_sizes'].values,
+        )
     return var_in_trigger_area
 
 
+def _read_time_slab(
+        data_field: xr.DataArray,
+        slab: Optional[np.ndarray],
+        slab_start: int,
+        start: int,
+        stop: int,
+        ) -> np.ndarray:
+    """
+    Read the time steps [start, stop) of a data field into memory, reusing 
+    the time steps that are already contained in the previously read slab.
+
+    Parameters
+    ----------
+    data_field : xr.DataArray
+        DataArray with dimensions 'time' and 'cell'.
+    slab : np.ndarray or None
+        The previously read slab of shape (time, cell), or None.
+    slab_start : int
+        The index of the first time step of `slab`.
+    start : int
+        The index of the first time step to read.
+    stop : int
+        The index after the last time step to read.
+
+    Returns
+    -------
+    np.ndarray
+        The time steps [start, stop) of the data field as array of shape
+        (time, cell).
+    """
+    def _read(start, stop):
+        return np.asarray(
+            data_field.isel(time=slice(start, stop))
+            .transpose('time', 'cell').values
+            )
+
+    if slab is None or start >= slab_start + slab.shape[0]:
+        return _read(start, stop)
+    reused = slab[start - slab_start:]
+    return np.concatenate([reused, _read(start + reused.shape[0], stop)])
+
+
 def _init_var_in_trigger_area(
          mcs_trigger_locs: xr.DataArray,
         ) -> xr.DataArray:
@@ -398,8 +1220,8 @@ def _init_var_in_trigger_area(
     Parameters
     ----------
     mcs_trigger_locs : xr.DataArray
-        Input DataArray containing the coordinates `tracks`, `cell`, and
-        `radius` that define the dimensions of the trigger area.
+        Input DataArray containing the coordinates `tracks` and `radius` and
+        the trigger area sizes that define the dimensions of the trigger area.
 
     Returns
     -------
@@ -408,7 +1230,7 @@ def _init_var_in_trigger_area(
         ['tracks', 'cell', 'radius'] and corresponding coordinates.
     """
     tracks = mcs_trigger_locs['tracks']
-    cells = mcs_trigger_locs['cell']
+    cells = _get_trigger_area_cell_coord(mcs_trigger_locs)
     radii = mcs_trigger_locs['radius']
 
     return xr.DataArray(
@@ -422,7 +1244,7 @@ def _init_var_in_trigger_area(
 
 def _init_var_in_trigger_area_multiple(
         mcs_trigger_locs: xr.DataArray,
-        *vars
+        i_time_before_trigger: int,
         ) -> xr.DataArray:
     """
     Initialize a multi-dimensional xarray.DataArray that stores the variables in
@@ -437,10 +1259,9 @@ def _init_var_in_trigger_area_multiple(
     ----------
     mcs_trigger_locs : xr.DataArray
         An xarray.DataArray containing the MCS trigger locations with dimensions 
-        'tracks', 'cell', and 'radius'.
-    *vars : tuple
-        A variable-length argument list of xarray.DataArray objects, which are 
-        used to determine the number of time steps before triggering.
+        'tracks' and 'radius' and the trigger area sizes.
+    i_time_before_trigger : int
+        The number of time steps before triggering.
 
     Returns
     -------
@@ -449,11 +1270,9 @@ def _init_var_in_trigger_area_multiple(
         ['tracks', 'cell', 'radius', 'time'] and corresponding coordinates.
     """
     tracks = mcs_trigger_locs['tracks']
-    cells = mcs_trigger_locs['cell']
+    cells = _get_trigger_area_cell_coord(mcs_trigger_locs)
     radii = mcs_trigger_locs['radius']
 
-    # Get the number of time steps before triggering
-    i_time_before_trigger = _get_i_time_before_trigger(*vars)
     time = np.arange(-i_time_before_trigger, 0, 1)
 
     return xr.DataArray(
@@ -535,6 +1354,7 @@ def _get_sample_frequency(data_field: xr.DataArray) -> bool:
 def _check_time_before_trigger_validity(
         data_field: xr.DataArray,
         times_before_trigger: np.timedelta64,
+        sample_frequency: Optional[np.timedelta64] = None,
         ):
     """
     Validates the `times_before_trigger` parameter against the sampling
@@ -549,6 +1369,9 @@ def _check_time_before_trigger_validity(
     times_before_trigger : np.timedelta64
         The time duration before the trigger event that needs to be
         validated. Must be a multiple of the sampling frequency.
+    sample_frequency : np.timedelta64, optional
+        The sampling frequency to validate against. If None, it is derived
+        from the data field.
 
     Raises
     ------
@@ -562,7 +1385,9 @@ def _check_time_before_trigger_validity(
     in the `data_field`. Ensure that the `data_field` has a consistent
     time step for accurate validation.
     """
-    sample_frequency = _get_sample_frequency(data_field)
+    if sample_frequency is None:
+        sample_frequency = _get_sample_frequency(data_field)
+    sample_frequency = np.atleast_1d(sample_frequency)
     if (times_before_trigger % sample_frequency) != 0:
         raise ValueError(
             f"Please provide a 'times_before_trigger' that is a multiple of " +
@@ -573,9 +1398,9 @@ def _check_time_before_trigger_validity(
 
 def _select_trigger_area_idxs(
         mcs_trigger_locs: xr.DataArray,
-        track: int,
-        radius: int,
-        ) -> xr.DataArray:
+        j: int,
+        i: int,
+        ) -> np.ndarray:
     """
     Selects the indices of the trigger area for a specific track and radius 
     from the given MCS trigger locations.
@@ -584,19 +1409,187 @@ def _select_trigger_area_idxs(
     ----------
     mcs_trigger_locs : xr.DataArray
         DataArray containing the MCS trigger locations, including the 
-        'trigger_area_idxs' variable.
-    track : int
-        The track identifier for which the trigger area indices are to be 
-        selected.
-    radius : int
-        The radius value specifying the spatial extent of the trigger area.
+        'trigger_area_cells', 'trigger_area_offsets' and 'trigger_area_sizes'
+        variables.
+    j : int
+        The position of the track along the 'tracks' dimension.
+    i : int
+        The position of the radius along the 'radius' dimension.
 
     Returns
     -------
-    xr.DataArray
-        A DataArray containing the indices of the trigger area for the 
-        specified track and radius, with NaN values removed.
+    np.ndarray
+        The Healpix cell indices of the trigger area for the specified track 
+        and radius.
+    """
+    offset = mcs_trigger_locs['trigger_area_offsets'].values[j]
+    size = mcs_trigger_locs['trigger_area_sizes'].values[j, i]
+    return mcs_trigger_locs['trigger_area_cells'].values[offset:offset+size]
+
+
+def _get_trigger_area_cell_coord(mcs_trigger_locs: xr.DataArray) -> np.ndarray:
+    """
+    Get the 'cell' coordinate that enumerates the cells of the largest trigger
+    area of all tracks.
+
+    Parameters
+    ----------
+    mcs_trigger_locs : xr.DataArray
+        DataArray containing the MCS trigger locations, including the 
+        'trigger_area_sizes' variable.
+
+    Returns
+    -------
+    np.ndarray
+        Array ranging from 0 to the maximum number of cells in any trigger
+        area.
+    """
+    return np.arange(
+        0, mcs_trigger_locs['trigger_area_sizes'].values.max(initial=0)
+        )
+
+
+def _get_trigger_area_cell_positions(
+        mcs_trigger_locs: xr.DataArray,
+        data_field: xr.DataArray,
+        ) -> np.ndarray:
+    """
+    Get the positions of the trigger area cells along the 'cell' dimension of
+    a data field for the largest radius of all tracks.
+
+    Parameters
+    ----------
+    mcs_trigger_locs : xr.DataArray
+        DataArray containing the MCS trigger locations, including the 
+        'trigger_area_cells', 'trigger_area_offsets' and 'trigger_area_sizes'
+        variables.
+    data_field : xr.DataArray
+        DataArray with a 'cell' dimension whose coordinate holds the Healpix 
+        cell indices, e.g. a regional subset of a Healpix grid.
+
+    Returns
+    -------
+    np.ndarray
+        Integer array of shape (tracks, cell) containing the positions of the
+        (distance-sorted) trigger area cells along the 'cell' dimension of 
+        `data_field`, padded with -1.
+    """
+    offsets = mcs_trigger_locs['trigger_area_offsets'].values
+    max_sizes = mcs_trigger_locs['trigger_area_sizes'].values.max(
+        axis=1, initial=0
+        )
+    cells = _get_trigger_area_cell_coord(mcs_trigger_locs)
+
+    # Row and column of every trigger area cell in the (tracks, cell) array
+    tracks = np.repeat(np.arange(offsets.size), max_sizes)
+    row_starts = np.cumsum(max_sizes) - max_sizes
+    columns = np.arange(tracks.size) - np.repeat(row_starts, max_sizes)
+
+    cell_positions = np.full((offsets.size, cells.size), -1, dtype=np.int64)
+    cell_positions[tracks, columns] = _get_cell_positions(
+        data_field['cell'].values,
+        mcs_trigger_locs['trigger_area_cells'].values[offsets[tracks] + columns],
+        )
+    return cell_positions
+
+
+def _get_cell_positions(
+        cell_coord: np.ndarray,
+        cell_idxs: np.ndarray,
+        ) -> np.ndarray:
+    """
+    Get the positions of Healpix cell indices in a cell coordinate.
+
+    Parameters
+    ----------
+    cell_coord : np.ndarray
+        The Healpix cell indices of a data field, e.g. its 'cell' coordinate.
+    cell_idxs : np.ndarray
+        The Healpix cell indices to look up.
+
+    Returns
+    -------
+    np.ndarray
+        The positions of `cell_idxs` in `cell_coord`.
+
+    Raises
+    ------
+    KeyError
+        If not all of `cell_idxs` are contained in `cell_coord`.
+    """
+    sorter = None if np.all(cell_coord[1:] > cell_coord[:-1]) \
+        else np.argsort(cell_coord, kind='stable')
+    positions = np.searchsorted(cell_coord, cell_idxs, sorter=sorter)
+    positions = np.minimum(positions, cell_coord.size - 1)
+    if sorter is not None:
+        positions = sorter[positions]
+    if cell_idxs.size and not np.array_equal(cell_coord[positions], cell_idxs):
+        raise KeyError(
+            "Not all trigger area cells are contained in the 'cell' " +
+            "coordinate of the data field."
+            )
+    return positions
+
+
+def _get_pad_time_idxs(
+        data_field: xr.DataArray,
+        times: np.ndarray,
+        ) -> np.ndarray:
+    """
+    Get the index of the last time step of a data field at or before each of
+    the given times, i.e. the equivalent of `.sel(time=times, method='pad')`.
+
+    Parameters
+    ----------
+    data_field : xr.DataArray
+        DataArray with a monotonically increasing 'time' coordinate.
+    times : np.ndarray
+        The times to look up.
+
+    Returns
+    -------
+    np.ndarray
+        The indices of the time steps along the 'time' dimension.
+
+    Raises
+    ------
+    KeyError
+        If any of `times` is before the first time step of the data field.
+    """
+    time_idxs = np.searchsorted(
+        data_field['time'].values, times, side='right'
+        ) - 1
+    if np.any(time_idxs < 0):
+        raise KeyError(
+            "Some MCSs are triggered before the first time step of the " +
+            "data field."
+            )
+    return time_idxs
+
+
+def _mask_trigger_area_radii(
+        values: np.ndarray,
+        sizes: np.ndarray,
+        ) -> np.ndarray:
+    """
+    Expand values in the largest trigger area of each track to all radii.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Array of shape (tracks, cell, ...) containing the values in the 
+        (distance-sorted) largest trigger area of each track.
+    sizes : np.ndarray
+        Array of shape (tracks, radius) containing the number of cells of the
+        trigger area of each track and radius.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (tracks, cell, radius, ...) that contains `values` for
+        the cells within each radius and NaN elsewhere.
     """
-    trigger_area_idxs = mcs_trigger_locs['trigger_area_idxs']\
-        .sel(tracks=track, radius=radius)
-    return trigger_area_idxs[~np.isnan(trigger_area_idxs)]
\ No newline at end of file
+    in_radius = np.arange(values.shape[1])[np.newaxis, :, np.newaxis] < \
+        sizes[:, np.newaxis, :]
+    in_radius = in_radius.reshape(in_radius.shape + (1,)*(values.ndim - 2))
+    return np.where(in_radius, np.expand_dims(values, 2), np.nan)
@@ -0,0 +1,499 @@
+import collections
+import functools
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional, Sequence, Tuple, Union
+
+import xarray as xr
+import numpy as np
+import healpy as hp
+import intake
+import easygems.healpix as egh
+
+import mcs_utils
+
+CATALOG = "https://digital-earths-global-hackathon.github.io/catalog/catalog.yaml"
+LOCATION = "EU"     #Other possibility: 'online', but 'EU' ensures local download
+TASKS_PER_WORKER = 2    # Number of tasks in flight (and results held) per worker
+
+
+class _ExtractionTask(NamedTuple):
+    """
+    A unit of work of the trigger composite pipeline: one variable of one
+    model for the tracks that trigger within one time chunk.
+    """
+    product: str
+    variable: str
+    zoom: int
+    time: str
+    catalog: str
+    location: str
+    mcs_trigger_locs: xr.Dataset
+    time_idxs: slice
+    times_before_trigger: Optional[np.timedelta64]
+    analysis_time: Tuple[np.datetime64, np.datetime64]
+    time_step: np.timedelta64
+
+
+# ------------------------------------------------------------------------------
+# Pipeline entry point
+# ------------------------------------------------------------------------------
+def compute_trigger_composites(
+        products: Sequence[str],
+        variables: Sequence[str],
+        store: Union[str, Path],
+        radii: np.ndarray,
+        analysis_time: Tuple[np.datetime64, np.datetime64],
+        times_before_trigger: Optional[np.timedelta64] = None,
+        tropical_belt: Tuple[float, float] = (-15., 15.),
+        zoom: int = 9,
+        time: str = "PT3H",
+        time_chunk: np.timedelta64 = np.timedelta64(7, 'D'),
+        max_workers: Optional[int] = None,
+        client=None,
+        catalog: str = CATALOG,
+        location: str = LOCATION,
+        ):
+    """
+    Extract several variables in the trigger areas of MCSs for several models
+    in one job and write them to a zarr store.
+
+    For each model, the MCS trigger locations and their trigger areas are
+    computed once and reused for all variables. The extraction is split into
+    tasks per (model, variable, time chunk), which run on a process pool or
+    a dask cluster. Each task reads only the trigger area cells of its time
+    chunk. Results are streamed to the zarr store in the order of the tasks.
+    At most `TASKS_PER_WORKER` tasks per worker are submitted at a time, so
+    that only their results are held in memory.
+
+    Parameters
+    ----------
+    products : Sequence[str]
+        The models to process, which must be keys of
+        `mcs_utils.MCS_TRACK_FILES`.
+    variables : Sequence[str]
+        The variables to extract in the trigger areas.
+    store : str or Path
+        The zarr store. The variable `var` of model `product` is written to
+        the group '{product}/{var}'.
+    radii : np.ndarray
+        Array of radii (in degrees) of the trigger areas.
+    analysis_time : Tuple[np.datetime64, np.datetime64]
+        Start and end of the analysis period.
+    times_before_trigger : np.timedelta64, optional
+        Time range before the triggering to retrieve variable values. If
+        None, only the values at the triggering time are retrieved.
+    tropical_belt : Tuple[float, float], optional
+        Latitude range of the trigger locations, by default (-15., 15.).
+    zoom : int, optional
+        Healpix zoom level of the simulation data, by default 9.
+    time : str, optional
+        Output frequency of the simulation data, by default "PT3H".
+    time_chunk : np.timedelta64, optional
+        Length of the time chunks into which the tracks are split, by
+        default 7 days.
+    max_workers : int, optional
+        Number of worker processes of the process pool. Ignored if `client`
+        is given.
+    client : distributed.Client, optional
+        A dask client. If given, the tasks are run on its cluster instead of
+        a local process pool.
+    catalog : str, optional
+        URL of the intake catalog.
+    location : str, optional
+        Location of the data in the intake catalog.
+
+    Notes
+    -----
+    - The tracks of each group are ordered by their 'start_basetime'.
+    - The 'cell' dimension of each group has the size of the largest trigger
+        area of the model, so that all time chunks can be appended.
+    """
+    tasks, cell_coords = [], {}
+    for product in products:
+        data_field = open_simulation_data(product, zoom, time, catalog, location)
+        mcs_trigger_locs = get_ocean_mcs_trigger_locs(
+            product, data_field, radii, analysis_time, tropical_belt
+            )
+        cell_coords[product] = \
+            mcs_utils._get_trigger_area_cell_coord(mcs_trigger_locs)
+
+        for variable in variables:
+            tasks.extend(
+                _get_extraction_tasks(
+                    product, variable, zoom, time, catalog, location,
+                    mcs_trigger_locs, data_field['time'], time_chunk,
+                    times_before_trigger, analysis_time,
+                    )
+                )
+
+    written_groups = set()
+    for task, var_in_trigger_area in zip(
+            tasks, _map_tasks(tasks, max_workers, client)
+            ):
+        group = f"{task.product}/{task.variable}"
+        _write_to_zarr(
+            var_in_trigger_area.reindex(cell=cell_coords[task.product]),
+            task.variable, store, group, append=group in written_groups,
+            )
+        written_groups.add(group)
+
+
+def _get_extraction_tasks(
+        product: str,
+        variable: str,
+        zoom: int,
+        time: str,
+        catalog: str,
+        location: str,
+        mcs_trigger_locs: xr.Dataset,
+        data_time: xr.DataArray,
+        time_chunk: np.timedelta64,
+        times_before_trigger: Optional[np.timedelta64],
+        analysis_time: Tuple[np.datetime64, np.datetime64],
+        ) -> list:
+    """
+    Split the extraction of one variable of one model into time chunks.
+
+    Parameters
+    ----------
+    mcs_trigger_locs : xr.Dataset
+        The MCS trigger locations including their trigger areas, sorted by
+        'start_basetime'.
+    data_time : xr.DataArray
+        The (uniformly sampled) time coordinate of the simulation data.
+    time_chunk : np.timedelta64
+        Length of the time chunks into which the tracks are split.
+
+    The remaining parameters are passed on to the tasks, see
+    `compute_trigger_composites`.
+
+    Returns
+    -------
+    list
+        List of `_ExtractionTask`s, ordered by time.
+    """
+    start_basetime = mcs_trigger_locs['start_basetime'].values
+    chunk_idxs = (start_basetime - analysis_time[0]) // time_chunk
+    end_idxs = np.searchsorted(
+        data_time.values, start_basetime, side='right'
+        ) - 1
+
+    # The time step is taken from the full time axis and passed to the tasks,
+    # as the time axis of a chunk can be too short to derive it
+    time_step = mcs_utils._get_sample_frequency(data_time)[0]
+
+    # Number of time steps before the triggering that each task has to read
+    if times_before_trigger is None:
+        i_time_before_trigger = 1
+    else:
+        mcs_utils._check_time_before_trigger_validity(
+            data_time, times_before_trigger, sample_frequency=time_step
+            )
+        i_time_before_trigger = int(times_before_trigger // time_step)
+
+    tasks = []
+    for chunk_idx in np.unique(chunk_idxs):
+        tracks = np.flatnonzero(chunk_idxs == chunk_idx)
+        time_idxs = slice(
+            max(end_idxs[tracks].min() - i_time_before_trigger + 1, 0),
+            end_idxs[tracks].max() + 1,
+            )
+        tasks.append(
+            _ExtractionTask(
+                product, variable, zoom, time, catalog, location,
+                mcs_utils.compact_trigger_areas(
+                    mcs_trigger_locs.isel(tracks=tracks)
+                    ),
+                time_idxs, times_before_trigger, analysis_time, time_step,
+                )
+            )
+    return tasks
+
+
+def _map_tasks(
+        tasks: list,
+        max_workers: Optional[int] = None,
+        client=None,
+        ) -> Iterator[xr.DataArray]:
+    """
+    Run the extraction tasks in parallel and yield their results in the
+    order of the tasks.
+
+    At most `TASKS_PER_WORKER` tasks per worker are in flight at a time. A
+    new task is only submitted once the result of the oldest one has been
+    consumed, so that the results don't pile up in memory.
+    """
+    if client is not None:
+        n_workers = sum(client.nthreads().values())
+        submit = functools.partial(client.submit, _extract_task, pure=False)
+        yield from _map_tasks_throttled(submit, tasks, n_workers)
+    else:
+        n_workers = max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            submit = functools.partial(executor.submit, _extract_task)
+            yield from _map_tasks_throttled(submit, tasks, n_workers)
+
+
+def _map_tasks_throttled(
+        submit,
+        tasks: list,
+        n_workers: int,
+        ) -> Iterator[xr.DataArray]:
+    """
+    Submit the tasks with `submit` while keeping at most
+    `TASKS_PER_WORKER * n_workers` of them in flight, and yield their
+    results in order.
+    """
+    tasks = iter(tasks)
+    futures = collections.deque(
+        submit(task)
+        for task in itertools.islice(tasks, TASKS_PER_WORKER * n_workers)
+        )
+    while futures:
+        future = futures.popleft()
+        result = future.result()
+        if hasattr(future, 'release'):    # dask futures
+            future.release()
+        for task in itertools.islice(tasks, 1):
+            futures.append(submit(task))
+        yield result
+
+
+def _extract_task(task: _ExtractionTask) -> xr.DataArray:
+    """
+    Extract a variable in the trigger areas of the tracks of one task.
+
+    Only the time steps and trigger area cells needed by the tracks of the
+    task are read. The simulation data is expected on the full Healpix grid,
+    i.e. the position along 'cell' equals the Healpix cell index.
+    """
+    data_field = open_simulation_data(
+        task.product, task.zoom, task.time, task.catalog, task.location
+        )[task.variable]
+
+    cells = np.unique(task.mcs_trigger_locs['trigger_area_cells'].values)
+    data_field = data_field.drop_vars(['lat', 'lon'], errors='ignore')\
+        .isel(time=task.time_idxs, cell=cells)\
+        .assign_coords(cell=cells)\
+        .load()
+
+    return mcs_utils.get_var_in_trigger_area(
+        task.mcs_trigger_locs, data_field,
+        times_before_trigger=task.times_before_trigger,
+        analysis_time=task.analysis_time,
+        time_step=task.time_step,
+        ).assign_coords(
+            start_basetime=task.mcs_trigger_locs['start_basetime']
+            )
+
+
+def _write_to_zarr(
+        var_in_trigger_area: xr.DataArray,
+        variable: str,
+        store: Union[str, Path],
+        group: str,
+        append: bool,
+        ):
+    """
+    Write (or append along 'tracks') a variable in the trigger areas to a
+    group of a zarr store.
+    """
+    ds = var_in_trigger_area.to_dataset(name=variable)
+    if append:
+        ds.to_zarr(store, group=group, append_dim='tracks')
+    else:
+        ds.to_zarr(store, group=group, mode='w')
+
+
+# ------------------------------------------------------------------------------
+# Data access
+# ------------------------------------------------------------------------------
+@functools.lru_cache(maxsize=None)
+def open_simulation_data(
+        product: str,
+        zoom: int = 9,
+        time: str = "PT3H",
+        catalog: str = CATALOG,
+        location: str = LOCATION,
+        ) -> xr.Dataset:
+    """
+    Open the simulation data of a model from the intake catalog.
+
+    The opened dataset is cached, so that each worker process opens the
+    catalog only once.
+
+    Parameters
+    ----------
+    product : str
+        The model, e.g. "icon_d3hp003".
+    zoom : int, optional
+        Healpix zoom level, by default 9.
+    time : str, optional
+        Output frequency, by default "PT3H".
+    catalog : str, optional
+        URL of the intake catalog.
+    location : str, optional
+        Location of the data in the intake catalog.
+
+    Returns
+    -------
+    xr.Dataset
+        The lazily loaded simulation data with attached coordinates.
+    """
+    cat = intake.open_catalog(catalog)[location]
+    return cat[product](zoom=zoom, time=time, chunks="auto").to_dask().\
+        pipe(egh.attach_coords)
+
+
+def get_ocean_mask(product: str, data_field: xr.Dataset) -> xr.DataArray:
+    """
+    Get the ocean mask of a model, which is 1 over ocean and NaN over land.
+
+    Parameters
+    ----------
+    product : str
+        The model, e.g. "icon_d3hp003".
+    data_field : xr.Dataset
+        The simulation data of the model.
+
+    Returns
+    -------
+    xr.DataArray
+        The ocean mask.
+    """
+    if product == 'icon_ngc4008':
+        ofs = data_field['ocean_fraction_surface']
+        ocean_mask = ofs.where(ofs==1).compute()
+    else:
+        ofs = data_field['sftlf']
+        land_mask = ofs.where(ofs>0).compute()
+
+        ocean_mask = np.isnan(land_mask)
+        ocean_mask = ocean_mask.where(ocean_mask == 1)
+    if 'time' in ocean_mask.dims:
+        ocean_mask = ocean_mask.isel(time=0, drop=True)
+    return ocean_mask
+
+
+def get_mcs_trigger_locs(
+        product: str,
+        nside: int,
+        analysis_time: Tuple[np.datetime64, np.datetime64],
+        tropical_belt: Tuple[float, float],
+        ) -> xr.Dataset:
+    """
+    Read the MCS tracks of a model and get the trigger locations of all MCSs
+    that are triggered (i.e. don't start as a splitter) within the tropical
+    belt and the analysis period.
+
+    Parameters
+    ----------
+    product : str
+        The model, which must be a key of `mcs_utils.MCS_TRACK_FILES`.
+    nside : int
+        The nside parameter of the Healpix grid of the simulation data.
+    analysis_time : Tuple[np.datetime64, np.datetime64]
+        Start and end of the analysis period.
+    tropical_belt : Tuple[float, float]
+        Latitude range of the trigger locations.
+
+    Returns
+    -------
+    xr.Dataset
+        The MCS trigger locations with the variables 'start_basetime',
+        'start_lat', 'start_lon' and 'trigger_idx', sorted by
+        'start_basetime'.
+    """
+    mcs_tracks = xr.open_dataset(
+        mcs_utils.MCS_TRACK_FILES[product], chunks={}
+        )
+
+    # Subsample relevant information
+    mcs_tracks = mcs_tracks[
+        ['start_split_cloudnumber', 'start_basetime', 'meanlat', 'meanlon']
+        ].compute()
+
+    # Subsample MCS tracks to relevant time frame
+    mcs_tracks = mcs_tracks.where(
+        (mcs_tracks['start_basetime'] > analysis_time[0]) &
+        (mcs_tracks['start_basetime'] < analysis_time[1]),
+        drop=True,
+        )
+
+    # Select all tracks that don't start as a splitter but are triggered
+    mcs_tracks_triggered = mcs_tracks.where(
+        np.isnan(mcs_tracks["start_split_cloudnumber"]), drop=True,
+        )
+
+    # Keep only the start location of the tracks
+    mcs_tracks_triggered['start_lat'] = \
+        mcs_tracks_triggered['meanlat'].isel(times=0)
+    mcs_tracks_triggered['start_lon'] = \
+        mcs_tracks_triggered['meanlon'].isel(times=0)
+    mcs_trigger_locs = mcs_tracks_triggered.drop_vars(
+        ['meanlat', 'meanlon', 'start_split_cloudnumber', 'times']
+        )
+
+    # Select only tropical start locations of MCSs
+    mcs_trigger_locs = mcs_trigger_locs.where(
+        (mcs_trigger_locs['start_lat'] > tropical_belt[0]) &
+        (mcs_trigger_locs['start_lat'] < tropical_belt[1]),
+        drop=True,
+        )
+
+    # Assign the healpix cell index to each trigger location
+    mcs_trigger_locs['trigger_idx'] = (
+        'tracks',
+        hp.ang2pix(
+            nside,
+            mcs_trigger_locs['start_lon'].values,
+            mcs_trigger_locs['start_lat'].values,
+            nest=True, lonlat=True,
+            ),
+    )
+    return mcs_trigger_locs.sortby('start_basetime')
+
+
+def get_ocean_mcs_trigger_locs(
+        product: str,
+        data_field: xr.Dataset,
+        radii: np.ndarray,
+        analysis_time: Tuple[np.datetime64, np.datetime64],
+        tropical_belt: Tuple[float, float],
+        ) -> xr.Dataset:
+    """
+    Get the MCS trigger locations of a model together with their circular
+    trigger areas, keeping only MCSs whose trigger area is entirely over
+    ocean.
+
+    Parameters
+    ----------
+    product : str
+        The model, which must be a key of `mcs_utils.MCS_TRACK_FILES`.
+    data_field : xr.Dataset
+        The simulation data of the model.
+    radii : np.ndarray
+        Array of radii (in degrees) of the trigger areas.
+    analysis_time : Tuple[np.datetime64, np.datetime64]
+        Start and end of the analysis period.
+    tropical_belt : Tuple[float, float]
+        Latitude range of the trigger locations.
+
+    Returns
+    -------
+    xr.Dataset
+        The ocean-based MCS trigger locations and their trigger areas,
+        sorted by 'start_basetime'.
+    """
+    mcs_trigger_locs = get_mcs_trigger_locs(
+        product, egh.get_nside(data_field), analysis_time, tropical_belt
+        )
+    mcs_trigger_locs = mcs_utils.add_circular_trigger_areas(
+        mcs_trigger_locs, radii, data_field
+        )
+    return mcs_utils.remove_land_triggers(
+        mcs_trigger_locs, get_ocean_mask(product, data_field)
+        )
@@ -0,0 +1,128 @@
+"""
+Tests of the finite-difference operators on the HEALPix grid against
+analytic fields, healpy and the lat-lon derivatives.
+"""
+import numpy as np
+import pytest
+import xarray as xr
+import healpy
+
+import grid_func
+from constants import EARTH_RADIUS
+from test_remap import get_hp_field
+
+
+def get_latlon_field(func, resolution=0.5):
+    lats = np.arange(-80., 80. + resolution, resolution)
+    lons = np.arange(0., 360., resolution)
+    lat, lon = np.deg2rad(np.meshgrid(lats, lons, indexing='ij'))
+    return xr.DataArray(
+        func(lat, lon), dims=('lat', 'lon'), coords={'lat': lats, 'lon': lons}
+        )
+
+
+# Analytic fields f(lat, lon) and their Laplacian on the sphere (spherical
+# harmonics of degree l have the eigenvalue -l*(l + 1)/R**2)
+FIELDS = {
+    'z': (lambda lat, lon: np.sin(lat), 2),
+    'x': (lambda lat, lon: np.cos(lat)*np.cos(lon), 2),
+    'Y20': (lambda lat, lon: 3*np.sin(lat)**2 - 1, 6),
+    }
+
+
+def get_cell_lat_lon(nside):
+    lon, lat = healpy.pix2ang(
+        nside, np.arange(12*nside**2), nest=True, lonlat=True
+        )
+    return np.deg2rad(lat), np.deg2rad(lon)
+
+
+@pytest.mark.parametrize('nside', [1, 2, 16, 64])
+@pytest.mark.parametrize('nest', [True, False])
+def test_all_neighbours_match_healpy(nside, nest):
+    cells = np.arange(12*nside**2)
+    np.testing.assert_array_equal(
+        grid_func._get_all_neighbours(nside, cells, nest=nest),
+        healpy.get_all_neighbours(nside, cells, nest=nest),
+        )
+
+
+@pytest.mark.parametrize('name', FIELDS)
+def test_laplacian_on_hp_matches_analytic(name):
+    func, eigenvalue = FIELDS[name]
+    nside = 64
+    values = func(*get_cell_lat_lon(nside))
+    laplacian = grid_func.compute_laplacian_on_hp(get_hp_field(values, nside))
+    expected = -eigenvalue*values/EARTH_RADIUS**2
+    np.testing.assert_allclose(
+        laplacian.values, expected, atol=0.01*np.abs(expected).max()
+        )
+
+
+@pytest.mark.parametrize('name', FIELDS)
+def test_laplacian_on_hp_agrees_with_latlon(name):
+    func, _ = FIELDS[name]
+    nside = 64
+    lat, lon = get_cell_lat_lon(nside)
+    laplacian_hp = grid_func.compute_laplacian_on_hp(
+        get_hp_field(func(lat, lon), nside)
+        )
+    laplacian_latlon = grid_func.compute_laplacian_on_latlon(
+        get_latlon_field(func)
+        ).isel(lat=slice(2, -2), lon=slice(2, -2))
+
+    # Compare at the cells inside the lat-lon domain
+    inside = (np.abs(np.rad2deg(lat)) < 78.) & \
+        (np.rad2deg(lon) > 2.) & (np.rad2deg(lon) < 358.)
+    laplacian_latlon = laplacian_latlon.interp(
+        lat=xr.DataArray(np.rad2deg(lat[inside]), dims='cell'),
+        lon=xr.DataArray(np.rad2deg(lon[inside]), dims='cell'),
+        )
+    scale = np.abs(laplacian_latlon.values).max()
+    np.testing.assert_allclose(
+        laplacian_hp.values[inside], laplacian_latlon.values, atol=0.01*scale
+        )
+
+
+def test_gradient_on_hp_matches_analytic():
+    nside = 64
+    lat, lon = get_cell_lat_lon(nside)
+    # f = x = cos(lat) cos(lon)
+    dvar_dx, dvar_dy = grid_func.compute_gradient_on_hp(
+        get_hp_field(np.cos(lat)*np.cos(lon), nside)
+        )
+    scale = 1/EARTH_RADIUS
+    np.testing.assert_allclose(
+        dvar_dx.values, -np.sin(lon)/EARTH_RADIUS, atol=0.01*scale
+        )
+    np.testing.assert_allclose(
+        dvar_dy.values, -np.sin(lat)*np.cos(lon)/EARTH_RADIUS, atol=0.01*scale
+        )
+
+
+def test_hor_wind_conv_on_hp_of_rotation_is_zero():
+    nside = 64
+    lat, _ = get_cell_lat_lon(nside)
+    ua = get_hp_field(np.cos(lat), nside)
+    va = get_hp_field(np.zeros_like(lat), nside)
+    convergence = grid_func.compute_hor_wind_conv_on_hp(ua, va)
+    np.testing.assert_allclose(convergence.values, 0., atol=0.01/EARTH_RADIUS)
+
+
+def test_operators_on_cell_subset():
+    nside = 16
+    lat, lon = get_cell_lat_lon(nside)
+    values = np.sin(lat) + np.cos(lat)*np.cos(lon)
+    laplacian = grid_func.compute_laplacian_on_hp(get_hp_field(values, nside))
+
+    # Cells of a band, the stencils at its edges are incomplete
+    cells = np.flatnonzero(np.abs(np.rad2deg(lat)) < 30.)
+    laplacian_subset = grid_func.compute_laplacian_on_hp(
+        get_hp_field(values[cells], nside, cells)
+        )
+    is_complete = np.isfinite(laplacian_subset.values)
+    assert 0 < is_complete.sum() < cells.size
+    np.testing.assert_allclose(
+        laplacian_subset.values[is_complete],
+        laplacian.values[cells][is_complete],
+        )
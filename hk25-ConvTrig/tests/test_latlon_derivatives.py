@@ -0,0 +1,91 @@
+"""
+Tests of the fused lat-lon derivative kernel against the separate functions.
+"""
+import numpy as np
+import pytest
+import xarray as xr
+
+import grid_func
+from constants import EARTH_RADIUS
+
+
+def get_field(rng, shape=(3, 61, 120)):
+    return xr.DataArray(
+        rng.standard_normal(shape),
+        dims=('time', 'lat', 'lon'),
+        coords={
+            'lat': np.linspace(-30., 30., shape[1]),
+            'lon': np.linspace(0., 357., shape[2]),
+            },
+        )
+
+
+@pytest.fixture
+def fields():
+    rng = np.random.default_rng(42)
+    return get_field(rng), get_field(rng), get_field(rng)
+
+
+def test_fused_matches_separate(fields):
+    var, ua, va = fields
+    gradient, laplacian = grid_func.compute_gradient_and_laplacian_on_latlon(
+        var
+        )
+    expected = {
+        'dx': gradient[0],
+        'dy': gradient[1],
+        'abs_gradient': grid_func.absolute_gradient(gradient),
+        'laplacian': laplacian,
+        'convergence': grid_func.compute_hor_wind_conv_on_latlon(ua, va),
+        }
+    results = grid_func.compute_derivatives_on_latlon(
+        var, ua, va, derivatives=grid_func.LATLON_DERIVATIVES
+        )
+    assert list(results) == list(grid_func.LATLON_DERIVATIVES)
+    for name, result in results.items():
+        np.testing.assert_allclose(
+            result.values,
+            expected[name].transpose(*result.dims).values,
+            rtol=1e-12, atol=1e-30, err_msg=name,
+            )
+
+
+@pytest.mark.parametrize('derivatives', [('laplacian',), ('dy', 'dx')])
+def test_fused_subset_and_dask(fields, derivatives):
+    var = fields[0]
+    expected = grid_func.compute_derivatives_on_latlon(
+        var, derivatives=grid_func.LATLON_DERIVATIVES[:4]
+        )
+    results = grid_func.compute_derivatives_on_latlon(
+        var.chunk(time=1), derivatives=derivatives
+        )
+    assert list(results) == list(derivatives)
+    for name, result in results.items():
+        assert result.chunks is not None
+        np.testing.assert_allclose(result.values, expected[name].values)
+
+
+def test_fused_laplacian_matches_analytic():
+    lats = np.arange(-80., 80.5, 0.5)
+    lons = np.arange(0., 360., 0.5)
+    lat = np.deg2rad(lats)[:, np.newaxis]
+    lon = np.deg2rad(lons)[np.newaxis, :]
+    values = np.cos(lat)*np.cos(lon)
+    var = xr.DataArray(
+        values, dims=('lat', 'lon'), coords={'lat': lats, 'lon': lons}
+        )
+    laplacian = grid_func.compute_derivatives_on_latlon(
+        var, derivatives=('laplacian',)
+        )['laplacian']
+    expected = -2*values/EARTH_RADIUS**2
+    np.testing.assert_allclose(
+        laplacian.values[2:-2, 2:-2], expected[2:-2, 2:-2],
+        atol=1e-4/EARTH_RADIUS**2,
+        )
+
+
+def test_unknown_derivative(fields):
+    with pytest.raises(ValueError):
+        grid_func.compute_derivatives_on_latlon(
+            fields[0], derivatives=('curl',)
+            )
@@ -0,0 +1,117 @@
+"""
+Tests of the nest/ring index permutations and the lat-lon Remapper against
+the original per-cell and per-call implementations.
+"""
+import healpix
+import numpy as np
+import pytest
+import xarray as xr
+
+import grid_func
+
+NSIDE = 16
+LATS, LONS = (-30, 30, 31), (0, 358, 180)
+
+
+def get_hp_field(values, nside, cells=None):
+    crs = xr.DataArray(0, attrs={
+        'grid_mapping_name': 'healpix', 'healpix_nside': nside,
+        'healpix_order': 'nest',
+        })
+    if cells is None:
+        cells = np.arange(12*nside**2)
+    return xr.DataArray(
+        values, dims='cell', coords={'cell': cells, 'crs': crs}
+        )
+
+
+@pytest.mark.parametrize('nside', [1, 4, 16])
+def test_nest2ring_index_matches_loop(nside):
+    var = get_hp_field(np.zeros(12*nside**2), nside)
+    np.testing.assert_array_equal(
+        grid_func._nest2ring_index(var, nside),
+        [healpix.ring2nest(nside, i) for i in var.cell.values],
+        )
+    subset = var.isel(cell=slice(5, 12*nside**2, 7))
+    np.testing.assert_array_equal(
+        grid_func._nest2ring_index(subset, nside),
+        [healpix.ring2nest(nside, i) for i in subset.cell.values],
+        )
+
+
+@pytest.mark.parametrize('nside', [1, 4, 16])
+def test_ring2nest_index_matches_loop(nside):
+    var = get_hp_field(np.zeros(12*nside**2), nside)
+    np.testing.assert_array_equal(
+        grid_func._ring2nest_index(var, nside),
+        [healpix.nest2ring(nside, i) for i in np.arange(len(var))],
+        )
+    np.testing.assert_array_equal(
+        grid_func._ring2nest_index(var[:6*nside**2], nside),
+        [healpix.nest2ring(nside, i) for i in np.arange(6*nside**2)],
+        )
+
+
+def test_permutations_are_cached_and_read_only():
+    permutation = grid_func._get_ring2nest_permutation(NSIDE)
+    assert grid_func._get_ring2nest_permutation(NSIDE) is permutation
+    assert not permutation.flags.writeable
+    np.testing.assert_array_equal(
+        grid_func._get_nest2ring_permutation(NSIDE)[permutation],
+        np.arange(12*NSIDE**2),
+        )
+
+
+def get_var(chunks=None):
+    rng = np.random.default_rng(0)
+    var = get_hp_field(rng.standard_normal(12*NSIDE**2), NSIDE)
+    var = var.expand_dims(time=3).copy(
+        data=rng.standard_normal((3, 12*NSIDE**2))
+        )
+    return var if chunks is None else var.chunk(time=chunks)
+
+
+def reference_remap(var_hp, lats, lons, supersampling):
+    lon, lat = np.meshgrid(
+        np.linspace(lons[0], lons[1], lons[2]*supersampling['lon']),
+        np.linspace(lats[0], lats[1], lats[2]*supersampling['lat'])
+        )
+    idx = healpix.ang2pix(NSIDE, lon, lat, nest=True, lonlat=True)
+    return var_hp.values[:, idx].reshape(
+        -1, lats[2], supersampling['lat'], lons[2], supersampling['lon']
+        ).mean(axis=(2, 4))
+
+
+@pytest.mark.parametrize('supersampling', [
+    {'lon': 1, 'lat': 1}, {'lon': 2, 'lat': 3},
+    ])
+@pytest.mark.parametrize('chunks', [None, 1])
+def test_remapper_matches_reference(supersampling, chunks):
+    var = get_var(chunks)
+    remapped = grid_func.Remapper(NSIDE, LATS, LONS, supersampling)(var)
+    assert (remapped.chunks is not None) == (chunks is not None)
+    assert remapped.dims == ('time', 'lat', 'lon')
+    np.testing.assert_allclose(
+        remapped.values, reference_remap(var, LATS, LONS, supersampling),
+        rtol=1e-12,
+        )
+    xr.testing.assert_identical(
+        grid_func.remap_nn_hp2latlon(var, LATS, LONS, supersampling), remapped
+        )
+
+
+def test_remap_nn_hp2latlon_is_cached():
+    grid_func._get_remapper.cache_clear()
+    for _ in range(3):
+        grid_func.remap_nn_hp2latlon(get_var(), LATS, LONS)
+    assert grid_func._get_remapper.cache_info().hits == 2
+
+
+def test_remapper_save_load(tmp_path):
+    remapper = grid_func.Remapper(NSIDE, LATS, LONS, {'lon': 2, 'lat': 1})
+    remapper.save(tmp_path / 'remap_index.nc')
+    loaded = grid_func.Remapper.load(tmp_path / 'remap_index.nc')
+    assert (loaded.nside, loaded.lats, loaded.lons, loaded.supersampling) == (
+        remapper.nside, remapper.lats, remapper.lons, remapper.supersampling
+        )
+    xr.testing.assert_identical(loaded(get_var()), remapper(get_var()))
@@ -0,0 +1,209 @@
+"""
+Tests of the trigger area construction, its CSR layout and cache against
+per-track `hp.query_disc` calls.
+"""
+import healpy as hp
+import numpy as np
+import pytest
+import xarray as xr
+
+import mcs_utils
+
+NSIDE = 32
+RADII = np.array([1., 2.5, 4.])
+
+
+def get_hp_grid(nside=NSIDE, nest=True):
+    crs = xr.DataArray(0, attrs={
+        'grid_mapping_name': 'healpix', 'healpix_nside': nside,
+        'healpix_order': 'nest' if nest else 'ring',
+        })
+    return xr.DataArray(
+        np.zeros(12*nside**2), dims='cell', coords={'crs': crs}
+        )
+
+
+def get_mcs_trigger_locs(trigger_idxs):
+    tracks = np.arange(len(trigger_idxs))
+    return xr.Dataset(
+        {
+            'trigger_idx': ('tracks', np.asarray(trigger_idxs)),
+            'start_basetime': (
+                'tracks',
+                np.datetime64('2020-01-01T00') + tracks*np.timedelta64(1, 'h'),
+                ),
+            },
+        coords={'tracks': tracks},
+        )
+
+
+def get_trigger_idxs(nest=True, size=40, seed=0):
+    rng = np.random.default_rng(seed)
+    trigger_idxs = rng.integers(0, 12*NSIDE**2, size)
+    trigger_idxs[-5:] = trigger_idxs[:5]     # shared trigger cells
+    # Cells near the poles (outside of the equatorial belt)
+    trigger_idxs[5:7] = [0, 12*NSIDE**2 - 1]
+    return trigger_idxs if nest else hp.nest2ring(NSIDE, trigger_idxs)
+
+
+def query_disc(cell_idx, radius, nest=True):
+    return mcs_utils._get_trigger_area_idxs(NSIDE, nest, cell_idx, radius)
+
+
+def assert_matches_query_disc(mcs_trigger_locs, nest=True):
+    for j, cell_idx in enumerate(mcs_trigger_locs['trigger_idx'].values):
+        for i, radius in enumerate(RADII):
+            idxs = mcs_utils._select_trigger_area_idxs(mcs_trigger_locs, j, i)
+            np.testing.assert_array_equal(
+                np.sort(idxs), query_disc(cell_idx, radius, nest)
+                )
+            # The cells are sorted by increasing distance
+            cos_dist = np.dot(
+                hp.pix2vec(NSIDE, cell_idx, nest=nest),
+                hp.pix2vec(NSIDE, idxs, nest=nest),
+                )
+            assert np.all(np.diff(cos_dist) <= 1e-6)   # float32 distances
+
+
+@pytest.mark.parametrize('nest', [True, False])
+def test_batch_matches_query_disc(nest):
+    trigger_idxs = get_trigger_idxs(nest)
+    cells, offsets, sizes = mcs_utils._get_trigger_area_idxs_batch(
+        NSIDE, nest, trigger_idxs, RADII
+        )
+    assert sizes.shape == (trigger_idxs.size, RADII.size)
+    for j, cell_idx in enumerate(trigger_idxs):
+        for i, radius in enumerate(RADII):
+            np.testing.assert_array_equal(
+                np.sort(cells[offsets[j]:offsets[j] + sizes[j, i]]),
+                query_disc(cell_idx, radius, nest),
+                )
+
+
+@pytest.mark.parametrize('nest', [True, False])
+def test_csr_dataset(nest):
+    mcs_trigger_locs = mcs_utils.add_circular_trigger_areas(
+        get_mcs_trigger_locs(get_trigger_idxs(nest)), RADII,
+        get_hp_grid(nest=nest),
+        )
+    assert mcs_trigger_locs['trigger_area_offsets'].dims == ('tracks',)
+    assert mcs_trigger_locs['trigger_area_sizes'].dims == ('tracks', 'radius')
+    assert mcs_trigger_locs['trigger_area_cells'].dtype == np.int32
+    assert mcs_trigger_locs['trigger_area_cells'].attrs == {
+        'healpix_nside': NSIDE, 'healpix_nest': int(nest),
+        }
+    assert mcs_trigger_locs['radius'].attrs['units'] == 'degree'
+    assert_matches_query_disc(mcs_trigger_locs, nest)
+
+    # Tracks that trigger in the same cell share their trigger area
+    offsets = mcs_trigger_locs['trigger_area_offsets'].values
+    np.testing.assert_array_equal(offsets[-5:], offsets[:5])
+    assert mcs_trigger_locs['trigger_area_cells'].size == sum(
+        query_disc(cell_idx, RADII.max(), nest).size
+        for cell_idx in np.unique(mcs_trigger_locs['trigger_idx'].values)
+        )
+
+
+def test_compact_trigger_areas():
+    mcs_trigger_locs = mcs_utils.add_circular_trigger_areas(
+        get_mcs_trigger_locs(get_trigger_idxs()), RADII, get_hp_grid(),
+        )
+    subset = mcs_trigger_locs.isel(tracks=[3, 30, 36, 38])
+    compacted = mcs_utils.compact_trigger_areas(subset)
+    # Tracks 3 and 38 trigger in the same cell and keep sharing their area
+    offsets = compacted['trigger_area_offsets'].values
+    assert offsets[0] == offsets[-1]
+    assert compacted['trigger_area_cells'].size == \
+        compacted['trigger_area_sizes'].values[:3].max(axis=1).sum()
+    assert_matches_query_disc(compacted)
+
+
+def test_save_load_trigger_areas(tmp_path):
+    mcs_trigger_locs = mcs_utils.add_circular_trigger_areas(
+        get_mcs_trigger_locs(get_trigger_idxs(size=10)), RADII, get_hp_grid(),
+        )
+    path = mcs_utils.get_trigger_area_file(tmp_path / 'tracks.nc')
+    assert path == tmp_path / 'tracks_trigger_areas.nc'
+    mcs_utils.save_trigger_areas(mcs_trigger_locs, path)
+    xr.testing.assert_identical(
+        mcs_utils.load_trigger_areas(path), mcs_trigger_locs
+        )
+
+
+@pytest.mark.parametrize('nest', [True, False])
+def test_stencil_matches_exact(nest):
+    trigger_idxs = get_trigger_idxs(nest, size=200)
+    exact = mcs_utils._get_trigger_area_idxs_batch(
+        NSIDE, nest, trigger_idxs, RADII
+        )
+    stencil = mcs_utils._get_trigger_area_idxs_stencil(
+        NSIDE, nest, trigger_idxs, RADII
+        )
+    np.testing.assert_array_equal(stencil[2], exact[2])
+    for j in range(trigger_idxs.size):
+        np.testing.assert_array_equal(
+            np.sort(stencil[0][stencil[1][j]:stencil[1][j] + stencil[2][j, -1]]),
+            np.sort(exact[0][exact[1][j]:exact[1][j] + exact[2][j, -1]]),
+            )
+
+
+def test_unknown_method_raises():
+    with pytest.raises(ValueError):
+        mcs_utils.add_circular_trigger_areas(
+            get_mcs_trigger_locs([0]), RADII, get_hp_grid(), method='fast'
+            )
+
+
+def test_cache_hits_and_byte_bound():
+    cache = mcs_utils.TriggerAreaCache()
+    disc, cos_dist = cache.get(NSIDE, True, 100, 4.)
+    np.testing.assert_array_equal(np.sort(disc), query_disc(100, 4.))
+    assert disc.dtype == np.int32 and cos_dist.dtype == np.float32
+    assert not disc.flags.writeable
+    assert cache.get(NSIDE, True, 100, 4.)[0] is disc
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.nbytes == disc.nbytes + cos_dist.nbytes
+
+    # Keep room for about two trigger areas, the least recently used goes
+    cache = mcs_utils.TriggerAreaCache(max_bytes=int(2.5*cache.nbytes))
+    for cell_idx in [100, 101, 102]:
+        cache.get(NSIDE, True, cell_idx, 4.)
+    cache.get(NSIDE, True, 101, 4.)
+    cache.get(NSIDE, True, 103, 4.)
+    assert len(cache) == 2
+    assert cache.nbytes <= cache.max_bytes
+    assert list(cache._trigger_areas) == [
+        (NSIDE, True, 101, 4.), (NSIDE, True, 103, 4.),
+        ]
+
+
+def test_cache_npz_round_trip(tmp_path):
+    cache = mcs_utils.TriggerAreaCache(path=tmp_path / 'cache.npz')
+    mcs_utils._get_trigger_area_idxs_batch(
+        NSIDE, True, get_trigger_idxs(), RADII, cache
+        )
+    cache.get(NSIDE, False, 7, 2.)
+    cache.save()
+
+    loaded = mcs_utils.TriggerAreaCache(path=tmp_path / 'cache.npz')
+    assert list(loaded._trigger_areas) == list(cache._trigger_areas)
+    assert loaded.nbytes == cache.nbytes
+    for key, (disc, cos_dist) in cache._trigger_areas.items():
+        np.testing.assert_array_equal(loaded._trigger_areas[key][0], disc)
+        np.testing.assert_array_equal(loaded._trigger_areas[key][1], cos_dist)
+
+    # A loaded cache gives the same trigger areas without recomputing them
+    result = mcs_utils._get_trigger_area_idxs_batch(
+        NSIDE, True, get_trigger_idxs(), RADII, loaded
+        )
+    expected = mcs_utils._get_trigger_area_idxs_batch(
+        NSIDE, True, get_trigger_idxs(), RADII
+        )
+    assert loaded.misses == 0
+    for x, y in zip(result, expected):
+        np.testing.assert_array_equal(x, y)
+
+
+def test_empty_cache_save_load(tmp_path):
+    mcs_utils.TriggerAreaCache().save(tmp_path / 'empty.npz')
+    assert len(mcs_utils.TriggerAreaCache(path=tmp_path / 'empty.npz')) == 0
@@ -0,0 +1,147 @@
+"""
+Tests of the parallel trigger composite pipeline on a synthetic model.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import xarray as xr
+
+pytest.importorskip('zarr')
+import mcs_utils
+import trigger_composites
+from test_trigger_areas import RADII, get_hp_grid, get_trigger_idxs
+
+NSIDE = 32
+TIME = np.arange(
+    np.datetime64('2020-01-01T00'), np.datetime64('2020-01-04T00'),
+    np.timedelta64(3, 'h'),
+    )
+ANALYSIS_TIME = (TIME[0], TIME[-1])
+
+
+class ThreadClient:
+    """Stand-in for a dask client that runs the tasks in threads."""
+    def __init__(self, n_workers):
+        self.n_workers = n_workers
+        self.executor = ThreadPoolExecutor(n_workers)
+
+    def nthreads(self):
+        return {'worker': self.n_workers}
+
+    def submit(self, func, *args, pure=True):
+        return self.executor.submit(func, *args)
+
+
+def get_simulation_data():
+    rng = np.random.default_rng(0)
+    shape = (TIME.size, 12*NSIDE**2)
+    return xr.Dataset(
+        {
+            'tas': (('time', 'cell'), rng.standard_normal(shape)),
+            'pr': (('time', 'cell'), rng.standard_normal(shape)),
+            },
+        coords={'time': TIME},
+        )
+
+
+def get_ocean_mcs_trigger_locs(product, data_field, radii, *args):
+    rng = np.random.default_rng(len(product))
+    trigger_idxs = get_trigger_idxs(size=25, seed=len(product))
+    start_basetime = TIME[0] + np.timedelta64(1, 'h') * \
+        np.sort(rng.integers(7, 70, trigger_idxs.size))
+    mcs_trigger_locs = xr.Dataset(
+        {
+            'trigger_idx': ('tracks', trigger_idxs),
+            'start_basetime': ('tracks', start_basetime),
+            },
+        coords={'tracks': np.arange(trigger_idxs.size)},
+        )
+    return mcs_utils.add_circular_trigger_areas(
+        mcs_trigger_locs, radii, get_hp_grid()
+        )
+
+
+@pytest.fixture
+def synthetic_models(monkeypatch):
+    data = get_simulation_data()
+    monkeypatch.setattr(
+        trigger_composites, 'open_simulation_data', lambda *args: data
+        )
+    monkeypatch.setattr(
+        trigger_composites, 'get_ocean_mcs_trigger_locs',
+        get_ocean_mcs_trigger_locs,
+        )
+    return data
+
+
+@pytest.mark.parametrize('times_before_trigger', [None, np.timedelta64(6, 'h')])
+def test_pipeline_matches_direct_extraction(
+        tmp_path, synthetic_models, times_before_trigger
+        ):
+    store = tmp_path / 'composites.zarr'
+    products = ['model_a', 'model_bb']
+    trigger_composites.compute_trigger_composites(
+        products, ['tas', 'pr'], store, RADII, ANALYSIS_TIME,
+        times_before_trigger=times_before_trigger,
+        time_chunk=np.timedelta64(12, 'h'), client=ThreadClient(2),
+        )
+
+    for product in products:
+        mcs_trigger_locs = get_ocean_mcs_trigger_locs(
+            product, synthetic_models, RADII
+            )
+        for variable in ['tas', 'pr']:
+            data_field = synthetic_models[variable].assign_coords(
+                cell=np.arange(12*NSIDE**2)
+                )
+            expected = mcs_utils.get_var_in_trigger_area(
+                mcs_trigger_locs, data_field,
+                times_before_trigger=times_before_trigger,
+                analysis_time=ANALYSIS_TIME,
+                )
+            with xr.open_zarr(store, group=f"{product}/{variable}") as ds:
+                result = ds[variable].load()
+            np.testing.assert_array_equal(
+                result['start_basetime'], mcs_trigger_locs['start_basetime']
+                )
+            np.testing.assert_array_equal(result.values, expected.values)
+
+
+def test_extraction_tasks_split_by_time_chunk(synthetic_models):
+    mcs_trigger_locs = get_ocean_mcs_trigger_locs('model', synthetic_models, RADII)
+    tasks = trigger_composites._get_extraction_tasks(
+        'model', 'tas', 9, 'PT3H', '', '', mcs_trigger_locs,
+        synthetic_models['time'], np.timedelta64(1, 'D'),
+        np.timedelta64(6, 'h'), ANALYSIS_TIME,
+        )
+    assert len(tasks) == 3
+    assert sum(task.mcs_trigger_locs['tracks'].size for task in tasks) == \
+        mcs_trigger_locs['tracks'].size
+    for task in tasks:
+        start_basetime = task.mcs_trigger_locs['start_basetime'].values
+        assert np.unique((start_basetime - TIME[0]) // np.timedelta64(1, 'D')).size == 1
+        # The time steps of the task cover the pre-trigger periods
+        times = TIME[task.time_idxs]
+        assert times[0] <= start_basetime.min() - np.timedelta64(3, 'h')
+        assert times[-1] <= start_basetime.max() < times[-1] + np.timedelta64(3, 'h')
+        assert task.time_step == np.timedelta64(3, 'h')
+
+
+def test_map_tasks_throttled():
+    submitted, consumed = [], []
+
+    class Future:
+        def __init__(self, task):
+            self.task = task
+            submitted.append(task)
+            assert len(submitted) - len(consumed) <= \
+                trigger_composites.TASKS_PER_WORKER*3
+
+        def result(self):
+            consumed.append(self.task)
+            return self.task**2
+
+    results = list(trigger_composites._map_tasks_throttled(Future, range(20), 3))
+    assert results == [task**2 for task in range(20)]
+    assert submitted == list(range(20))
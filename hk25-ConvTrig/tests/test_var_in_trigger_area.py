@@ -0,0 +1,193 @@
+"""
+Tests of the extraction of variables in the trigger areas and of the ocean
+filter against per-track loops like the original implementation.
+"""
+import numpy as np
+import pytest
+import xarray as xr
+
+import mcs_utils
+from test_trigger_areas import RADII, get_hp_grid, get_trigger_idxs
+
+NSIDE = 32
+TIME = np.arange(
+    np.datetime64('2020-01-01T00'), np.datetime64('2020-01-03T00'),
+    np.timedelta64(3, 'h'),
+    )
+
+
+def get_mcs_trigger_locs(seed=0):
+    rng = np.random.default_rng(seed)
+    trigger_idxs = get_trigger_idxs(size=30, seed=seed)
+    start_basetime = TIME[0] + np.timedelta64(1, 'h') * \
+        rng.integers(0, 47, trigger_idxs.size)
+    mcs_trigger_locs = xr.Dataset(
+        {
+            'trigger_idx': ('tracks', trigger_idxs),
+            'start_basetime': ('tracks', start_basetime),
+            },
+        coords={'tracks': np.arange(trigger_idxs.size) + 100},
+        )
+    return mcs_utils.add_circular_trigger_areas(
+        mcs_trigger_locs, RADII, get_hp_grid()
+        )
+
+
+def get_data_field(mcs_trigger_locs, seed=0):
+    # A regional subset of cells in random order, which contains all trigger
+    # area cells
+    rng = np.random.default_rng(seed)
+    cells = np.union1d(
+        mcs_trigger_locs['trigger_area_cells'].values,
+        rng.integers(0, 12*NSIDE**2, 100),
+        )
+    cells = rng.permutation(cells)
+    return xr.DataArray(
+        rng.standard_normal((TIME.size, cells.size)), dims=('time', 'cell'),
+        coords={'time': TIME, 'cell': cells},
+        )
+
+
+def reference_var_in_trigger_area(mcs_trigger_locs, data_field):
+    result = mcs_utils._init_var_in_trigger_area(mcs_trigger_locs)
+    for j in range(mcs_trigger_locs['tracks'].size):
+        var_at_trigger = data_field.sel(
+            time=mcs_trigger_locs['start_basetime'].values[j], method='pad'
+            )
+        for i in range(RADII.size):
+            idxs = mcs_utils._select_trigger_area_idxs(mcs_trigger_locs, j, i)
+            result[j, :idxs.size, i] = var_at_trigger.sel(cell=idxs).values
+    return result
+
+
+def reference_var_in_trigger_area_multiple(
+        mcs_trigger_locs, data_field, times_before_trigger, analysis_time
+        ):
+    n_time = int(times_before_trigger // np.timedelta64(3, 'h'))
+    result = mcs_utils._init_var_in_trigger_area_multiple(
+        mcs_trigger_locs, n_time
+        )
+    for j in range(mcs_trigger_locs['tracks'].size):
+        start_basetime = mcs_trigger_locs['start_basetime'].values[j]
+        if start_basetime - times_before_trigger < analysis_time[0]:
+            continue
+        end_time = data_field['time'].sel(time=start_basetime, method='pad')
+        var_before_trigger = data_field.where(
+            (data_field['time'] > end_time - times_before_trigger) &
+            (data_field['time'] <= end_time), drop=True
+            )
+        if var_before_trigger['time'].size < n_time:
+            continue
+        for i in range(RADII.size):
+            idxs = mcs_utils._select_trigger_area_idxs(mcs_trigger_locs, j, i)
+            result[j, :idxs.size, i, :] = \
+                var_before_trigger.sel(cell=idxs).values.T
+    return result
+
+
+@pytest.mark.parametrize('max_time_steps', [1, 4, 32])
+def test_var_in_trigger_area_matches_loop(monkeypatch, max_time_steps):
+    monkeypatch.setattr(mcs_utils, 'MAX_TIME_STEPS_PER_READ', max_time_steps)
+    mcs_trigger_locs = get_mcs_trigger_locs()
+    data_field = get_data_field(mcs_trigger_locs)
+    result = mcs_utils.get_var_in_trigger_area(mcs_trigger_locs, data_field)
+    assert result.dims == ('tracks', 'cell', 'radius')
+    xr.testing.assert_identical(
+        result, reference_var_in_trigger_area(mcs_trigger_locs, data_field)
+        )
+
+
+@pytest.mark.parametrize('max_time_steps', [1, 4, 32])
+def test_var_in_trigger_area_multiple_matches_loop(monkeypatch, max_time_steps):
+    monkeypatch.setattr(mcs_utils, 'MAX_TIME_STEPS_PER_READ', max_time_steps)
+    mcs_trigger_locs = get_mcs_trigger_locs(seed=1)
+    data_field = get_data_field(mcs_trigger_locs, seed=1)
+    times_before_trigger = np.timedelta64(12, 'h')
+    analysis_time = (TIME[2], TIME[-1])
+    result = mcs_utils.get_var_in_trigger_area(
+        mcs_trigger_locs, data_field,
+        times_before_trigger=times_before_trigger, analysis_time=analysis_time,
+        )
+    expected = reference_var_in_trigger_area_multiple(
+        mcs_trigger_locs, data_field, times_before_trigger, analysis_time
+        )
+    assert result.dims == ('tracks', 'cell', 'radius', 'time')
+    np.testing.assert_array_equal(result['time'], np.arange(-4, 0))
+    xr.testing.assert_identical(result, expected)
+    assert np.isnan(result.values).all(axis=(1, 2, 3)).any()  # excluded tracks
+
+
+def test_var_in_trigger_area_time_step():
+    # A data field that only covers a part of the simulation period gives the
+    # same time dimension if the time step is given
+    mcs_trigger_locs = get_mcs_trigger_locs(seed=2)
+    data_field = get_data_field(mcs_trigger_locs, seed=2)
+    kwargs = dict(
+        times_before_trigger=np.timedelta64(6, 'h'),
+        analysis_time=(TIME[0], TIME[-1]),
+        )
+    full = mcs_utils.get_var_in_trigger_area(
+        mcs_trigger_locs, data_field, **kwargs
+        )
+    late = mcs_trigger_locs['start_basetime'].values >= TIME[-4]
+    part = mcs_utils.get_var_in_trigger_area(
+        mcs_trigger_locs.isel(tracks=np.flatnonzero(late)),
+        data_field.isel(time=slice(-6, None)),
+        time_step=np.timedelta64(3, 'h'), **kwargs,
+        )
+    xr.testing.assert_identical(
+        part, full.isel(tracks=np.flatnonzero(late)).isel(cell=part['cell'])
+        )
+
+
+def test_missing_cells_raise():
+    mcs_trigger_locs = get_mcs_trigger_locs()
+    data_field = get_data_field(mcs_trigger_locs)
+    with pytest.raises(KeyError):
+        mcs_utils.get_var_in_trigger_area(
+            mcs_trigger_locs, data_field.isel(cell=slice(1, None))
+            )
+
+
+def get_ocean_mask(mcs_trigger_locs, seed=0):
+    rng = np.random.default_rng(seed)
+    ocean_mask = xr.ones_like(get_data_field(mcs_trigger_locs))
+    land = rng.random(ocean_mask['cell'].size) < 0.01
+    return ocean_mask.where(~land).isel(time=slice(0, 2))
+
+
+def test_remove_land_triggers_matches_loop():
+    mcs_trigger_locs = get_mcs_trigger_locs()
+    ocean_mask = get_ocean_mask(mcs_trigger_locs)
+    expected = [
+        bool(ocean_mask.sel(cell=mcs_utils._select_trigger_area_idxs(
+            mcs_trigger_locs, j, RADII.size - 1
+            )).notnull().all())
+        for j in range(mcs_trigger_locs['tracks'].size)
+        ]
+    assert 0 < sum(expected) < len(expected)
+
+    ocean_trigger_locs = mcs_utils.remove_land_triggers(
+        mcs_trigger_locs, ocean_mask
+        )
+    np.testing.assert_array_equal(
+        ocean_trigger_locs['tracks'], mcs_trigger_locs['tracks'][expected]
+        )
+    xr.testing.assert_identical(
+        ocean_trigger_locs['trigger_area_cells'],
+        mcs_trigger_locs['trigger_area_cells'],
+        )
+
+
+def test_ocean_fraction_matches_loop():
+    mcs_trigger_locs = get_mcs_trigger_locs()
+    ocean_mask = get_ocean_mask(mcs_trigger_locs)
+    fraction = mcs_utils.get_trigger_area_ocean_fraction(
+        mcs_trigger_locs, ocean_mask
+        )
+    assert fraction.dims == ('tracks', 'radius')
+    for j in range(mcs_trigger_locs['tracks'].size):
+        for i in range(RADII.size):
+            idxs = mcs_utils._select_trigger_area_idxs(mcs_trigger_locs, j, i)
+            is_ocean = ocean_mask.sel(cell=idxs).notnull().all('time')
+            assert fraction.values[j, i] == pytest.approx(is_ocean.mean())
@@ -9,18 +9,22 @@ Authors:
 
 """
 
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import xarray as xr
 import healpy as hp
 
 
-def aggregate_grid(arr: np.ndarray, z_out: int, method: str='mean') -> np.ndarray:
+def aggregate_grid(arr: np.ndarray, z_out: int, method: str='mean', skipna: bool=False, weights: np.ndarray=None, return_count: bool=False) -> np.ndarray:
     """Spatially aggregate to a coarser grid.
 
     Parameters
     ----------
-    arr : np.ndarray, shape (M,)
-        The length of the array M has to be M = 12 * (2**zoom)**2
+    arr : np.ndarray, shape (..., M)
+        The length of the last axis M has to be M = 12 * (2**zoom)**2. All 
+        leading axes (e.g., time, level) are aggregated at once.
     z_out : int
         Healpix zoom level of the output grid. Needs to be smaller than the input zoom level.
     method : str, optional by default 'mean'
@@ -30,10 +34,21 @@ def aggregate_grid(arr: np.ndarray, z_out: int, method: str='mean') -> np.ndarra
         - 'std': Standard deviation of sub-grid cells
         - 'min': Minimum of sub-grid cells
         - 'max': Maximum of sub-grid cells
+    skipna : bool, optional by default False
+        If True, ignore missing values (NaN) in the sub-grid cells. Coarse cells
+        without any valid sub-grid cell are NaN.
+    weights : np.ndarray, shape (M,) or broadcastable to `arr`, optional
+        Weights of the sub-grid cells (e.g., land fraction) for 'mean' and 
+        'std'. Sub-grid cells with zero weight are ignored for all methods. 
+        Implies skipna=True.
+    return_count : bool, optional by default False
+        If True, also return the number of valid (non-NaN, non-zero weight) 
+        sub-grid cells of each coarse cell.
 
     Returns
     -------
-    np.ndarray, shape (N < M,)
+    np.ndarray, shape (..., N < M)
+        If return_count is True, a tuple of the aggregated array and the count.
 
     Info
     ----
@@ -64,7 +79,7 @@ def aggregate_grid(arr: np.ndarray, z_out: int, method: str='mean') -> np.ndarra
         11 |  2048 |       3.2 | 50,331,648
         12 |  4096 |       1.6 | 201,326,592
     """
-    npix_in = arr.size
+    npix_in = arr.shape[-1]
     npix_out = hp.nside2npix(2**z_out)
     
     if npix_out >= npix_in:
@@ -76,18 +91,82 @@ def aggregate_grid(arr: np.ndarray, z_out: int, method: str='mean') -> np.ndarra
     else:
         ratio = int(ratio)
     
+    if skipna or weights is not None or return_count:
+        return _aggregate_grid_valid(arr, npix_out, ratio, method, weights, return_count)
+
+    arr = arr.reshape(arr.shape[:-1] + (npix_out, ratio))
     if method == 'mean':
-        return arr.reshape(npix_out, ratio).mean(axis=-1)
+        return arr.mean(axis=-1)
     if method == 'std':
-        return arr.reshape(npix_out, ratio).std(axis=-1)
+        return arr.std(axis=-1)
     if method == 'min':
-        return arr.reshape(npix_out, ratio).min(axis=-1)
+        return arr.min(axis=-1)
     if method == 'max':
-        return arr.reshape(npix_out, ratio).max(axis=-1)
+        return arr.max(axis=-1)
         
     raise ValueError(f'{method=}')
 
 
+def _aggregate_grid_valid(arr: np.ndarray, npix_out: int, ratio: int, method: str, weights: np.ndarray=None, return_count: bool=False, cell_chunk: int=2**16):
+    """NaN-aware and weighted aggregation for `aggregate_grid`.
+
+    The coarse cells are processed in chunks of `cell_chunk`, so the masked 
+    and weighted temporaries only exist for one chunk of the input at a time 
+    and only the coarse output is allocated in full.
+    """
+    if method not in ['mean', 'std', 'min', 'max']:
+        raise ValueError(f'{method=}')
+
+    lead_shape = arr.shape[:-1]
+    arr = arr.reshape(-1, npix_out, ratio)
+    if weights is not None:
+        weights = np.broadcast_to(weights, lead_shape + (npix_out * ratio,)).reshape(arr.shape)
+    result = np.empty(arr.shape[:2], dtype=_aggregate_dtype(arr.dtype, method, skipna=True))
+    count = np.empty(arr.shape[:2], dtype=np.int64)
+
+    for start in range(0, npix_out, cell_chunk):
+        chunk = np.s_[:, start:start + cell_chunk]
+        block = arr[chunk]
+        valid = ~np.isnan(block)
+        if weights is not None:
+            valid &= weights[chunk] != 0
+        count[chunk] = valid.sum(axis=-1)
+
+        if method in ['min', 'max']:
+            fill = np.inf if method == 'min' else -np.inf
+            func = np.min if method == 'min' else np.max
+            result[chunk] = func(np.where(valid, block, fill), axis=-1)
+        else:
+            w = valid if weights is None else np.where(valid, weights[chunk], 0.)
+            sum_w = np.sum(w, axis=-1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.sum(w * np.where(valid, block, 0.), axis=-1) / sum_w
+                if method == 'std':
+                    anomaly = np.where(valid, block - mean[..., None], 0.)
+                    result[chunk] = np.sqrt(np.sum(w * anomaly**2, axis=-1) / sum_w)
+                else:
+                    result[chunk] = mean
+    result[count == 0] = np.nan
+
+    result = result.reshape(lead_shape + (npix_out,))
+    if return_count:
+        return result, count.reshape(lead_shape + (npix_out,))
+    return result
+
+
+def _aggregate_dtype(dtype, method: str, skipna: bool=False) -> np.dtype:
+    """Data type returned by `aggregate_grid` for input of data type `dtype`.
+
+    Floating point input keeps its precision, 'mean' and 'std' of other input 
+    are float64 (as for `np.mean`), as are NaN-aware (`skipna` or weighted) 
+    'min' and 'max', which need to represent empty cells.
+    """
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.floating) or (method in ['min', 'max'] and not skipna):
+        return dtype
+    return np.dtype(np.float64)
+
+
 def guess_gridn(da: xr.DataArray) -> str:
     """Try to gess the name of the spatial coordinate name from a list of frequent options."""
     dims = list(da.dims)
@@ -106,7 +185,7 @@ def guess_gridn(da: xr.DataArray) -> str:
     raise ValueError('gridn needs to be set manually to one of: {}'.format(', '.join(dims)))
 
 
-def attach_grid_info(da: xr.DataArray, gridn=None, return_latlon=False) -> xr.Dataset:
+def attach_grid_info(da: xr.DataArray, gridn=None, return_latlon=False, lazy=False, dtype=np.float64, chunks=None) -> xr.Dataset:
     """Attach to longitude and latitude values of each grid cell to the Dataset.
 
     Parameters
@@ -116,6 +195,14 @@ def attach_grid_info(da: xr.DataArray, gridn=None, return_latlon=False) -> xr.Da
         String specifying the name of the grid variable. If None, try to guess it from frequent options
     return_latlon: bool, optional, by default False
         If True, return the grid values as xr.DataArrays instead of creating a xr.Dataset and attaching them.
+    lazy : bool, optional, by default False
+        If True, longitude and latitude are dask arrays that are computed chunk by chunk on demand 
+        (see `lazy_pix2ang`), so selections only compute the chunks they touch.
+    dtype : np.dtype, optional, by default np.float64
+        Data type of longitude and latitude, e.g. np.float32 to halve their memory.
+    chunks : int, optional
+        Number of cells per chunk if lazy. By default the chunks of `da` along the grid dimension, 
+        or 2**20 cells if `da` is not chunked.
 
     Returns
     -------
@@ -124,17 +211,30 @@ def attach_grid_info(da: xr.DataArray, gridn=None, return_latlon=False) -> xr.Da
     """
     if gridn is None:  # try to guess grid name from frequent options
         gridn = guess_gridn(da)
-        
-    lon, lat = hp.pix2ang(hp.npix2nside(da[gridn].size), da[gridn].values, nest=True, lonlat=True) 
+
+    nside = hp.npix2nside(da[gridn].size)
+    if lazy:
+        if chunks is None:
+            chunks = da.chunksizes[gridn] if da.chunks else 2**20
+        cells = da[gridn].values if gridn in da.coords else None
+        lon, lat = lazy_pix2ang(nside, True, cells, da.sizes[gridn], chunks, dtype)
+        coords = {gridn: cells} if cells is not None else {}
+    else:
+        lon, lat = hp.pix2ang(nside, da[gridn].values, nest=True, lonlat=True) 
+        lon, lat = lon.astype(dtype, copy=False), lat.astype(dtype, copy=False)
+        coords = {gridn: da[gridn].values}
+
     lon = xr.DataArray(
         lon, 
-        coords={gridn: da[gridn].values},
+        dims=[gridn],
+        coords=coords,
         attrs={'units': 'degree_east', 'long_name': 'longitude'},
     )
 
     lat = xr.DataArray(
         lat, 
-        coords={gridn: da[gridn].values},
+        dims=[gridn],
+        coords=coords,
         attrs={'units': 'degree_north', 'long_name': 'latitude'},
     )
 
@@ -149,22 +249,153 @@ def attach_grid_info(da: xr.DataArray, gridn=None, return_latlon=False) -> xr.Da
     ds['lon'] = lon
     ds['lat'] = lat
     return ds
-    
 
-def aggregate_grid_xr(da: xr.DataArray, z_out: int, method: str='mean', gridn=None) -> xr.DataArray:
-    """Thin xarray wrapper for `aggregate_grid'."""
+
+def lazy_pix2ang(nside: int, nest: bool, cells: np.ndarray=None, size: int=None, chunks=2**20, dtype=np.float64) -> tuple:
+    """Longitude and latitude of Healpix cells as dask arrays, computed chunk by chunk on demand.
+
+    Parameters
+    ----------
+    nside : int
+    nest : bool
+    cells : np.ndarray, optional
+        Cell indices. If None, the cells 0, ..., size - 1.
+    size : int, optional
+        Number of cells if `cells` is None.
+    chunks : int or tuple of int, optional by default 2**20
+        Chunks along the cell dimension, e.g. those of the underlying zarr store.
+    dtype : np.dtype, optional by default np.float64
+
+    Returns
+    -------
+    tuple of dask.array.Array
+        (lon, lat)
+
+    Info
+    ----
+    Longitude and latitude of a chunk come from one `hp.pix2ang` call. Chunks 
+    of contiguous cells are cached per (nside, nest, first cell, last cell, dtype), 
+    so repeated selections do not recompute them. The least recently used 
+    chunks are dropped once the cache exceeds `_PIX2ANG_CACHE_BYTES`.
+    """
+    import dask.array as dsa
+
+    if cells is None:
+        cells = dsa.arange(size, chunks=chunks)
+    else:
+        cells = dsa.from_array(cells, chunks=chunks)
+    dtype = np.dtype(dtype)
+    lonlat = cells.map_blocks(
+        _pix2ang_block, nside, nest, dtype.str,
+        new_axis=0, chunks=((2,),) + cells.chunks, dtype=dtype,
+    )
+    return lonlat[0], lonlat[1]
+
+
+# Cache of the coordinates of contiguous chunks of cells of `lazy_pix2ang`
+_PIX2ANG_CACHE = OrderedDict()
+_PIX2ANG_CACHE_BYTES = 2**28
+_PIX2ANG_CACHE_LOCK = threading.Lock()
+
+
+def _pix2ang_block(cells: np.ndarray, nside: int, nest: bool, dtype: str) -> np.ndarray:
+    """Stacked longitude and latitude (2, N) of a chunk of cells, cached (read-only) if contiguous."""
+    contiguous = cells.size > 0 and cells[-1] - cells[0] + 1 == cells.size and np.all(np.diff(cells) == 1)
+    if not contiguous:
+        return np.stack(hp.pix2ang(nside, cells, nest=nest, lonlat=True)).astype(dtype)
+
+    key = (int(nside), bool(nest), int(cells[0]), int(cells[-1]) + 1, dtype)
+    with _PIX2ANG_CACHE_LOCK:
+        if key in _PIX2ANG_CACHE:
+            _PIX2ANG_CACHE.move_to_end(key)
+            return _PIX2ANG_CACHE[key]
+
+    lonlat = np.stack(hp.pix2ang(nside, cells, nest=nest, lonlat=True)).astype(dtype)
+    lonlat.flags.writeable = False
+    if lonlat.nbytes <= _PIX2ANG_CACHE_BYTES:
+        with _PIX2ANG_CACHE_LOCK:
+            _PIX2ANG_CACHE[key] = lonlat
+            nbytes = sum(values.nbytes for values in _PIX2ANG_CACHE.values())
+            while nbytes > _PIX2ANG_CACHE_BYTES:
+                nbytes -= _PIX2ANG_CACHE.popitem(last=False)[1].nbytes
+    return lonlat
+
+
+def aggregate_grid_levels(arr: np.ndarray, z_outs: list, method: str='mean', skipna: bool=False, weights: np.ndarray=None) -> tuple:
+    """Spatially aggregate to several coarser grids in one pass.
+
+    Parameters
+    ----------
+    arr : np.ndarray, shape (..., M)
+    z_outs : list of int
+        Healpix zoom levels of the output grids.
+    method : str, optional by default 'mean'
+        See `aggregate_grid`.
+    skipna, weights : optional
+        See `aggregate_grid`.
+
+    Returns
+    -------
+    tuple of np.ndarray, one per zoom level in `z_outs`
+
+    Info
+    ----
+    'mean', 'min' and 'max' are computed recursively, each zoom level from 
+    the next finer one. As all coarse cells contain the same number of fine 
+    cells this gives the same result as aggregating the input directly. 'std'
+    and NaN-aware or weighted means are computed from the input for each zoom
+    level.
+    """
+    recursive = method in ['min', 'max'] or (method == 'mean' and not skipna and weights is None)
+    results = {}
+    prev, z_prev = arr, None
+    for z_out in sorted(set(z_outs), reverse=True):
+        if not recursive or z_prev is None:
+            results[z_out] = aggregate_grid(arr, z_out, method, skipna=skipna, weights=weights)
+        else:
+            results[z_out] = aggregate_grid(prev, z_out, method, skipna=skipna or weights is not None)
+        prev, z_prev = results[z_out], z_out
+    return tuple(results[z_out] for z_out in z_outs)
+
+
+def aggregate_grid_xr(da: xr.DataArray, z_out, method: str='mean', gridn=None, skipna: bool=False, weights=None):
+    """Thin xarray wrapper for `aggregate_grid'.
+
+    The whole array is aggregated at once; dask arrays are aggregated chunk by
+    chunk along the other dimensions (the grid dimension needs to be a single 
+    chunk). If `z_out` is a list of zoom levels, all of them are computed in 
+    one pass (see `aggregate_grid_levels`) and a dict {zoom: xr.DataArray} is
+    returned. `weights` (along the grid dimension only) and `skipna` are 
+    passed on to `aggregate_grid`.
+    """
     
     if gridn is None:  # try to guess grid name from frequent options
         gridn = guess_gridn(da)
-            
-    return xr.apply_ufunc(
-        aggregate_grid,
-        da, z_out,
-        input_core_dims=[[gridn], []],
-        output_core_dims=[['tmp']],
-        vectorize=True,
-        kwargs={'method': method},
-    ).rename({'tmp': gridn})
+
+    valid_kwargs = {'skipna': skipna, 'weights': None if weights is None else np.asarray(weights)}
+    if np.isscalar(z_out):
+        z_outs = [z_out]
+        func, kwargs = aggregate_grid, {'z_out': z_out, 'method': method, **valid_kwargs}
+    else:
+        z_outs = list(z_out)
+        func, kwargs = aggregate_grid_levels, {'z_outs': z_outs, 'method': method, **valid_kwargs}
+
+    tmp_dims = [f'tmp{z}' for z in z_outs]
+    results = xr.apply_ufunc(
+        func,
+        da,
+        input_core_dims=[[gridn]],
+        output_core_dims=[[tmp_dim] for tmp_dim in tmp_dims],
+        dask='parallelized',
+        output_dtypes=[_aggregate_dtype(da.dtype, method, skipna=skipna or weights is not None)] * len(z_outs),
+        dask_gufunc_kwargs={
+            'output_sizes': {tmp_dim: hp.order2npix(z) for tmp_dim, z in zip(tmp_dims, z_outs)},
+        },
+        kwargs=kwargs,
+    )
+    if np.isscalar(z_out):
+        return results.rename({tmp_dims[0]: gridn})
+    return {z: result.rename({tmp_dim: gridn}) for z, tmp_dim, result in zip(z_outs, tmp_dims, results)}
 
 
 def subgrid_anomaly(fine: np.ndarray, z_coarse=None, coarse: np.ndarray=None) -> np.ndarray:
@@ -172,13 +403,13 @@ def subgrid_anomaly(fine: np.ndarray, z_coarse=None, coarse: np.ndarray=None) ->
 
     Parameters
     ----------
-    fine : np.ndarray, shape (M,)
+    fine : np.ndarray, shape (..., M)
     z_coarse : int, optional
-    coarse : np.ndarray, optional, shape (N < M,)
+    coarse : np.ndarray, optional, shape (..., N < M)
 
     Returns
     -------
-    np.ndarray, shape (M,)
+    np.ndarray, shape (..., M)
 
     Info
     ----
@@ -186,55 +417,409 @@ def subgrid_anomaly(fine: np.ndarray, z_coarse=None, coarse: np.ndarray=None) ->
 
     Alternatively data on a coarse grid can be provided (e.g., by first calculating them using `aggregate_grid`). This can also be used to calculate the difference between two different datasets on different zoom levels (e.g., an extreme index calculated on a fine grid against an extreme index calculated on a coarse grid)
     """
-    npix_fine = fine.size
+    npix_fine = fine.shape[-1]
 
     if coarse is None:
         if z_coarse is None:
             raise ValueError('Either `coarse` or `z_coarse` needs to be set')
         npix_coarse = hp.order2npix(z_coarse)
     elif z_coarse is None:
-        npix_coarse = coarse.size
+        npix_coarse = coarse.shape[-1]
     else:
-        if hp.order2npix(z_coarse) != coarse.size:
+        if hp.order2npix(z_coarse) != coarse.shape[-1]:
             raise ValueError('If `coarse` and `z_coarse` are given, theny need to be consistent')
-        npix_coarse = coarse.size
+        npix_coarse = coarse.shape[-1]
+
+
+    ratio = _subgrid_ratio(npix_fine, npix_coarse)
+
+    if coarse is None:
+        coarse = aggregate_grid(fine, z_coarse)
+    return _subgrid_anomaly_block(fine, ratio, coarse)
 
 
+def _subgrid_ratio(npix_fine: int, npix_coarse: int) -> int:
+    """Number of fine sub-grid cells per coarse cell, checking that both are Healpix grids."""
     if npix_coarse > npix_fine:
         raise ValueError('`fine` needs to have a higher zoom levels than `coarse`')
 
-    ratio = npix_fine / npix_coarse 
-    if not ratio.is_integer():  # this should never happen
+    ratio = npix_fine / npix_coarse
+    if not ratio.is_integer():
         raise ValueError(f'{ratio=}')
-    else:
-        ratio = int(ratio)
+    ratio = int(ratio)
+    if ratio & (ratio - 1) or ratio.bit_length() % 2 == 0:  # not a power of 4
+        raise ValueError(f'{ratio=} needs to be a power of 4')
+    return ratio
+
+
+def _subgrid_anomaly_block(fine: np.ndarray, ratio: int, coarse: np.ndarray=None) -> np.ndarray:
+    """Sub grid anomaly of a contiguous block of nested fine cells (..., M) whose coarse parents are 
+    `coarse` (..., M / ratio). If `coarse` is None, the mean of the block's sub-grid cells is used."""
+    fine_shape = fine.shape[:-1] + (fine.shape[-1] // ratio, ratio)
+    if coarse is None:
+        coarse = fine.reshape(fine_shape).mean(axis=-1)
+    anomaly = fine.reshape(fine_shape) - coarse[..., None]
+    return anomaly.reshape(fine.shape)
 
-    if coarse is not None:
-        return (fine.reshape(npix_coarse, ratio) - coarse.reshape(npix_coarse, 1)).ravel()
-    return (fine.reshape(npix_coarse, ratio) - aggregate_grid(fine, z_coarse).reshape(npix_coarse, 1)).ravel()
 
 
+def subgrid_anomaly_chunked(da_fine, z_coarse=None, da_coarse=None, gridn=None, cell_chunk=None, store=None, name=None, mode='w'):
+    """Dask-native `subgrid_anomaly` for datasets larger than memory.
+
+    In the nested Healpix ordering a contiguous block of fine cells whose length 
+    is a multiple of the number of sub-grid cells per coarse cell has exactly 
+    the contiguous coarse cells of the block as parents. The fine data are 
+    therefore chunked along the grid dimension at such multiples and each chunk
+    is processed independently (`dask.array.map_blocks`), so neither the fine 
+    nor the coarse data need to be fully in memory.
+
+    Parameters
+    ----------
+    da_fine : xr.DataArray
+        Data on the fine grid, numpy- or dask-backed.
+    z_coarse : int, optional
+    da_coarse : xr.DataArray, optional
+        Data on the coarse grid, with the same or a subset of the other 
+        dimensions of `da_fine`. See `subgrid_anomaly`.
+    gridn : string, optional, by default None
+        String specifying the name of the grid variable. If None, try to guess it from frequent options
+    cell_chunk : int, optional
+        Number of fine cells per chunk, rounded down to a multiple of the number 
+        of sub-grid cells per coarse cell. By default the existing chunk size of
+        `da_fine` along the grid dimension, or 2**20 for numpy-backed data.
+    store : str or zarr store, optional
+        If given, the anomaly is written chunk by chunk to this zarr store.
+    name : str, optional
+        Variable name in the zarr store, by default the name of `da_fine` or
+        'anomaly'.
+    mode : str, optional by default 'w'
+        Write mode for `xr.Dataset.to_zarr`.
+
+    Returns
+    -------
+    xr.DataArray
+        The lazy (dask-backed) sub grid anomaly on the fine grid.
+    """
+    import dask.array as dsa
+
+    if gridn is None:  # try to guess grid name from frequent options
+        gridn = guess_gridn(da_fine)
+
+    npix_fine = da_fine.sizes[gridn]
+    if da_coarse is None:
+        if z_coarse is None:
+            raise ValueError('Either `da_coarse` or `z_coarse` needs to be set')
+        npix_coarse = hp.order2npix(z_coarse)
+    else:
+        npix_coarse = da_coarse.sizes[gridn]
+        if z_coarse is not None and hp.order2npix(z_coarse) != npix_coarse:
+            raise ValueError('If `coarse` and `z_coarse` are given, theny need to be consistent')
+    ratio = _subgrid_ratio(npix_fine, npix_coarse)
+
+    if cell_chunk is None:
+        cell_chunk = da_fine.chunksizes[gridn][0] if da_fine.chunks else 2**20
+    cell_chunk = max(ratio, min(cell_chunk, npix_fine) // ratio * ratio)
+
+    other_dims = [dim for dim in da_fine.dims if dim != gridn]
+    da_fine = da_fine.transpose(*other_dims, gridn).chunk({gridn: cell_chunk})
+    if da_coarse is None:
+        data = dsa.map_blocks(
+            _subgrid_anomaly_block, da_fine.data, ratio=ratio,
+            dtype=_aggregate_dtype(da_fine.dtype, 'mean'),
+        )
+    else:
+        missing_dims = {dim: da_fine.sizes[dim] for dim in other_dims if dim not in da_coarse.dims}
+        da_coarse = da_coarse.expand_dims(missing_dims).transpose(*other_dims, gridn).chunk({
+            **{dim: da_fine.chunksizes[dim] for dim in other_dims},
+            gridn: cell_chunk // ratio,
+        })
+        data = dsa.map_blocks(
+            lambda fine, coarse: _subgrid_anomaly_block(fine, ratio, coarse),
+            da_fine.data, da_coarse.data,
+            dtype=np.result_type(da_fine.dtype, da_coarse.dtype),
+        )
+    anomaly = da_fine.copy(data=data)
+
+    if store is not None:
+        name = name or da_fine.name or 'anomaly'
+        anomaly.to_dataset(name=name).to_zarr(store, mode=mode)
+    return anomaly
+
 
 def subgrid_anomaly_xr(da_fine, z_coarse=None, da_coarse=None, gridn=None):
-    """Thin xarray wrapper for `subgrid_anomaly`."""
+    """Thin xarray wrapper for `subgrid_anomaly`.
+
+    The whole array is processed at once; dask arrays are processed chunk by
+    chunk along the other dimensions (the grid dimension needs to be a single 
+    chunk).
+    """
     if gridn is None:  # try to guess grid name from frequent options
         gridn = guess_gridn(da_fine)
 
     if da_coarse is not None:
         return xr.apply_ufunc(
-            subgrid_anomaly,
+            lambda fine, coarse: subgrid_anomaly(fine, z_coarse, coarse),
             da_fine, da_coarse.rename({gridn: 'tmp'}),
             input_core_dims=[[gridn], ['tmp']],
             output_core_dims=[[gridn]],
-            vectorize=True,
-            kwargs={'z_coarse': z_coarse},
+            dask='parallelized',
+            output_dtypes=[np.result_type(da_fine.dtype, da_coarse.dtype)],
         )
     return xr.apply_ufunc(
         subgrid_anomaly,
         da_fine,
         input_core_dims=[[gridn]],
         output_core_dims=[[gridn]],
-        vectorize=True,
+        dask='parallelized',
+        output_dtypes=[_aggregate_dtype(da_fine.dtype, 'mean')],
         kwargs={'z_coarse': z_coarse},
     )
 
+
+def healpix_pyramid(arr: np.ndarray, z_min: int=0, stats: tuple=('mean', 'std', 'min', 'max'), bins: np.ndarray=None, z_hist: int=None) -> dict:
+    """Aggregate to all coarser zoom levels down to `z_min` in one pass.
+
+    Parameters
+    ----------
+    arr : np.ndarray, shape (..., M)
+        The length of the last axis M has to be M = 12 * (2**zoom)**2. Missing
+        values (NaN) are ignored.
+    z_min : int, optional, by default 0
+        Coarsest Healpix zoom level of the pyramid.
+    stats : tuple of str, optional
+        Statistics to return for each zoom level, any of 'mean', 'std', 'min', 
+        'max' and 'count' (the number of valid sub-grid cells).
+    bins : np.ndarray, optional, by default None
+        If given, also return the 'histogram' (..., N, len(bins) - 1) of the 
+        valid sub-grid values for each zoom level, which can be used as a 
+        mergeable quantile sketch (see `pyramid_quantile`). Values outside the
+        bins are not counted.
+    z_hist : int, optional, by default z_min
+        Finest zoom level to return the histogram for. Each histogram holds 
+        len(bins) - 1 counts per cell, so it is only returned for `z_hist` 
+        and coarser levels.
+
+    Returns
+    -------
+    dict
+        {zoom: {stat: np.ndarray, shape (..., N)}} for all zoom levels from 
+        the input zoom level - 1 to `z_min`.
+
+    Info
+    ----
+    Each zoom level is reduced from the next finer one by a factor of 4: 
+    counts, means, sums of squared deviations from the mean (merged with 
+    Chan's parallel formula, in float64), minima, maxima and histograms are 
+    accumulated recursively. The input is therefore read only once, in 
+    contrast to calling `aggregate_grid` for each method and zoom level. 
+    The first level is reduced from the input in chunks of cells, so apart 
+    from small temporaries only arrays of the coarser levels are allocated.
+    """
+    z_in = hp.nside2order(hp.npix2nside(arr.shape[-1]))
+    if z_min >= z_in:
+        raise ValueError('Outuput zoom level needs to be smaller than input zoom level')
+    if z_hist is None:
+        z_hist = z_min
+    if bins is not None and not z_min <= z_hist < z_in:
+        raise ValueError('Histogram zoom level needs to be between z_min and the input zoom level - 1')
+
+    count, mean, m2, mins, maxs = _moments_by_4(arr)
+    hist = None
+
+    pyramid = {}
+    for z_out in range(z_in - 1, z_min - 1, -1):
+        if z_out < z_in - 1:
+            count, mean, m2 = _merge_moments_by_4(count, mean, m2)
+            mins, maxs = _reduce_by_4(mins, np.min), _reduce_by_4(maxs, np.max)
+
+        level = {}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if 'mean' in stats:
+                level['mean'] = np.where(count > 0, mean, np.nan)
+            if 'std' in stats:
+                level['std'] = np.sqrt(m2 / count)
+        if 'min' in stats:
+            level['min'] = np.where(count > 0, mins, np.nan)
+        if 'max' in stats:
+            level['max'] = np.where(count > 0, maxs, np.nan)
+        if 'count' in stats:
+            level['count'] = count
+        if bins is not None and z_out <= z_hist:
+            if hist is None:
+                hist = _histogram(arr, bins, hp.order2npix(z_out))
+            else:
+                hist = _reduce_by_4(hist, np.sum, axis=-2)
+            level['histogram'] = hist
+        pyramid[z_out] = level
+    return pyramid
+
+
+def _reduce_by_4(arr: np.ndarray, func, axis: int=-1) -> np.ndarray:
+    """Reduce the grid axis by a factor of 4 (one zoom level)."""
+    axis = axis % arr.ndim
+    shape = arr.shape[:axis] + (arr.shape[axis] // 4, 4) + arr.shape[axis + 1:]
+    return func(arr.reshape(shape), axis=axis + 1)
+
+
+def _moments_by_4(arr: np.ndarray, cell_chunk: int=2**16) -> tuple:
+    """Counts, means, sums of squared deviations, minima and maxima of the valid values of 4 sub-grid cells.
+
+    The coarse cells are processed in chunks of `cell_chunk` to bound the 
+    size of the temporary arrays. Means and sums of squared deviations are 
+    float64, minima and maxima keep floating point input precision.
+    """
+    lead_shape = arr.shape[:-1]
+    npix_out = arr.shape[-1] // 4
+    arr = arr.reshape(-1, npix_out, 4)
+    count = np.empty(arr.shape[:2], dtype=np.int64)
+    mean = np.empty(arr.shape[:2])
+    m2 = np.empty(arr.shape[:2])
+    mins = np.empty(arr.shape[:2], dtype=_aggregate_dtype(arr.dtype, 'mean'))
+    maxs = np.empty_like(mins)
+    for start in range(0, npix_out, cell_chunk):
+        chunk = np.s_[:, start:start + cell_chunk]
+        block = arr[chunk]
+        valid = ~np.isnan(block)
+        values = np.where(valid, block, 0.).astype(np.float64)
+        count[chunk] = valid.sum(axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean[chunk] = np.where(count[chunk] > 0, values.sum(axis=-1) / count[chunk], 0.)
+        m2[chunk] = np.sum(np.where(valid, values - mean[chunk][..., None], 0.)**2, axis=-1)
+        mins[chunk] = np.where(valid, block, np.inf).min(axis=-1)
+        maxs[chunk] = np.where(valid, block, -np.inf).max(axis=-1)
+    return tuple(x.reshape(lead_shape + (npix_out,)) for x in (count, mean, m2, mins, maxs))
+
+
+def _merge_moments_by_4(count: np.ndarray, mean: np.ndarray, m2: np.ndarray) -> tuple:
+    """Merge counts, means and sums of squared deviations of 4 sub-grid cells (Chan et al.)."""
+    count_out = _reduce_by_4(count, np.sum)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_out = np.where(
+            count_out > 0, _reduce_by_4(count * mean, np.sum) / count_out, 0.)
+    deviation = mean - np.repeat(mean_out, 4, axis=-1)
+    m2_out = _reduce_by_4(m2 + count * deviation**2, np.sum)
+    return count_out, mean_out, m2_out
+
+
+def _histogram(arr: np.ndarray, bins: np.ndarray, npix_out: int, cell_chunk: int=2**16) -> np.ndarray:
+    """Histogram (..., npix_out, len(bins) - 1) of the sub-grid values of each coarse cell.
+
+    The coarse cells are processed in chunks of `cell_chunk` to bound the 
+    size of the temporary index arrays.
+    """
+    nbins = len(bins) - 1
+    lead_shape = arr.shape[:-1]
+    ratio = arr.shape[-1] // npix_out
+    arr = arr.reshape(-1, npix_out, ratio)
+    counts = np.zeros((arr.shape[0], npix_out, nbins), dtype=np.int64)
+    for start in range(0, npix_out, cell_chunk):
+        block = arr[:, start:start + cell_chunk]
+        idx_bin = np.searchsorted(bins, block, side='right') - 1
+        idx_bin[block == bins[-1]] = nbins - 1  # include the right edge like np.histogram
+        inside = (idx_bin >= 0) & (idx_bin < nbins)  # also excludes NaN
+
+        idx_coarse = np.arange(block.shape[0] * block.shape[1]).repeat(ratio).reshape(block.shape)
+        counts[:, start:start + cell_chunk] = np.bincount(
+            (idx_coarse * nbins + idx_bin)[inside], minlength=idx_coarse.size // ratio * nbins
+        ).reshape(block.shape[:2] + (nbins,))
+    return counts.reshape(lead_shape + (npix_out, nbins))
+
+
+def pyramid_quantile(histogram: np.ndarray, bins: np.ndarray, q: float) -> np.ndarray:
+    """Estimate a quantile from the histograms of `healpix_pyramid`.
+
+    Parameters
+    ----------
+    histogram : np.ndarray, shape (..., len(bins) - 1)
+    bins : np.ndarray
+        The bin edges the histogram was computed with.
+    q : float
+        Quantile between 0 and 1.
+
+    Returns
+    -------
+    np.ndarray, shape (...)
+        The quantile, linearly interpolated within its bin; NaN if there are no
+        values.
+    """
+    total = histogram.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cdf = np.cumsum(histogram, axis=-1) / total
+    idx = np.minimum(np.sum(cdf < q, axis=-1, keepdims=True), histogram.shape[-1] - 1)
+    cdf_prev = np.where(idx > 0, np.take_along_axis(cdf, np.maximum(idx - 1, 0), axis=-1), 0.)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = (q - cdf_prev) / (np.take_along_axis(histogram, idx, axis=-1) / total)
+    quantile = bins[idx] + np.clip(frac, 0., 1.) * np.diff(bins)[idx]
+    return np.where(total > 0, quantile, np.nan)[..., 0]
+
+
+def healpix_pyramid_xr(da: xr.DataArray, z_min: int=0, stats: tuple=('mean', 'std', 'min', 'max'), bins=None, z_hist: int=None, gridn=None) -> dict:
+    """Thin xarray wrapper for `healpix_pyramid`.
+
+    Dask arrays are processed chunk by chunk along the other dimensions (the 
+    grid dimension needs to be a single chunk), computing all zoom levels and 
+    statistics from one read of each chunk.
+
+    Returns
+    -------
+    dict
+        {zoom: xr.Dataset} with one variable per statistic.
+    """
+    if gridn is None:  # try to guess grid name from frequent options
+        gridn = guess_gridn(da)
+
+    z_in = hp.nside2order(hp.npix2nside(da[gridn].size))
+    zooms = list(range(z_in - 1, z_min - 1, -1))
+    if z_hist is None:
+        z_hist = z_min
+    names = [stat for stat in ('mean', 'std', 'min', 'max', 'count') if stat in stats]
+    keys = [(z, name) for z in zooms for name in names]
+    if bins is not None:
+        keys += [(z, 'histogram') for z in zooms if z <= z_hist]
+
+    def _pyramid(arr):
+        pyramid = healpix_pyramid(arr, z_min=z_min, stats=stats, bins=bins, z_hist=z_hist)
+        return tuple(pyramid[z][name] for z, name in keys)
+
+    # NaN-aware minima and maxima are promoted like the mean
+    dtypes = {'count': np.int64, 'histogram': np.int64, 
+              'min': _aggregate_dtype(da.dtype, 'mean'), 'max': _aggregate_dtype(da.dtype, 'mean')}
+    output_sizes = {f'tmp{z}': hp.order2npix(z) for z in zooms}
+    if bins is not None:
+        output_sizes['bin'] = len(bins) - 1
+    results = xr.apply_ufunc(
+        _pyramid,
+        da,
+        input_core_dims=[[gridn]],
+        output_core_dims=[[f'tmp{z}', 'bin'] if name == 'histogram' else [f'tmp{z}'] for z, name in keys],
+        dask='parallelized',
+        output_dtypes=[dtypes.get(name, float) for _, name in keys],
+        dask_gufunc_kwargs={'output_sizes': output_sizes},
+    )
+    if len(keys) == 1:
+        results = (results,)
+
+    pyramid = {z: xr.Dataset() for z in zooms}
+    for (z, name), result in zip(keys, results):
+        pyramid[z][name] = result.rename({f'tmp{z}': gridn})
+    if bins is not None:
+        for z in zooms:
+            if z <= z_hist:
+                pyramid[z] = pyramid[z].assign_coords(
+                    bin_lower=('bin', bins[:-1]), bin_upper=('bin', bins[1:]))
+    return pyramid
+
+
+def write_pyramid_zarr(pyramid: dict, store, mode: str='w'):
+    """Write a pyramid from `healpix_pyramid_xr` to a zarr store, one group 'z{zoom}' per zoom level.
+
+    All zoom levels are written in one dask computation, so a dask-backed 
+    input is read only once.
+    """
+    import dask
+
+    writes = [
+        ds.to_zarr(store, group=f'z{z}', mode=mode, compute=False)
+        for z, ds in pyramid.items()
+    ]
+    dask.compute(*writes)
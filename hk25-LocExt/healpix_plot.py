@@ -9,16 +9,22 @@ Authors:
 
 """
 
+import os
+import hashlib
+from collections import OrderedDict
+
 import numpy as np
 import xarray as xr
 import healpy as hp
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
-import easygems.healpix as egh
 import cartopy.feature as cfeature
 from matplotlib import patches
 
+_RESAMPLER_CACHE = OrderedDict()
+_RESAMPLER_CACHE_SIZE = 16
+
 
 def get_listed_colormap(levels, cmap='viridis', extend='neither', white=None, return_colors=False):
     """
@@ -114,6 +120,187 @@ def get_diverging_colormap(levels=12, cmap_neg='Blues', cmap_pos='Reds', middle_
     return cmap
 
 
+class HpResampler:
+    """
+    Resample HEALPix maps onto the pixels of a projected image.
+
+    The mapping from image pixels to HEALPix cells only depends on the projection,
+    the extent, the image size and the grid and is computed once. Every call then
+    reduces to a gather of the data values (and a weighted sum for method='linear').
+
+    Parameters
+    ----------
+    projection : cartopy.crs.Projection
+    xlims, ylims : tuple of float
+        Extent of the image in projection coordinates
+    nx, ny : int
+        Number of image pixels in x and y direction
+    nside : int
+    method : string, optional, one of {'nearest', 'linear'}, by default 'nearest'
+    nest : bool, optional, by default True
+
+    Info
+    ----
+    The image is sampled at the pixel centres, like `easygems.healpix.healpix_resample`.
+    """
+    def __init__(self, projection, xlims, ylims, nx, ny, nside, method='nearest', nest=True):
+        if method not in ['nearest', 'linear']:
+            raise ValueError(f'method has to be one of "nearest", "linear" not {method}')
+        self.shape = (int(ny), int(nx))
+        self.nside = int(nside)
+        self.method = method
+        self.nest = bool(nest)
+
+        dx = (xlims[1] - xlims[0]) / self.shape[1]
+        dy = (ylims[1] - ylims[0]) / self.shape[0]
+        xvals, yvals = np.meshgrid(
+            np.linspace(xlims[0] + dx / 2, xlims[1] - dx / 2, self.shape[1]),
+            np.linspace(ylims[0] + dy / 2, ylims[1] - dy / 2, self.shape[0]),
+        )
+        lonlat = ccrs.PlateCarree().transform_points(
+            projection, xvals, yvals, np.zeros_like(xvals))
+        self.valid = np.all(np.isfinite(lonlat), axis=-1)
+        lon, lat = lonlat[self.valid].T[:2]
+
+        if method == 'nearest':
+            self.idx = hp.ang2pix(self.nside, lon, lat, nest=nest, lonlat=True)
+            self.weights = None
+        else:
+            self.idx, self.weights = hp.get_interp_weights(
+                self.nside, lon, lat, nest=nest, lonlat=True)
+
+    def __call__(self, data):
+        """
+        Parameters
+        ----------
+        data : np.ndarray, shape (..., N)
+            Full HEALPix map(s) with N = 12 * nside**2
+
+        Returns
+        -------
+        im : np.ndarray, shape (..., ny, nx)
+            Pixels outside of the projection domain are NaN.
+        """
+        data = np.asarray(data)
+        if data.shape[-1] != hp.nside2npix(self.nside):
+            raise ValueError(f'data needs to be a full HEALPix map with nside={self.nside}')
+
+        if self.weights is None:
+            values = data[..., self.idx]
+        else:
+            values = (data[..., self.idx] * self.weights).sum(axis=-2)
+
+        im = np.full(
+            data.shape[:-1] + self.shape, np.nan, dtype=np.result_type(data.dtype, np.float32))
+        im[..., self.valid] = values
+        return im
+
+    def save(self, filename):
+        """
+        Store the resampler in an .npz file.
+
+        Parameters
+        ----------
+        filename : string
+            Path of the .npz file, see `np.savez`.
+        """
+        np.savez(
+            filename,
+            shape=self.shape,
+            nside=self.nside,
+            method=self.method,
+            nest=self.nest,
+            valid=self.valid,
+            idx=self.idx,
+            weights=np.empty(0) if self.weights is None else self.weights,
+        )
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load a resampler stored with `save`.
+
+        Parameters
+        ----------
+        filename : string
+
+        Returns
+        -------
+        resampler : HpResampler
+            `nest` is None for files written without the grid ordering.
+        """
+        with np.load(filename) as npz:
+            resampler = cls.__new__(cls)
+            resampler.shape = tuple(int(nn) for nn in npz['shape'])
+            resampler.nside = int(npz['nside'])
+            resampler.method = str(npz['method'])
+            resampler.nest = bool(npz['nest']) if 'nest' in npz.files else None
+            resampler.valid = npz['valid']
+            resampler.idx = npz['idx']
+            resampler.weights = None if resampler.method == 'nearest' else npz['weights']
+        return resampler
+
+
+def get_resampler(projection, xlims, ylims, nx, ny, nside, method='nearest', nest=True, cache_dir=None):
+    """
+    Return a cached HpResampler for the given projection, extent, image size and grid.
+
+    Parameters
+    ----------
+    projection : cartopy.crs.Projection
+    xlims, ylims : tuple of float
+    nx, ny : int
+    nside : int
+    method : string, optional, one of {'nearest', 'linear'}, by default 'nearest'
+    nest : bool, optional, by default True
+    cache_dir : string, optional, by default None
+        If given, resamplers are also stored as .npz files in this directory and
+        re-used across sessions. Files that do not match the requested grid 
+        (e.g., written without the grid ordering) are recomputed.
+
+    Returns
+    -------
+    resampler : HpResampler
+
+    Info
+    ----
+    The in-memory cache keeps the last 16 resamplers. Projections are compared by
+    their proj4 definition.
+    """
+    key = (
+        projection.proj4_init,
+        tuple(float(xx) for xx in xlims),
+        tuple(float(yy) for yy in ylims),
+        int(nx), int(ny), int(nside), method, bool(nest),
+    )
+    if key in _RESAMPLER_CACHE:
+        _RESAMPLER_CACHE.move_to_end(key)
+        return _RESAMPLER_CACHE[key]
+
+    filename = None
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        filename = os.path.join(
+            cache_dir, f'hp_resampler_{hashlib.sha1(repr(key).encode()).hexdigest()}.npz')
+
+    resampler = None
+    if filename is not None and os.path.isfile(filename):
+        resampler = HpResampler.load(filename)
+        # files written without the grid ordering (or for another grid) are recomputed
+        expected = ((int(ny), int(nx)), int(nside), method, bool(nest))
+        if (resampler.shape, resampler.nside, resampler.method, resampler.nest) != expected:
+            resampler = None
+    if resampler is None:
+        resampler = HpResampler(projection, xlims, ylims, nx, ny, nside, method, nest)
+        if filename is not None:
+            resampler.save(filename)
+
+    _RESAMPLER_CACHE[key] = resampler
+    if len(_RESAMPLER_CACHE) > _RESAMPLER_CACHE_SIZE:
+        _RESAMPLER_CACHE.popitem(last=False)
+    return resampler
+
+
 def hp_plot(
     data, 
     cmap='viridis', 
@@ -133,6 +320,7 @@ def hp_plot(
     topography_kwargs={},
     coastline_kwargs={},
     grid_kwargs={},
+    resample_cache_dir=None,
     **kwargs
 ):
     """
@@ -176,6 +364,9 @@ def hp_plot(
         Keyword arguments passed on to `ax.contour`
     grid_kwargs : dict, optional
         Keyword arguments apssed on to `ax.gridlines`
+    resample_cache_dir : string, optional, by default None
+        Directory to additionally store the projection resample indices on disk,
+        see `get_resampler`. They are always cached in memory.
     **kwargs : optional
         Keyword arguments passed on to `ax.imshow`
 
@@ -247,13 +438,16 @@ def hp_plot(
         _, _, nx, ny = np.array(ax.bbox.bounds, dtype=int)
         xlims = ax.get_xlim()
         ylims = ax.get_ylim() 
-        im = egh.healpix_resample(
-            topography, 
-            xlims, ylims, 
-            nx, ny, 
-            ax.projection, 
-            method='linear', 
-            nest=True)
+        resampler = get_resampler(
+            ax.projection,
+            xlims, ylims,
+            nx, ny,
+            hp.npix2nside(np.size(topography)),
+            method='linear',
+            nest=True,
+            cache_dir=resample_cache_dir,
+        )
+        im = resampler(topography)
         
         map_ = ax.contour(
             im, 
@@ -293,14 +487,16 @@ def hp_plot(
     xlims = ax.get_xlim()
     ylims = ax.get_ylim()
 
-    im = egh.healpix_resample(
-        data, 
-        xlims, ylims, 
-        nx, ny, 
-        ax.projection, 
-        method='nearest', 
+    resampler = get_resampler(
+        ax.projection,
+        xlims, ylims,
+        nx, ny,
+        hp.npix2nside(np.size(data)),
+        method='nearest',
         nest=True,
+        cache_dir=resample_cache_dir,
     )
+    im = resampler(data)
    
     map_ = ax.imshow(
         im, 
@@ -0,0 +1,115 @@
+import warnings
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from healpix_functions import _aggregate_grid_valid, aggregate_grid, aggregate_grid_xr, subgrid_anomaly, subgrid_anomaly_xr
+
+ZOOM = 3
+NPIX = 12 * 4**ZOOM
+
+
+def get_field(dtype=np.float32, seed=0):
+    rng = np.random.default_rng(seed)
+    return (100 * rng.random((4, NPIX))).astype(dtype)
+
+
+def get_da(arr, chunks=None):
+    da = xr.DataArray(arr, dims=('time', 'cell'))
+    return da if chunks is None else da.chunk(time=chunks)
+
+
+@pytest.mark.parametrize('method, func', [('mean', np.mean), ('std', np.std), ('min', np.min), ('max', np.max)])
+@pytest.mark.parametrize('z_out', [0, 2])
+def test_aggregate_grid_matches_reshape(method, func, z_out):
+    arr = get_field(np.float64)
+    expected = func(arr.reshape(4, 12 * 4**z_out, -1), axis=-1)
+    np.testing.assert_allclose(aggregate_grid(arr, z_out, method), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('chunks', [None, 2])
+@pytest.mark.parametrize('method', ['mean', 'std', 'min', 'max'])
+def test_aggregate_grid_xr_matches_numpy(chunks, method):
+    arr = get_field(np.float64)
+    result = aggregate_grid_xr(get_da(arr, chunks), [2, 1], method)
+    for z_out in [2, 1]:
+        np.testing.assert_allclose(result[z_out].values, aggregate_grid(arr, z_out, method), rtol=1e-12)
+        assert result[z_out].sizes['cell'] == 12 * 4**z_out
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64, np.int16])
+@pytest.mark.parametrize('method', ['mean', 'std', 'min', 'max'])
+def test_aggregate_grid_xr_declared_dtype(dtype, method):
+    da = get_da(get_field(dtype), chunks=2)
+    result = aggregate_grid_xr(da, 1, method)
+    assert result.dtype == result.compute().dtype == aggregate_grid(da.values, 1, method).dtype
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.int16])
+def test_subgrid_anomaly_xr_declared_dtype(dtype):
+    da = get_da(get_field(dtype), chunks=2)
+    for kwargs in [{'z_coarse': 1}, {'da_coarse': aggregate_grid_xr(da, 1)}]:
+        result = subgrid_anomaly_xr(da, **kwargs)
+        assert result.dtype == result.compute().dtype
+
+
+def test_subgrid_anomaly_sums_to_zero():
+    arr = get_field(np.float64)
+    anomaly = subgrid_anomaly(arr, z_coarse=1)
+    np.testing.assert_allclose(aggregate_grid(anomaly, 1), 0, atol=1e-12)
+    np.testing.assert_allclose(
+        subgrid_anomaly(arr, coarse=aggregate_grid(arr, 1)), anomaly, rtol=1e-12)
+
+
+def get_nan_field(seed=0):
+    arr = get_field(np.float64, seed)
+    arr[arr > 70] = np.nan
+    arr[:, :16] = np.nan  # coarse cells without valid values at zoom 1 and 2
+    return arr
+
+
+@pytest.mark.parametrize('method, func', [
+    ('mean', np.nanmean), ('std', np.nanstd), ('min', np.nanmin), ('max', np.nanmax)])
+def test_aggregate_grid_skipna(method, func):
+    arr = get_nan_field()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN cells
+        expected = func(arr.reshape(4, 12 * 4**2, -1), axis=-1)
+    result, count = aggregate_grid(arr, 2, method, skipna=True, return_count=True)
+    np.testing.assert_allclose(result, expected, rtol=1e-12)
+    np.testing.assert_array_equal(count, np.sum(~np.isnan(arr.reshape(4, 12 * 4**2, -1)), axis=-1))
+    assert np.isnan(result[:, 0]).all()
+
+
+def test_aggregate_grid_weighted():
+    arr = get_nan_field()
+    weights = np.random.default_rng(1).random(NPIX)
+    weights[::3] = 0
+    blocks = arr.reshape(4, 12 * 4**2, -1)
+    w = np.where(np.isnan(blocks), 0, weights.reshape(12 * 4**2, -1))
+    with np.errstate(invalid='ignore'):
+        mean = np.nansum(w * blocks, axis=-1) / w.sum(axis=-1)
+        std = np.sqrt(np.nansum(w * (blocks - mean[..., None])**2, axis=-1) / w.sum(axis=-1))
+        minimum = np.where(w > 0, blocks, np.inf).min(axis=-1)
+    np.testing.assert_allclose(aggregate_grid(arr, 2, 'mean', weights=weights), mean, rtol=1e-12)
+    np.testing.assert_allclose(aggregate_grid(arr, 2, 'std', weights=weights), std, rtol=1e-12)
+    np.testing.assert_allclose(
+        aggregate_grid(arr, 2, 'min', weights=weights), np.where(np.isinf(minimum), np.nan, minimum))
+
+
+def test_aggregate_grid_valid_chunks():
+    arr = get_nan_field()
+    for method in ['mean', 'std', 'min', 'max']:
+        np.testing.assert_array_equal(
+            _aggregate_grid_valid(arr, 12 * 4**2, 4, method, cell_chunk=7),
+            aggregate_grid(arr, 2, method, skipna=True))
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.int16])
+@pytest.mark.parametrize('method', ['mean', 'min'])
+def test_aggregate_grid_xr_declared_dtype_skipna(dtype, method):
+    da = get_da(get_field(dtype), chunks=2)
+    for kwargs in [{'skipna': True}, {'weights': np.ones(NPIX)}]:
+        result = aggregate_grid_xr(da, 1, method, **kwargs)
+        assert result.dtype == result.compute().dtype
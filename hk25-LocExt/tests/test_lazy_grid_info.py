@@ -0,0 +1,68 @@
+import healpy as hp
+import numpy as np
+import pytest
+import xarray as xr
+
+import healpix_functions
+from healpix_functions import attach_grid_info, lazy_pix2ang
+
+ZOOM = 4
+NPIX = 12 * 4**ZOOM
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    healpix_functions._PIX2ANG_CACHE.clear()
+    yield
+    healpix_functions._PIX2ANG_CACHE.clear()
+
+
+def get_da(chunks=None):
+    da = xr.DataArray(np.arange(2 * NPIX, dtype=float).reshape(2, NPIX), dims=('time', 'cell'), name='var')
+    return da if chunks is None else da.chunk(cell=chunks)
+
+
+@pytest.mark.parametrize('chunks', [None, 256])
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_lazy_matches_eager(chunks, dtype):
+    da = get_da(chunks)
+    eager = attach_grid_info(da, dtype=dtype)
+    lazy = attach_grid_info(da, lazy=True, dtype=dtype)
+    for name in ['lon', 'lat']:
+        assert lazy[name].chunks is not None
+        assert lazy[name].dtype == eager[name].dtype == dtype
+        np.testing.assert_array_equal(lazy[name].values, eager[name].values)
+
+
+def test_lazy_selection_computes_touched_chunks():
+    ds = attach_grid_info(get_da(256), lazy=True)
+    selected = ds.isel(cell=slice(300, 400))
+    np.testing.assert_array_equal(
+        selected.lat.values, hp.pix2ang(2**ZOOM, np.arange(300, 400), nest=True, lonlat=True)[1])
+    assert len(healpix_functions._PIX2ANG_CACHE) == 1
+
+
+def test_lazy_pix2ang_cells():
+    cells = np.array([5, 3, 1000, 700, 701, 702])
+    lon, lat = lazy_pix2ang(2**ZOOM, False, cells, chunks=3)
+    expected = hp.pix2ang(2**ZOOM, cells, nest=False, lonlat=True)
+    np.testing.assert_array_equal(lon.compute(), expected[0])
+    np.testing.assert_array_equal(lat.compute(), expected[1])
+    assert len(healpix_functions._PIX2ANG_CACHE) == 1  # only the contiguous chunk
+
+
+def test_cache_reuse_and_bound(monkeypatch):
+    lon, lat = lazy_pix2ang(2**ZOOM, True, size=NPIX, chunks=256)
+    lon.compute()
+    assert len(healpix_functions._PIX2ANG_CACHE) == NPIX // 256
+    cached = next(iter(healpix_functions._PIX2ANG_CACHE.values()))
+    assert not cached.flags.writeable
+    lat.compute()
+    assert next(iter(healpix_functions._PIX2ANG_CACHE.values())) is cached
+
+    healpix_functions._PIX2ANG_CACHE.clear()
+    monkeypatch.setattr(healpix_functions, '_PIX2ANG_CACHE_BYTES', 3 * 2 * 256 * 8)
+    np.testing.assert_array_equal(
+        lon.compute(), hp.pix2ang(2**ZOOM, np.arange(NPIX), nest=True, lonlat=True)[0])
+    assert len(healpix_functions._PIX2ANG_CACHE) == 3
+    assert sum(x.nbytes for x in healpix_functions._PIX2ANG_CACHE.values()) <= 3 * 2 * 256 * 8
@@ -0,0 +1,82 @@
+import warnings
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from healpix_functions import _moments_by_4, healpix_pyramid, healpix_pyramid_xr, pyramid_quantile
+
+ZOOM = 4
+NPIX = 12 * 4**ZOOM
+STATS = ('mean', 'std', 'min', 'max', 'count')
+BINS = np.linspace(-3, 3, 25)
+
+
+def get_field(dtype=np.float64, seed=0):
+    rng = np.random.default_rng(seed)
+    arr = rng.normal(size=(3, NPIX))
+    arr[arr > 1.5] = np.nan
+    arr[:, :16] = np.nan  # a coarse cell without valid values down to zoom 2
+    return arr.astype(dtype)
+
+
+def reference(arr, z_out):
+    blocks = arr.reshape(arr.shape[:-1] + (12 * 4**z_out, -1))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN cells
+        return {
+            'mean': np.nanmean(blocks, axis=-1),
+            'std': np.nanstd(blocks, axis=-1),
+            'min': np.nanmin(blocks, axis=-1),
+            'max': np.nanmax(blocks, axis=-1),
+            'count': np.sum(~np.isnan(blocks), axis=-1),
+        }
+
+
+def test_pyramid_matches_nan_reductions():
+    arr = get_field()
+    pyramid = healpix_pyramid(arr, z_min=0, stats=STATS)
+    assert sorted(pyramid) == list(range(ZOOM))
+    for z_out, level in pyramid.items():
+        for stat, expected in reference(arr, z_out).items():
+            np.testing.assert_allclose(level[stat], expected, rtol=1e-10, err_msg=f'{z_out} {stat}')
+
+
+def test_pyramid_histogram_matches_numpy():
+    arr = get_field()
+    pyramid = healpix_pyramid(arr, z_min=0, stats=(), bins=BINS, z_hist=2)
+    assert [z for z in pyramid if 'histogram' in pyramid[z]] == [2, 1, 0]
+    for z_out in [2, 1, 0]:
+        blocks = arr.reshape(3, 12 * 4**z_out, -1)
+        expected = np.array([[np.histogram(cell, BINS)[0] for cell in row] for row in blocks])
+        np.testing.assert_array_equal(pyramid[z_out]['histogram'], expected)
+
+
+def test_moments_by_4_chunks():
+    arr = get_field()
+    for chunked, full in zip(_moments_by_4(arr, cell_chunk=7), _moments_by_4(arr)):
+        np.testing.assert_array_equal(chunked, full)
+
+
+def test_pyramid_quantile():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(2, 100_000))
+    bins = np.linspace(-5, 5, 1001)
+    histogram = np.array([np.histogram(row, bins)[0] for row in values])
+    for q in [0.1, 0.5, 0.9]:
+        np.testing.assert_allclose(
+            pyramid_quantile(histogram, bins, q), np.quantile(values, q, axis=-1), atol=0.02)
+    assert np.isnan(pyramid_quantile(np.zeros((1, 1000), dtype=int), bins, 0.5)).all()
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_pyramid_xr_matches_numpy(dtype):
+    arr = get_field(dtype)
+    da = xr.DataArray(arr, dims=('time', 'cell')).chunk(time=1)
+    pyramid = healpix_pyramid_xr(da, z_min=1, stats=STATS, bins=BINS)
+    expected = healpix_pyramid(arr, z_min=1, stats=STATS, bins=BINS)
+    for z_out, ds in pyramid.items():
+        for name, result in ds.data_vars.items():
+            computed = result.compute()
+            assert result.dtype == computed.dtype == expected[z_out][name].dtype
+            np.testing.assert_allclose(computed, expected[z_out][name], rtol=1e-12)
@@ -0,0 +1,87 @@
+import healpy as hp
+import numpy as np
+import pytest
+
+ccrs = pytest.importorskip('cartopy.crs')
+
+import healpix_plot
+from healpix_plot import HpResampler, get_resampler
+
+NSIDE = 16
+XLIMS, YLIMS = (-180, 180), (-90, 90)
+NX, NY = 72, 36
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    healpix_plot._RESAMPLER_CACHE.clear()
+    yield
+    healpix_plot._RESAMPLER_CACHE.clear()
+
+
+def get_map(nest=True):
+    lon, lat = hp.pix2ang(NSIDE, np.arange(hp.nside2npix(NSIDE)), nest=nest, lonlat=True)
+    return np.sin(np.deg2rad(lat)) + 0.1 * np.cos(np.deg2rad(lon))
+
+
+@pytest.mark.parametrize('nest', [True, False])
+def test_nearest_matches_ang2pix(nest):
+    resampler = HpResampler(ccrs.PlateCarree(), XLIMS, YLIMS, NX, NY, NSIDE, nest=nest)
+    lon, lat = np.meshgrid(np.arange(-177.5, 180, 5), np.arange(-87.5, 90, 5))
+    data = get_map(nest)
+    expected = data[hp.ang2pix(NSIDE, lon, lat, nest=nest, lonlat=True)]
+    np.testing.assert_array_equal(resampler(data), expected)
+    assert resampler(np.stack([data, data])).shape == (2, NY, NX)
+
+
+def test_linear_matches_get_interp_val():
+    resampler = HpResampler(ccrs.PlateCarree(), XLIMS, YLIMS, NX, NY, NSIDE, method='linear')
+    lon, lat = np.meshgrid(np.arange(-177.5, 180, 5), np.arange(-87.5, 90, 5))
+    data = get_map()
+    expected = hp.get_interp_val(data, lon, lat, nest=True, lonlat=True)
+    np.testing.assert_allclose(resampler(data), expected, rtol=1e-12)
+
+
+def test_outside_projection_is_nan():
+    projection = ccrs.Orthographic()
+    limit = 1.2 * projection.x_limits[1]
+    im = HpResampler(projection, (-limit, limit), (-limit, limit), 40, 40, NSIDE)(get_map())
+    assert np.isnan(im[0, 0]) and np.isfinite(im[20, 20])
+
+
+@pytest.mark.parametrize('method', ['nearest', 'linear'])
+@pytest.mark.parametrize('nest', [True, False])
+def test_save_load_round_trip(tmp_path, method, nest):
+    resampler = HpResampler(ccrs.Robinson(), (-1.6e7, 1.6e7), (-8e6, 8e6), NX, NY, NSIDE, method, nest)
+    resampler.save(tmp_path / 'resampler.npz')
+    loaded = HpResampler.load(tmp_path / 'resampler.npz')
+    assert (loaded.shape, loaded.nside, loaded.method, loaded.nest) == (
+        resampler.shape, resampler.nside, resampler.method, resampler.nest)
+    np.testing.assert_array_equal(loaded(get_map(nest)), resampler(get_map(nest)))
+
+
+def test_get_resampler_caches(tmp_path):
+    args = (ccrs.PlateCarree(), XLIMS, YLIMS, NX, NY, NSIDE)
+    resampler = get_resampler(*args, cache_dir=tmp_path)
+    assert get_resampler(*args, cache_dir=tmp_path) is resampler
+    assert get_resampler(*args, nest=False) is not resampler
+    assert len(list(tmp_path.glob('*.npz'))) == 1
+
+    healpix_plot._RESAMPLER_CACHE.clear()
+    loaded = get_resampler(*args, cache_dir=tmp_path)
+    assert loaded is not resampler and loaded.nest
+    np.testing.assert_array_equal(loaded(get_map()), resampler(get_map()))
+
+
+def test_get_resampler_recomputes_files_without_ordering(tmp_path):
+    args = (ccrs.PlateCarree(), XLIMS, YLIMS, NX, NY, NSIDE)
+    get_resampler(*args, nest=False, cache_dir=tmp_path)
+    filename, = tmp_path.glob('*.npz')
+    with np.load(filename) as npz:
+        np.savez(filename, **{key: npz[key] for key in npz.files if key != 'nest'})
+    assert HpResampler.load(filename).nest is None
+
+    healpix_plot._RESAMPLER_CACHE.clear()
+    resampler = get_resampler(*args, nest=False, cache_dir=tmp_path)
+    assert resampler.nest is False
+    assert HpResampler.load(filename).nest is False
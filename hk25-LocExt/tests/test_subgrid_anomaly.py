@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from healpix_functions import aggregate_grid_xr, subgrid_anomaly, subgrid_anomaly_chunked, subgrid_anomaly_xr
+
+ZOOM = 4
+NPIX = 12 * 4**ZOOM
+
+
+def get_da(dtype=np.float64, seed=0):
+    rng = np.random.default_rng(seed)
+    arr = (100 * rng.random((3, 2, NPIX))).astype(dtype)
+    return xr.DataArray(arr, dims=('time', 'level', 'cell'), name='var')
+
+
+@pytest.mark.parametrize('cell_chunk', [None, 64, 100, 4**ZOOM])
+def test_chunked_matches_subgrid_anomaly(cell_chunk):
+    da = get_da()
+    result = subgrid_anomaly_chunked(da, z_coarse=1, cell_chunk=cell_chunk)
+    np.testing.assert_allclose(result.values, subgrid_anomaly(da.values, z_coarse=1), rtol=1e-12)
+    xr.testing.assert_allclose(result.compute(), subgrid_anomaly_xr(da, z_coarse=1))
+
+
+def test_chunked_with_coarse_subset_dims():
+    da = get_da().chunk(time=1)
+    da_coarse = aggregate_grid_xr(da, 2).isel(level=0)  # broadcast along 'level'
+    result = subgrid_anomaly_chunked(da, da_coarse=da_coarse, cell_chunk=256)
+    expected = subgrid_anomaly(da.values, coarse=da_coarse.values[:, None])
+    np.testing.assert_allclose(result.values, expected, rtol=1e-12)
+    assert result.chunks[0] == (1, 1, 1)
+
+
+def test_chunked_transposed_input():
+    da = get_da().transpose('cell', 'time', 'level')
+    result = subgrid_anomaly_chunked(da, z_coarse=2, cell_chunk=128)
+    expected = subgrid_anomaly(da.transpose('time', 'level', 'cell').values, z_coarse=2)
+    np.testing.assert_allclose(result.transpose('time', 'level', 'cell').values, expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.int16])
+def test_chunked_declared_dtype(dtype):
+    da = get_da(dtype)
+    for kwargs in [{'z_coarse': 1}, {'da_coarse': aggregate_grid_xr(da, 1)}]:
+        result = subgrid_anomaly_chunked(da, cell_chunk=256, **kwargs)
+        assert result.dtype == result.compute().dtype
+
+
+def test_chunked_to_zarr(tmp_path):
+    pytest.importorskip('zarr')
+    da = get_da()
+    result = subgrid_anomaly_chunked(da, z_coarse=1, cell_chunk=256, store=tmp_path / 'anomaly.zarr')
+    stored = xr.open_zarr(tmp_path / 'anomaly.zarr')['var']
+    np.testing.assert_allclose(stored.values, result.values)
+
+
+def test_inconsistent_coarse_raises():
+    da = get_da()
+    with pytest.raises(ValueError):
+        subgrid_anomaly_chunked(da, z_coarse=2, da_coarse=aggregate_grid_xr(da, 1))
+    with pytest.raises(ValueError):
+        subgrid_anomaly_chunked(da)
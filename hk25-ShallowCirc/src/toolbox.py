@@ -1,5 +1,11 @@
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+import threading
+
 import healpy as hp  
-from scipy.interpolate import NearestNDInterpolator 
+from scipy.spatial import cKDTree
 import numpy as np
 import xarray as xr
 
@@ -33,112 +39,708 @@ def tropics(ds, lat_min=-40, lat_max=40):
     return (ds.lat > lat_min) & (ds.lat < lat_max)
 
 
-def attach_coords(ds, nside, nest_tf):
+def region_cells(nside, lat_band=None, lon_box=None, polygon=None, nest=True):
+    """
+    Returns the sorted Healpix cells of a region, computed with Healpix queries instead of a 
+    full-sphere mask and cached per nside and region. Use with select_region to read only 
+    these cells.
+
+    Parameters:
+        nside (int): Healpix resolution
+        lat_band (tuple): (lat_min, lat_max) in degrees, cell centers strictly inside (as tropics)
+        lon_box (tuple): (lon_min, lon_max) in degrees east, cell centers inside; wraps around 
+            0°E if lon_min > lon_max, all longitudes if lon_max - lon_min >= 360 (e.g. (0, 360) 
+            or (-180, 180)). Can be combined with lat_band.
+        polygon (tuple): vertices ((lon, lat), ...) in degrees of a convex polygon, cell centers 
+            inside. Intersected with lat_band/lon_box if also given.
+        nest (bool): Whether Healpix indexing is nested (default: True)
+
+    Returns:
+        numpy array: sorted cell indices (read-only)
+
+    Example:
+        cells = region_cells(nside, lat_band=(-20, 20), lon_box=(235, 255))
+        ds_epac = select_region(ds, cells)
+    """
+    return _region_cells(
+        nside,
+        None if lat_band is None else tuple(map(float, lat_band)),
+        None if lon_box is None else tuple(map(float, lon_box)),
+        None if polygon is None else tuple(tuple(map(float, vertex)) for vertex in polygon),
+        bool(nest),
+    )
+
+@lru_cache(maxsize=64)
+def _region_cells(nside, lat_band, lon_box, polygon, nest):
+    """
+    Returns the sorted cells of a region, see region_cells
+    """
+    lat_min, lat_max = (-90., 90.) if lat_band is None else lat_band
+    if polygon is not None:
+        vertices = hp.ang2vec(*np.array(polygon).T, lonlat=True)
+        cells = hp.query_polygon(nside, vertices, inclusive=False, nest=nest)
+    else:
+        cells = hp.query_strip(
+            nside, np.deg2rad(90. - lat_max), np.deg2rad(90. - lat_min), inclusive=False, nest=nest
+        )
+    cells = np.sort(cells)
+
+    if lat_band is not None or lon_box is not None:
+        lons, lats = hp.pix2ang(nside, cells, nest=nest, lonlat=True)
+        inside = (lats > lat_min) & (lats < lat_max)
+        if lon_box is not None and lon_box[1] - lon_box[0] < 360.:  # else all longitudes
+            lon_min, lon_max = np.mod(lon_box, 360.)
+            if lon_min <= lon_max:
+                inside &= (lons >= lon_min) & (lons <= lon_max)
+            else:
+                inside &= (lons >= lon_min) | (lons <= lon_max)
+        cells = cells[inside]
+
+    cells.flags.writeable = False
+    return cells
+
+def ocean_cells(ds, cells=None):
+    """
+    Returns the sorted ocean cells (see ocean), optionally within a region
+
+    Parameters:
+        ds (xarray.Dataset): Dataset containing 'ocean_fraction_surface' along 'cell'
+        cells (numpy array): sorted cells of a region, e.g. from region_cells (default: all)
+
+    Returns:
+        numpy array: sorted cell indices
+    """
+    if cells is not None:
+        ds = select_region(ds, cells)
+    is_ocean = np.asarray(ocean(ds).values)
+    return _cell_values(ds)[is_ocean]
+
+def select_region(ds, cells):
+    """
+    Selects the cells of a region, e.g. from region_cells, without scanning a full-sphere mask. 
+    For lazily opened (e.g. zarr) datasets only the chunks containing these cells are read.
+
+    Parameters:
+        ds (xarray.Dataset or xarray.DataArray): data along 'cell'
+        cells (numpy array): sorted cell indices, all present in ds
+
+    Returns:
+        xarray.Dataset or xarray.DataArray: ds at these cells
+    """
+    if "cell" not in ds.coords:
+        return ds.isel(cell=cells)  # cell positions are the cell indices
+    ds_cells = ds.cell.values
+    positions = np.searchsorted(ds_cells, cells).clip(max=ds_cells.size - 1)
+    if not np.array_equal(ds_cells[positions], cells):
+        raise KeyError("Not all cells of the region are in the dataset (cells need to be sorted)")
+    return ds.isel(cell=positions)
+
+def _cell_values(ds):
+    """
+    Returns the cell indices of ds along 'cell'
+    """
+    return ds.cell.values if "cell" in ds.coords else np.arange(ds.sizes["cell"])
+
+class RangeSet:
+        """
+        set of nested Healpix cells stored as sorted, disjoint [start, stop) ranges at one depth 
+        (zoom level), like a MOC. Regional selections (lat-lon boxes, domains) are mostly contiguous
+        in nested order, so they need few ranges, and reading them with read_ranges issues few 
+        large contiguous requests instead of a scattered fancy index.
+
+        Range sets compare equal if they contain the same area, but are not hashable, as their 
+        ranges array is mutable.
+
+        Parameters:
+            depth (int): zoom level, nside = 2**depth
+            ranges (numpy array): (n, 2) [start, stop) pairs of nested cell indices (merged if needed)
+
+        Example:
+            epac = RangeSet.from_cells(region_cells(2**9, lat_band=(-20, 20), lon_box=(235, 255)), 9)
+            atl = RangeSet.from_cells(region_cells(2**9, lat_band=(-20, 20), lon_box=(330, 340)), 9)
+            ds_both = read_ranges(ds, epac.union(atl))
+        """
+        def __init__(self, depth, ranges=None):
+            self.depth = int(depth)
+            ranges = np.empty((0, 2), dtype=np.int64) if ranges is None else np.asarray(ranges, dtype=np.int64)
+            self.ranges = _merge_ranges([ranges.reshape(-1, 2)], min_count=1)
+
+        @classmethod
+        def from_cells(cls, cells, depth):
+            """
+            builds the range set of nested cell indices (any order, duplicates allowed)
+            """
+            cells = np.unique(np.asarray(cells, dtype=np.int64))
+            # Each cell as a range of length 1, merged into contiguous ranges
+            return cls(depth, np.stack([cells, cells + 1], axis=-1))
+
+        def to_cells(self):
+            """
+            returns the sorted nested cell indices
+            """
+            lengths = self.ranges[:, 1] - self.ranges[:, 0]
+            offsets = np.repeat(self.ranges[:, 0] - np.cumsum(lengths) + lengths, lengths)
+            return offsets + np.arange(lengths.sum())
+
+        def __len__(self):
+            return int(np.sum(self.ranges[:, 1] - self.ranges[:, 0]))
+
+        def __eq__(self, other):
+            depth = max(self.depth, other.depth)
+            return np.array_equal(self.to_depth(depth).ranges, other.to_depth(depth).ranges)
+
+        __hash__ = None  # mutable, see class docstring
+
+        def __repr__(self):
+            return f"RangeSet(depth={self.depth}, {len(self.ranges)} ranges, {len(self)} cells)"
+
+        def to_depth(self, depth):
+            """
+            returns the range set at another depth: finer depths contain the same area, coarser 
+            depths (degrade) contain every cell that overlaps the set
+            """
+            if depth >= self.depth:
+                return RangeSet(depth, self.ranges * 4**(depth - self.depth))
+            factor = 4**(self.depth - depth)
+            return RangeSet(depth, np.stack([self.ranges[:, 0] // factor, -(-self.ranges[:, 1] // factor)], axis=-1))
+
+        def degrade(self, depth):
+            """
+            returns the coarser range set at depth that covers the set, see to_depth
+            """
+            if depth > self.depth:
+                raise ValueError("depth needs to be smaller than the depth of the range set")
+            return self.to_depth(depth)
+
+        def union(self, other):
+            """
+            returns the union, at the finer depth of both sets
+            """
+            depth = max(self.depth, other.depth)
+            return RangeSet(depth, _merge_ranges([self.to_depth(depth).ranges, other.to_depth(depth).ranges], min_count=1))
+
+        def intersection(self, other):
+            """
+            returns the intersection, at the finer depth of both sets
+            """
+            depth = max(self.depth, other.depth)
+            return RangeSet(depth, _merge_ranges([self.to_depth(depth).ranges, other.to_depth(depth).ranges], min_count=2))
+
+        __or__ = union
+        __and__ = intersection
+
+        def chunk_slices(self, chunk_size):
+            """
+            returns the contiguous slices of cells covering all chunks (of chunk_size cells along 
+            'cell', e.g. of a zarr store) that contain cells of the set, adjacent chunks merged
+            """
+            chunks = RangeSet(self.depth, np.stack(
+                [self.ranges[:, 0] // chunk_size, -(-self.ranges[:, 1] // chunk_size)], axis=-1
+            ))
+            return [slice(int(start) * chunk_size, int(stop) * chunk_size) for start, stop in chunks.ranges]
+
+def _merge_ranges(ranges_list, min_count=1):
+    """
+    returns the sorted, disjoint, merged ranges covered by at least min_count of the range arrays 
+    (each sorted and disjoint, except with min_count=1): 1 gives the union, 2 the intersection of two
+    """
+    ranges = np.concatenate(ranges_list)
+    ranges = ranges[ranges[:, 1] > ranges[:, 0]]
+    # Sweep over the range boundaries, stops before starts at the same position
+    positions = np.concatenate([ranges[:, 1], ranges[:, 0]])
+    changes = np.concatenate([-np.ones(len(ranges), np.int64), np.ones(len(ranges), np.int64)])
+    order = np.lexsort((changes, positions))
+    positions, count = positions[order], np.cumsum(changes[order])
+    inside = count >= min_count
+    was_inside = np.concatenate([[False], inside[:-1]])
+    starts = positions[inside & ~was_inside]
+    stops = positions[~inside & was_inside]
+    # Drop empty ranges and merge adjacent ones
+    keep = stops > starts
+    starts, stops = starts[keep], stops[keep]
+    adjacent = np.zeros(starts.size, dtype=bool)
+    adjacent[1:] = starts[1:] == stops[:-1]
+    is_last = np.ones(starts.size, dtype=bool)
+    is_last[:-1] = ~adjacent[1:]
+    return np.stack([starts[~adjacent], stops[is_last]], axis=-1)
+
+def read_ranges(ds, rangeset, chunk_size=None):
+    """
+    reads the cells of a range set from a (lazily opened, e.g. zarr) dataset with contiguous slices 
+    along 'cell' instead of a fancy index
+
+    Parameters:
+        ds (xarray.Dataset or xarray.DataArray): global nested data along 'cell' at the depth of rangeset
+        rangeset (RangeSet): cells to read
+        chunk_size (int): cells per chunk of the store (default: chunks of ds along 'cell'); 
+            the data are read in chunk-aligned slices, which are trimmed to the cells afterwards
+
+    Returns:
+        xarray.Dataset or xarray.DataArray: ds at the cells of the range set, sorted
+    """
+    if ds.sizes["cell"] != hp.nside2npix(2**rangeset.depth):
+        raise ValueError("ds needs to cover all cells at the depth of the range set")
+    if chunk_size is None and ds.chunks and "cell" in ds.chunksizes:
+        chunk_size = ds.chunksizes["cell"][0]
+    if chunk_size is None:
+        slices = [slice(int(start), int(stop)) for start, stop in rangeset.ranges]
+    else:
+        slices = rangeset.chunk_slices(chunk_size)
+
+    if len(rangeset) == 0:
+        return ds.isel(cell=[])
+
+    # The slices are sorted and disjoint, so the cells of each one follow from a single walk
+    cells = rangeset.to_cells()
+    bounds = np.searchsorted(cells, [(block.start, block.stop) for block in slices])
+    parts = []
+    for block, (first, last) in zip(slices, bounds):
+        part = ds.isel(cell=block)
+        if last - first < block.stop - block.start:
+            part = part.isel(cell=cells[first:last] - block.start)
+        parts.append(part)
+    return xr.concat(parts, dim="cell") if len(parts) != 1 else parts[0]
+
+def attach_coords(ds, nside, nest_tf, lazy=False, dtype=np.float64, chunks=None):
     """
     Adds latitude and longitude coordinates to a dataset using Healpix indexing.
+    The Healpix grid (nside and ordering) is recorded in the attributes of both 
+    coordinates, which lets interpolate_field_lon_lat use an analytic lookup.
     
     Parameters:
         ds (xarray.Dataset): Dataset with 'cell' dimension containing Healpix indices
         nside (int): Healpix resolution
         nest_tf (bool): Whether Healpix indexing is nested
+        lazy (bool): If True, the coordinates are dask arrays computed chunk by chunk on demand 
+            (cached per chunk, see _pix2ang_chunk), so regional selections only compute the cells 
+            they touch
+        dtype (numpy dtype): Data type of the coordinates, e.g. np.float32 to halve their memory
+        chunks (int): Cells per chunk if lazy (default: chunks of ds along 'cell', or 2**20)
 
     Returns:
         xarray.Dataset: Dataset with added 'lat' and 'lon' coordinates
     """
-    lons, lats = hp.pix2ang(nside, ds.cell.values, nest=nest_tf, lonlat=True)
+    if lazy:
+        import dask.array as dsa
+
+        if chunks is None:
+            chunks = ds.chunksizes["cell"] if ds.chunks and "cell" in ds.chunksizes else 2**20
+        if "cell" in ds.coords:
+            cells = dsa.from_array(ds.cell.values, chunks=chunks)
+        else:
+            cells = dsa.arange(ds.sizes["cell"], chunks=chunks)
+        lonlat = cells.map_blocks(
+            _pix2ang_chunk, nside, nest_tf, np.dtype(dtype).str,
+            new_axis=0, chunks=((2,),) + cells.chunks, dtype=dtype,
+        )
+        lons, lats = lonlat[0], lonlat[1]
+    else:
+        lons, lats = hp.pix2ang(nside, ds.cell.values, nest=nest_tf, lonlat=True)
+        lons, lats = lons.astype(dtype, copy=False), lats.astype(dtype, copy=False)
+    healpix_attrs = {"healpix_nside": int(nside), "healpix_order": "nest" if nest_tf else "ring"}
     return ds.assign_coords(
-        lat=(("cell",), lats, {"units": "degrees_north"}),
-        lon=(("cell",), lons, {"units": "degrees_east"}),
+        lat=(("cell",), lats, {"units": "degrees_north", **healpix_attrs}),
+        lon=(("cell",), lons, {"units": "degrees_east", **healpix_attrs}),
     )
 
+# Cache of the coordinates of contiguous chunks of cells of attach_coords(lazy=True)
+_PIX2ANG_CACHE = OrderedDict()
+_PIX2ANG_CACHE_BYTES = 2**28
+_PIX2ANG_CACHE_LOCK = threading.Lock()
+
+def _pix2ang_chunk(cells, nside, nest, dtype):
+    """
+    Returns the stacked lon and lat (2, N) of a chunk of cells. Contiguous chunks are cached 
+    (read-only) per (nside, nest, first cell, last cell, dtype), least recently used first out 
+    once the cache exceeds _PIX2ANG_CACHE_BYTES, so repeated selections do not recompute them
+    """
+    contiguous = cells.size > 0 and cells[-1] - cells[0] + 1 == cells.size and np.all(np.diff(cells) == 1)
+    if not contiguous:
+        return np.stack(hp.pix2ang(nside, cells, nest=nest, lonlat=True)).astype(dtype)
+
+    key = (int(nside), bool(nest), int(cells[0]), int(cells[-1]) + 1, dtype)
+    with _PIX2ANG_CACHE_LOCK:
+        if key in _PIX2ANG_CACHE:
+            _PIX2ANG_CACHE.move_to_end(key)
+            return _PIX2ANG_CACHE[key]
+
+    lonlat = np.stack(hp.pix2ang(nside, cells, nest=nest, lonlat=True)).astype(dtype)
+    lonlat.flags.writeable = False
+    if lonlat.nbytes <= _PIX2ANG_CACHE_BYTES:
+        with _PIX2ANG_CACHE_LOCK:
+            _PIX2ANG_CACHE[key] = lonlat
+            nbytes = sum(values.nbytes for values in _PIX2ANG_CACHE.values())
+            while nbytes > _PIX2ANG_CACHE_BYTES:
+                nbytes -= _PIX2ANG_CACHE.popitem(last=False)[1].nbytes
+    return lonlat
+
 
-def interpolate_field_lon_lat(field, lon_coord="lon", lat_coord="lat", relative_resolution=2):
+def interpolate_field_lon_lat(field, lon_coord="lon", lat_coord="lat", relative_resolution=2, box=None):
     """
-    Interpolates a 1D spatial field to a regular 2D lon-lat grid using nearest-neighbor.
+    Interpolates a spatial field to a regular 2D lon-lat grid using nearest-neighbor.
+
+    For Healpix fields (see attach_coords, or a 'crs' coordinate with Healpix attributes) the 
+    nearest cell is found analytically with ang2pix; target points in cells that are not part 
+    of the field (e.g. outside a tropical band) are NaN. Other fields use the nearest neighbor 
+    on the unit sphere. The index map is cached per source coordinates and target grid, so 
+    further fields on the same grid are a pure gather.
 
     Parameters:
-        field (xarray.DataArray): Field with coordinates (lon, lat)
+        field (xarray.DataArray): Field with coordinates (lon, lat) along one (cell) dimension, 
+            and any further dimensions (e.g. time, level)
         lon_coord (str): Name of the longitude coordinate
         lat_coord (str): Name of the latitude coordinate
         relative_resolution (float): Controls output grid resolution (higher = finer)
+        box (sequence): Target region (lon_min, lon_max, lat_min, lat_max) (default: extent of the field)
 
     Returns:
-        xarray.DataArray: Interpolated 2D field on regular lon-lat grid
+        xarray.DataArray: Interpolated field on regular lon-lat grid, with the cell dimension 
+            replaced by (lat, lon)
+    """
+    cell_dim = field[lon_coord].dims[0]
+    nlon = nlat = int(np.sqrt(field.sizes[cell_dim] * relative_resolution))
+
+    lon, lat, index = _get_nearest_index(
+        field[lon_coord].values, field[lat_coord].values, nlon, nlat,
+        box=None if box is None else tuple(map(float, box)),
+        healpix=_get_healpix_params(field, lon_coord),
+    )
+
+    cell_coords = [name for name, coord in field.coords.items() if cell_dim in coord.dims]
+    interpolated = field.drop_vars(cell_coords).isel(
+        {cell_dim: xr.DataArray(np.maximum(index, 0), dims=["lat", "lon"])}
+    )
+    if np.any(index < 0):
+        interpolated = interpolated.where(xr.DataArray(index >= 0, dims=["lat", "lon"]))
+    return interpolated.assign_coords(lon=lon, lat=lat).rename(None)
+
+def _get_healpix_params(field, lon_coord="lon"):
+    """
+    Returns (nside, nest) of a Healpix field from the attributes set by attach_coords or from a 
+    'crs' coordinate, or None for other grids
+    """
+    for attrs in (field[lon_coord].attrs, field["crs"].attrs if "crs" in field.coords else {}):
+        if "healpix_nside" in attrs:
+            return int(attrs["healpix_nside"]), attrs.get("healpix_order", "nest") == "nest"
+    return None
+
+# Cache of nearest-neighbor index maps of interpolate_field_lon_lat
+_NEAREST_INDEX_CACHE = OrderedDict()
+_NEAREST_INDEX_CACHE_SIZE = 8
+
+def _get_nearest_index(lon_points, lat_points, nlon, nlat, box=None, healpix=None):
     """
-    nlon = nlat = int(np.sqrt(len(field) * relative_resolution))
+    Returns the target lon-lat grid and the index of the nearest source point of every target 
+    point, cached.
 
-    lon_points = field[lon_coord].values
-    lat_points = field[lat_coord].values
+    Parameters:
+        lon_points (numpy array): longitudes of the source points
+        lat_points (numpy array): latitudes of the source points
+        nlon (int): number of target longitudes
+        nlat (int): number of target latitudes
+        box (tuple): target region (lon_min, lon_max, lat_min, lat_max) as hashable tuple of floats
+            (default: extent of the source points)
+        healpix (tuple): (nside, nest) if the source points are Healpix cell centers
 
-    lon = np.linspace(np.min(lon_points), np.max(lon_points), nlon)
-    lat = np.linspace(np.min(lat_points), np.max(lat_points), nlat)
+    Returns:
+        numpy array: target longitudes
+        numpy array: target latitudes
+        numpy array: index (nlat, nlon) of the nearest source point, -1 if the Healpix cell of a 
+            target point is not a source point
+    """
+    key = (_array_digest(lon_points), _array_digest(lat_points), nlon, nlat, box, healpix)
+    if key in _NEAREST_INDEX_CACHE:
+        _NEAREST_INDEX_CACHE.move_to_end(key)
+        return _NEAREST_INDEX_CACHE[key]
+
+    if box is None:
+        box = (np.min(lon_points), np.max(lon_points), np.min(lat_points), np.max(lat_points))
+    lon = np.linspace(box[0], box[1], nlon)
+    lat = np.linspace(box[2], box[3], nlat)
     lon2, lat2 = np.meshgrid(lon, lat)
 
-    points = np.stack((lon_points, lat_points), axis=1)
+    if healpix is not None:
+        # Cell of every source and target point, matched by a sorted search
+        nside, nest = healpix
+        cells = hp.ang2pix(nside, lon_points, lat_points, nest=nest, lonlat=True)
+        target_cells = hp.ang2pix(nside, lon2.ravel(), lat2.ravel(), nest=nest, lonlat=True)
+        sorter = np.argsort(cells)
+        index = sorter[np.searchsorted(cells, target_cells, sorter=sorter).clip(max=cells.size - 1)]
+        index[cells[index] != target_cells] = -1
+    else:
+        tree = cKDTree(_lonlat2xyz(lon_points, lat_points))
+        _, index = tree.query(_lonlat2xyz(lon2.ravel(), lat2.ravel()))
 
-    interpolated = NearestNDInterpolator(points, field.values)(lon2, lat2)
+    result = (lon, lat, index.reshape(nlat, nlon))
+    for values in result:
+        values.flags.writeable = False
+    _NEAREST_INDEX_CACHE[key] = result
+    _NEAREST_INDEX_CACHE.move_to_end(key)
+    if len(_NEAREST_INDEX_CACHE) > _NEAREST_INDEX_CACHE_SIZE:
+        _NEAREST_INDEX_CACHE.popitem(last=False)
+    return result
 
-    return xr.DataArray(
-        interpolated,
-        dims=["lat", "lon"],
-        coords={"lon": lon, "lat": lat},
-    )
+def _array_digest(values):
+    """
+    Returns the shape, dtype and a sha1 digest of the values of an array, used as cache key 
+    instead of a copy of the array
+    """
+    values = np.ascontiguousarray(values)
+    return values.shape, values.dtype.str, hashlib.sha1(values.data).hexdigest()
+
+def _lonlat2xyz(lon, lat):
+    """
+    Converts longitudes and latitudes in degrees to points (n, 3) on the unit sphere
+    """
+    lon, lat = np.deg2rad(lon), np.deg2rad(lat)
+    return np.stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)), axis=-1)
 
 def nest2ring_index(ds, nside):
     """
+    Returns the indices that reorder a nested dataset into ring order.
+
+    Parameters:
         ds (xarray:Dataset): dataset with cell as dimensions
         nside (int): nside of the zoom level 
+
+    Returns:
+        numpy array: nested index of every cell in ds, in ring order (read-only 
+        for a global dataset)
+    """
+    permutation = _ring2nest_permutation(nside)
+    cells = ds.cell.values
+    if cells.size == permutation.size and np.array_equal(cells, np.arange(cells.size)):
+        return permutation
+    return permutation[cells]
+
+@lru_cache(maxsize=None)
+def _ring2nest_permutation(nside):
     """
-    return np.array([hp.ring2nest(nside, i) for i in ds.cell.values])
+    Nested index of every ring index, computed once per nside and shared 
+    (read-only) by all callers.
+    """
+    permutation = hp.ring2nest(nside, np.arange(hp.nside2npix(nside)))
+    permutation.flags.writeable = False
+    return permutation
 
-def compute_hder(var, nside):
+@lru_cache(maxsize=None)
+def _nest2ring_permutation(nside):
+    """
+    Ring index of every nested index, computed once per nside and shared 
+    (read-only) by all callers.
+    """
+    permutation = hp.nest2ring(nside, np.arange(hp.nside2npix(nside)))
+    permutation.flags.writeable = False
+    return permutation
+
+@lru_cache(maxsize=None)
+def _tan_lat_ring(nside):
+    """
+    tan(lat) of every cell in ring order, computed once per nside and shared 
+    (read-only) by all callers.
+    """
+    _, lat = hp.pix2ang(nside, np.arange(hp.nside2npix(nside)), lonlat=True)
+    tan_lat = np.tan(np.deg2rad(lat))
+    tan_lat.flags.writeable = False
+    return tan_lat
+
+def compute_hder(var, nside, lmax=None):
         """
         computes the horizontal derivatives of any variable (1 vertical level, 1 time) using spherical harmonics
         
         Parameters:
             var (xarray.DataArray): Name of the variable on which derivatives will be computed
             nside (int): nside of the zoom level 
+            lmax (int): maximum multipole of the transform (default: 3*nside-1)
 
         Returns:
             numpy array: derivative with respect to co-latitude
             numpy array: derivative with respect to longitude
         
         """
-        var_alm = hp.sphtfunc.map2alm(var)
-        der_arr = hp.sphtfunc.alm2map_der1(var_alm, nside)
+        var_alm = hp.sphtfunc.map2alm(var, lmax=lmax)
+        der_arr = hp.sphtfunc.alm2map_der1(var_alm, nside, lmax=lmax)
         return der_arr[1, :], der_arr[2, :] # dvar_dtheta (lat), dvar_dphi (lon)
 
 
-def compute_conv(ua, va, ring_index, nside):
+def compute_hder_pool(var, nside, lmax=None, maps_per_task=16, max_workers=1, use_processes=False):
+        """
+        computes the horizontal derivatives of a stack of maps (e.g. all time steps and levels) using 
+        spherical harmonics. Every map is transformed on its own as in compute_hder (healpy has no batched
+        transforms); the maps are split into tasks of maps_per_task maps, which run on a thread or 
+        process pool.
+        
+        Parameters:
+            var (numpy array): maps in ring order, with the cells along the last axis and any leading dimensions
+            nside (int): nside of the zoom level 
+            lmax (int): maximum multipole of the transforms (default: 3*nside-1). A lower lmax is faster
+                but smooths the derivatives.
+            maps_per_task (int): number of maps per task of the pool
+            max_workers (int): number of workers of the pool (default: 1, no pool)
+            use_processes (bool): use a process pool instead of a thread pool
+
+        Returns:
+            numpy array: derivative with respect to co-latitude, same shape as var
+            numpy array: derivative with respect to longitude, same shape as var
+        
+        """
+        var = np.asarray(var, dtype=np.float64)
+        maps = var.reshape(-1, var.shape[-1])
+        tasks = [maps[i:i + maps_per_task] for i in range(0, len(maps), maps_per_task)]
+        compute_task = partial(_compute_hder_maps, nside=nside, lmax=lmax)
+        if max_workers == 1 or len(tasks) <= 1:
+            ders = [compute_task(task) for task in tasks]
+        else:
+            executor = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+            with executor(max_workers=max_workers) as pool:
+                ders = list(pool.map(compute_task, tasks))
+        dvar_dtheta = np.concatenate([der[0] for der in ders]).reshape(var.shape)
+        dvar_dphi = np.concatenate([der[1] for der in ders]).reshape(var.shape)
+        return dvar_dtheta, dvar_dphi
+
+
+def _compute_hder_maps(maps, nside, lmax):
+        """
+        computes the horizontal derivatives of the maps (map, cell) of one task, map by map
+        """
+        ders = [compute_hder(var, nside, lmax=lmax) for var in maps]
+        return (
+            np.stack([der[0] for der in ders]), # dvar_dtheta (lat)
+            np.stack([der[1] for der in ders]), # dvar_dphi (lon)
+        )
+
+
+def compute_conv(ua, va, ring_index=None, nside=None, lmax=None, max_workers=1, use_processes=False):
         """
         computes the horizontal wind convergence using spherical harmonics
         
         Parameters:
             ua (xarray.DataArray): zonal wind
             va (xarray.DataArray): meridional wind
-            ring_index (numpy array): indices to convert from nest to ring
-            nside (int): nside of the zoom level 
+            ring_index (numpy array): indices to convert from nest to ring 
+                (default: cached permutation from nest2ring_index)
+            nside (int): nside of the zoom level (default: inferred from the 
+                number of cells)
+            lmax (int): maximum multipole of the transforms (default: 3*nside-1)
+            max_workers (int): number of workers transforming the time steps/levels (see compute_hder_pool)
+            use_processes (bool): use a process pool instead of a thread pool
 
         Returns:
             convergence (xarray.DataArray)
         
         """
+        if nside is None:
+            nside = hp.npix2nside(len(ua.cell))
+        if ring_index is None:
+            ring_index = nest2ring_index(ua, nside)
         ua = ua.isel(cell = ring_index)
         va = va.isel(cell = ring_index)
         lat = ua.lat
     
-        def _compute_conv(ua, va, lat, nside):
-            _, dua_dphi = compute_hder(ua, nside)
-            dva_dtheta, _  = compute_hder(va, nside)
+        def _compute_conv(ua, va, lat):
+            # u and v are transformed together, all time steps/levels at once
+            dwind_dtheta, dwind_dphi = compute_hder_pool(
+                np.stack([ua, va]), nside, lmax=lmax, max_workers=max_workers, use_processes=use_processes
+            )
+            dua_dphi, dva_dtheta = dwind_dphi[0], dwind_dtheta[1]
             va_tanlat = va * np.tan(np.deg2rad(lat))
             return -(dua_dphi - dva_dtheta - va_tanlat) / 6371/1000 #+ 2*7.2921e-5 *np.sin(np.deg2rad(lat))
     
         conv_time = xr.apply_ufunc(_compute_conv,
-                            ua, va, lat, nside,
-                            input_core_dims=[['cell'],['cell'],['cell'],[]],
+                            ua, va, lat,
+                            input_core_dims=[['cell'],['cell'],['cell']],
                             dask = "parallelized",
-                            vectorize = True,
                             output_core_dims= [['cell']],
-                            dask_gufunc_kwargs = {"output_sizes": {"cell": len(ua.cell)}},
                             output_dtypes = ["f8"],)
         return conv_time
+
+
+class ShallowCircOperator:
+        """
+        horizontal derivatives and wind convergence using spherical harmonics for nested data. The nest-to-ring
+        permutation, its inverse and tan(lat) are computed once per nside, the data is permuted inside the
+        transform (u and v together) and the results are returned in nested order with the input coordinates.
+        
+        Parameters:
+            nside (int): nside of the zoom level 
+            lmax (int): maximum multipole of the transforms (default: 3*nside-1)
+            max_workers (int): number of workers transforming the time steps/levels (see compute_hder_pool)
+            use_processes (bool): use a process pool instead of a thread pool
+
+        Example:
+            op = ShallowCircOperator(nside)
+            conv = op.conv(ds.ua, ds.va)  # nested, same cells as ds
+        """
+        def __init__(self, nside, lmax=None, max_workers=1, use_processes=False):
+            self.nside = nside
+            self.lmax = lmax
+            self.max_workers = max_workers
+            self.use_processes = use_processes
+            self.ring_index = _ring2nest_permutation(nside)  # nested index of each ring pixel
+            self.nest_index = _nest2ring_permutation(nside)  # ring index of each nested pixel
+            self.tan_lat = _tan_lat_ring(nside)              # ring order
+
+        def hder(self, var):
+            """
+            computes the horizontal derivatives of a nested variable with any leading dimensions
+
+            Parameters:
+                var (xarray.DataArray): variable on all cells of the nested grid
+
+            Returns:
+                xarray.DataArray: derivative with respect to co-latitude (nested)
+                xarray.DataArray: derivative with respect to longitude (nested)
+            """
+            self._check_cells(var)
+            return xr.apply_ufunc(self._hder,
+                            var,
+                            input_core_dims=[['cell']],
+                            dask = "parallelized",
+                            output_core_dims= [['cell'], ['cell']],
+                            output_dtypes = ["f8", "f8"],)
+
+        def conv(self, ua, va):
+            """
+            computes the horizontal wind convergence, see compute_conv
+
+            Parameters:
+                ua (xarray.DataArray): zonal wind on all cells of the nested grid
+                va (xarray.DataArray): meridional wind on the same cells
+
+            Returns:
+                convergence (xarray.DataArray), nested
+            """
+            self._check_cells(ua)
+            self._check_cells(va)
+            return xr.apply_ufunc(self._conv,
+                            ua, va,
+                            input_core_dims=[['cell'],['cell']],
+                            dask = "parallelized",
+                            output_core_dims= [['cell']],
+                            output_dtypes = ["f8"],)
+
+        def _check_cells(self, var):
+            npix = hp.nside2npix(self.nside)
+            cells = var.cell.values if "cell" in var.coords else np.arange(var.sizes["cell"])
+            if not np.array_equal(cells, np.arange(npix)):
+                raise ValueError(f"var needs to cover all {npix} cells of the nested grid (nside={self.nside}) in order")
+
+        def _transform(self, var):
+            dvar_dtheta, dvar_dphi = compute_hder_pool(
+                var, self.nside, lmax=self.lmax, max_workers=self.max_workers, use_processes=self.use_processes
+            )
+            return dvar_dtheta, dvar_dphi
+
+        def _hder(self, var):
+            dvar_dtheta, dvar_dphi = self._transform(np.take(var, self.ring_index, axis=-1))
+            return np.take(dvar_dtheta, self.nest_index, axis=-1), np.take(dvar_dphi, self.nest_index, axis=-1)
+
+        def _conv(self, ua, va):
+            # one gather of u and v into ring order, one back into nested order
+            wind = np.take(np.stack(np.broadcast_arrays(ua, va)), self.ring_index, axis=-1)
+            dwind_dtheta, dwind_dphi = self._transform(wind)
+            conv = dwind_dphi[0]
+            conv -= dwind_dtheta[1]
+            conv -= wind[1] * self.tan_lat
+            conv /= -6371*1000
+            return np.take(conv, self.nest_index, axis=-1)
@@ -0,0 +1,65 @@
+"""
+Tests of interpolate_field_lon_lat and its cached nearest-neighbor index
+"""
+import healpy as hp
+import numpy as np
+import pytest
+import xarray as xr
+
+import toolbox
+
+
+def get_scattered_field(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    lon = rng.uniform(0, 360, n)
+    lat = np.rad2deg(np.arcsin(rng.uniform(-1, 1, n)))
+    return xr.DataArray(
+        rng.standard_normal((2, n)), dims=("time", "point"),
+        coords={"lon": ("point", lon), "lat": ("point", lat)},
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    toolbox._NEAREST_INDEX_CACHE.clear()
+    yield
+    toolbox._NEAREST_INDEX_CACHE.clear()
+
+
+def test_nearest_index_matches_brute_force():
+    field = get_scattered_field()
+    interpolated = toolbox.interpolate_field_lon_lat(field)
+
+    lon2, lat2 = np.meshgrid(interpolated.lon, interpolated.lat)
+    source = toolbox._lonlat2xyz(field.lon.values, field.lat.values)
+    target = toolbox._lonlat2xyz(lon2.ravel(), lat2.ravel())
+    nearest = np.argmax(target @ source.T, axis=1).reshape(lon2.shape)
+    np.testing.assert_array_equal(
+        interpolated.values, field.values[:, nearest]
+    )
+    assert interpolated.dims == ("time", "lat", "lon")
+
+
+def test_nearest_index_is_cached_by_coordinates():
+    field = get_scattered_field()
+    first = toolbox.interpolate_field_lon_lat(field)
+    assert len(toolbox._NEAREST_INDEX_CACHE) == 1
+    (key, (_, _, index)), = toolbox._NEAREST_INDEX_CACHE.items()
+    assert not index.flags.writeable
+
+    # Same coordinates: the cached index is reused, no copies of the points are kept
+    second = toolbox.interpolate_field_lon_lat(field * 2)
+    assert len(toolbox._NEAREST_INDEX_CACHE) == 1
+    xr.testing.assert_equal(second, first * 2)
+    assert all(not isinstance(part, np.ndarray) for part in key)
+
+    # Other coordinates or box: a new entry
+    toolbox.interpolate_field_lon_lat(get_scattered_field(seed=1))
+    toolbox.interpolate_field_lon_lat(field, box=(0, 90, -30, 30))
+    assert len(toolbox._NEAREST_INDEX_CACHE) == 3
+
+
+def test_nearest_index_cache_is_bounded():
+    for seed in range(toolbox._NEAREST_INDEX_CACHE_SIZE + 3):
+        toolbox.interpolate_field_lon_lat(get_scattered_field(n=50, seed=seed))
+    assert len(toolbox._NEAREST_INDEX_CACHE) == toolbox._NEAREST_INDEX_CACHE_SIZE
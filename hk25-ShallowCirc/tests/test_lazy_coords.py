@@ -0,0 +1,68 @@
+"""
+Tests of the lazy, chunk-wise coordinates of attach_coords and their cache
+"""
+import healpy as hp
+import numpy as np
+import pytest
+import xarray as xr
+
+import toolbox
+from toolbox import attach_coords, tropics
+
+NSIDE = 16
+NPIX = 12 * NSIDE**2
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    toolbox._PIX2ANG_CACHE.clear()
+    yield
+    toolbox._PIX2ANG_CACHE.clear()
+
+
+def get_dataset(cells=None, chunks=None):
+    cells = np.arange(NPIX) if cells is None else cells
+    ds = xr.Dataset({"var": (("time", "cell"), np.ones((2, cells.size)))}, coords={"cell": cells})
+    return ds if chunks is None else ds.chunk(cell=chunks)
+
+
+@pytest.mark.parametrize("nest", [True, False])
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_lazy_matches_eager(nest, dtype):
+    ds = get_dataset(chunks=256)
+    eager = attach_coords(ds, NSIDE, nest, dtype=dtype)
+    lazy = attach_coords(ds, NSIDE, nest, lazy=True, dtype=dtype)
+    for name in ["lon", "lat"]:
+        assert lazy[name].chunks is not None
+        assert lazy[name].dtype == eager[name].dtype == dtype
+        np.testing.assert_array_equal(lazy[name].values, eager[name].values)
+        assert lazy[name].attrs == eager[name].attrs
+
+
+def test_lazy_mask_and_subset_cells():
+    cells = np.concatenate([np.arange(100, 400), [7, 3]])
+    ds = attach_coords(get_dataset(cells), NSIDE, True, lazy=True, chunks=100)
+    expected = hp.pix2ang(NSIDE, cells, nest=True, lonlat=True)
+    np.testing.assert_array_equal(ds.lon.values, expected[0])
+    np.testing.assert_array_equal(ds.lat.values, expected[1])
+    assert len(toolbox._PIX2ANG_CACHE) == 3  # the last chunk is not contiguous
+
+    mask = tropics(ds, -20, 20).compute()
+    np.testing.assert_array_equal(mask.values, np.abs(expected[1]) < 20)
+
+
+def test_cache_reuse_and_bound(monkeypatch):
+    ds = attach_coords(get_dataset(), NSIDE, True, lazy=True, chunks=256)
+    ds.lon.compute()
+    assert len(toolbox._PIX2ANG_CACHE) == NPIX // 256
+    cached = next(iter(toolbox._PIX2ANG_CACHE.values()))
+    assert not cached.flags.writeable
+    ds.lat.compute()
+    assert next(iter(toolbox._PIX2ANG_CACHE.values())) is cached
+
+    toolbox._PIX2ANG_CACHE.clear()
+    monkeypatch.setattr(toolbox, "_PIX2ANG_CACHE_BYTES", 3 * 2 * 256 * 8)
+    np.testing.assert_array_equal(
+        ds.lon.values, hp.pix2ang(NSIDE, np.arange(NPIX), nest=True, lonlat=True)[0])
+    assert len(toolbox._PIX2ANG_CACHE) == 3
+    assert sum(x.nbytes for x in toolbox._PIX2ANG_CACHE.values()) <= 3 * 2 * 256 * 8
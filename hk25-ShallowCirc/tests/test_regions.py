@@ -0,0 +1,191 @@
+"""
+Tests of region_cells/select_region against full-sphere masks and of RangeSet/read_ranges
+against plain cell sets
+"""
+import healpy as hp
+import numpy as np
+import pytest
+import xarray as xr
+
+import toolbox
+
+DEPTH = 4
+NSIDE = 2**DEPTH
+
+
+def get_dataset(nside=NSIDE, nest=True, chunks=None):
+    npix = hp.nside2npix(nside)
+    lon, lat = hp.pix2ang(nside, np.arange(npix), nest=nest, lonlat=True)
+    ds = xr.Dataset(
+        {"var": (("time", "cell"), np.arange(2 * npix, dtype=np.float64).reshape(2, npix))},
+        coords={"cell": np.arange(npix), "lon": ("cell", lon), "lat": ("cell", lat)},
+    )
+    return ds if chunks is None else ds.chunk(cell=chunks)
+
+
+def mask_cells(ds, lat_band=None, lon_box=None):
+    inside = np.ones(ds.cell.size, dtype=bool)
+    if lat_band is not None:
+        inside &= toolbox.tropics(ds, *lat_band).values
+    if lon_box is not None and lon_box[1] - lon_box[0] < 360:
+        lon_min, lon_max = np.mod(lon_box, 360)
+        lon = ds.lon.values
+        if lon_min <= lon_max:
+            inside &= (lon >= lon_min) & (lon <= lon_max)
+        else:
+            inside &= (lon >= lon_min) | (lon <= lon_max)
+    return ds.cell.values[inside]
+
+
+@pytest.mark.parametrize("nest", [True, False])
+@pytest.mark.parametrize("lat_band, lon_box", [
+    ((-40, 40), None),
+    ((-20, 20), (235, 255)),
+    ((-20, 20), (330, 20)),      # wraps around 0°E
+    ((-20, 20), (-30, 20)),      # negative longitudes
+    (None, (100, 120)),
+    ((-30, 10), (0, 360)),       # all longitudes
+    ((-30, 10), (-180, 180)),
+])
+def test_region_cells_matches_mask(nest, lat_band, lon_box):
+    ds = get_dataset(nest=nest)
+    cells = toolbox.region_cells(NSIDE, lat_band=lat_band, lon_box=lon_box, nest=nest)
+    np.testing.assert_array_equal(cells, mask_cells(ds, lat_band, lon_box))
+    assert not cells.flags.writeable
+
+
+def test_region_cells_polygon():
+    polygon = ((230, -10), (260, -10), (260, 15), (230, 15))
+    cells = toolbox.region_cells(NSIDE, polygon=polygon)
+    ds = get_dataset()
+    inside = mask_cells(ds, (-10, 15), (230, 260))
+    # cells strictly inside the box, away from its edges, are all selected
+    interior = mask_cells(ds, (-8, 13), (232, 258))
+    assert np.all(np.isin(interior, cells))
+    assert np.all(np.isin(cells, inside))
+    np.testing.assert_array_equal(
+        toolbox.region_cells(NSIDE, lat_band=(-20, 0), polygon=polygon),
+        np.intersect1d(cells, mask_cells(ds, (-20, 0))),
+    )
+
+
+def test_region_cells_cached():
+    toolbox._region_cells.cache_clear()
+    cells = toolbox.region_cells(NSIDE, lat_band=(-20, 20), lon_box=(235, 255))
+    assert toolbox.region_cells(NSIDE, lat_band=[-20., 20.], lon_box=np.array([235, 255])) is cells
+    assert toolbox._region_cells.cache_info().hits == 1
+
+
+@pytest.mark.parametrize("subset", [False, True])
+def test_select_region(subset):
+    ds = get_dataset()
+    if subset:
+        ds = ds.isel(cell=slice(100, None))
+    cells = toolbox.region_cells(NSIDE, lat_band=(-20, 20), lon_box=(235, 255))
+    selected = toolbox.select_region(ds, cells)
+    xr.testing.assert_identical(selected, ds.sel(cell=cells))
+    np.testing.assert_array_equal(
+        toolbox.ocean_cells(ds.assign(ocean_fraction_surface=(ds.lat > 0).astype(float)), cells),
+        cells[selected.lat.values > 0],
+    )
+
+    with pytest.raises(KeyError):
+        toolbox.select_region(ds.isel(cell=slice(0, None, 2)), cells)
+
+
+def test_select_region_without_cell_coord():
+    ds = get_dataset().drop_vars("cell")
+    cells = toolbox.region_cells(NSIDE, lat_band=(-20, 20))
+    xr.testing.assert_identical(toolbox.select_region(ds, cells), ds.isel(cell=cells))
+
+
+def get_cells(seed, n=200, nside=NSIDE):
+    rng = np.random.default_rng(seed)
+    # some contiguous blocks and some scattered cells
+    starts = rng.integers(0, hp.nside2npix(nside) - 20, 5)
+    blocks = [np.arange(start, start + rng.integers(1, 20)) for start in starts]
+    return np.unique(np.concatenate(blocks + [rng.integers(0, hp.nside2npix(nside), n // 4)]))
+
+
+def test_rangeset_from_cells_round_trip():
+    cells = get_cells(0)
+    rangeset = toolbox.RangeSet.from_cells(cells[::-1], DEPTH)
+    np.testing.assert_array_equal(rangeset.to_cells(), cells)
+    assert len(rangeset) == cells.size
+    assert np.all(rangeset.ranges[1:, 0] > rangeset.ranges[:-1, 1])  # disjoint, merged
+
+
+def test_rangeset_set_operations():
+    a, b = toolbox.RangeSet.from_cells(get_cells(1), DEPTH), toolbox.RangeSet.from_cells(get_cells(2), DEPTH)
+    np.testing.assert_array_equal((a | b).to_cells(), np.union1d(a.to_cells(), b.to_cells()))
+    np.testing.assert_array_equal((a & b).to_cells(), np.intersect1d(a.to_cells(), b.to_cells()))
+    assert a | b == b | a
+    assert a & a == a
+
+
+def test_rangeset_depths():
+    cells = get_cells(3)
+    rangeset = toolbox.RangeSet.from_cells(cells, DEPTH)
+    finer = rangeset.to_depth(DEPTH + 2)
+    np.testing.assert_array_equal(
+        finer.to_cells(), (cells[:, None] * 16 + np.arange(16)).ravel()
+    )
+    assert finer == rangeset
+    np.testing.assert_array_equal(rangeset.degrade(DEPTH - 1).to_cells(), np.unique(cells // 4))
+    # sets at different depths combine at the finer depth
+    coarse = toolbox.RangeSet.from_cells([0, 5], DEPTH - 1)
+    union = rangeset | coarse
+    assert union.depth == DEPTH
+    np.testing.assert_array_equal(
+        union.to_cells(), np.union1d(cells, np.r_[0:4, 20:24])
+    )
+    with pytest.raises(ValueError):
+        rangeset.degrade(DEPTH + 1)
+
+
+def test_rangeset_empty():
+    empty = toolbox.RangeSet(DEPTH)
+    assert len(empty) == 0
+    assert empty.to_cells().size == 0
+    assert empty.ranges.shape == (0, 2)
+    assert empty == toolbox.RangeSet.from_cells([], DEPTH)
+    rangeset = toolbox.RangeSet.from_cells(get_cells(4), DEPTH)
+    assert rangeset | empty == rangeset
+    assert len(rangeset & empty) == 0
+    assert len(toolbox.RangeSet.from_cells([0, 1], DEPTH) & toolbox.RangeSet.from_cells([2], DEPTH)) == 0
+    assert empty.chunk_slices(16) == []
+    assert empty.degrade(0) == empty
+
+
+def test_rangeset_chunk_slices():
+    rangeset = toolbox.RangeSet(DEPTH, [[3, 5], [17, 18], [70, 75]])
+    # chunks 0 and 1 are adjacent and merged, chunk 4 is separate
+    assert rangeset.chunk_slices(16) == [slice(0, 32), slice(64, 80)]
+    assert rangeset.chunk_slices(1) == [slice(3, 5), slice(17, 18), slice(70, 75)]
+
+
+@pytest.mark.parametrize("chunks, chunk_size", [(None, None), (None, 16), (64, None), (100, 7)])
+@pytest.mark.parametrize("seed", [5, 6])
+def test_read_ranges_matches_isel(chunks, chunk_size, seed):
+    ds = get_dataset(chunks=chunks)
+    cells = get_cells(seed)
+    selected = toolbox.read_ranges(ds, toolbox.RangeSet.from_cells(cells, DEPTH), chunk_size=chunk_size)
+    xr.testing.assert_identical(selected.compute(), ds.isel(cell=cells).compute())
+
+
+@pytest.mark.parametrize("chunks", [None, 64])
+def test_read_ranges_empty_and_single(chunks):
+    ds = get_dataset(chunks=chunks)
+    empty = toolbox.read_ranges(ds, toolbox.RangeSet(DEPTH))
+    assert empty.sizes["cell"] == 0
+    assert set(empty.data_vars) == {"var"}
+    xr.testing.assert_identical(
+        toolbox.read_ranges(ds, toolbox.RangeSet(DEPTH, [[10, 30]])).compute(),
+        ds.isel(cell=slice(10, 30)).compute(),
+    )
+
+
+def test_read_ranges_needs_global_data():
+    ds = get_dataset().isel(cell=slice(1, None))
+    with pytest.raises(ValueError):
+        toolbox.read_ranges(ds, toolbox.RangeSet.from_cells([3], DEPTH))
@@ -0,0 +1,122 @@
+"""
+Tests of the cached nest/ring permutations, the pooled spherical harmonic derivatives and
+ShallowCircOperator against the per-map functions
+"""
+import healpy as hp
+import numpy as np
+import pytest
+import xarray as xr
+
+import toolbox
+
+NSIDE = 8
+
+
+def get_wind(nside=NSIDE, ntime=3, seed=0):
+    npix = hp.nside2npix(nside)
+    lon, lat = hp.pix2ang(nside, np.arange(npix), nest=True, lonlat=True)
+    rng = np.random.default_rng(seed)
+    # smooth fields, so that the transforms are accurate
+    ua, va = (
+        xr.DataArray(
+            np.cos(np.deg2rad(lat)) * (rng.standard_normal((ntime, 1)) + np.sin(np.deg2rad(k * lon))),
+            dims=("time", "cell"),
+            coords={"cell": np.arange(npix), "lon": ("cell", lon), "lat": ("cell", lat)},
+        )
+        for k in (1, 2)
+    )
+    return ua, va
+
+
+@pytest.mark.parametrize("nside", [1, 4, 32])
+def test_nest2ring_index_matches_healpy(nside):
+    ds = xr.Dataset(coords={"cell": np.arange(hp.nside2npix(nside))})
+    index = toolbox.nest2ring_index(ds, nside)
+    np.testing.assert_array_equal(index, hp.ring2nest(nside, np.arange(ds.cell.size)))
+    assert not index.flags.writeable
+    # ds.isel(cell=index) is in ring order
+    np.testing.assert_array_equal(
+        hp.nest2ring(nside, ds.cell.values[index]), np.arange(ds.cell.size)
+    )
+    np.testing.assert_array_equal(
+        toolbox._nest2ring_permutation(nside)[index], np.arange(ds.cell.size)
+    )
+
+    subset = ds.isel(cell=slice(0, None, 3))
+    np.testing.assert_array_equal(
+        toolbox.nest2ring_index(subset, nside), hp.ring2nest(nside, subset.cell.values)
+    )
+
+
+def test_permutations_are_cached():
+    assert toolbox._ring2nest_permutation(NSIDE) is toolbox._ring2nest_permutation(NSIDE)
+    assert toolbox._tan_lat_ring(NSIDE) is toolbox._tan_lat_ring(NSIDE)
+    assert not toolbox._tan_lat_ring(NSIDE).flags.writeable
+
+
+@pytest.mark.parametrize("maps_per_task, max_workers, use_processes", [
+    (16, 1, False), (1, 1, False), (2, 3, False), (3, 2, True),
+])
+def test_compute_hder_pool_matches_compute_hder(maps_per_task, max_workers, use_processes):
+    rng = np.random.default_rng(1)
+    var = rng.standard_normal((2, 3, hp.nside2npix(NSIDE)))
+    dvar_dtheta, dvar_dphi = toolbox.compute_hder_pool(
+        var, NSIDE, maps_per_task=maps_per_task, max_workers=max_workers, use_processes=use_processes
+    )
+    assert dvar_dtheta.shape == dvar_dphi.shape == var.shape
+    for idx in np.ndindex(var.shape[:-1]):
+        expected = toolbox.compute_hder(var[idx], NSIDE)
+        np.testing.assert_allclose(dvar_dtheta[idx], expected[0], rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(dvar_dphi[idx], expected[1], rtol=1e-12, atol=1e-12)
+
+
+def test_compute_hder_pool_lmax():
+    var = np.random.default_rng(2).standard_normal((2, hp.nside2npix(NSIDE)))
+    for der, expected in zip(
+        toolbox.compute_hder_pool(var, NSIDE, lmax=NSIDE),
+        zip(*(toolbox.compute_hder(v, NSIDE, lmax=NSIDE) for v in var)),
+    ):
+        np.testing.assert_allclose(der, np.stack(expected), rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize("chunks", [None, 1])
+def test_operator_conv_matches_compute_conv(chunks):
+    ua, va = get_wind()
+    if chunks is not None:
+        ua, va = ua.chunk(time=chunks), va.chunk(time=chunks)
+    conv = toolbox.ShallowCircOperator(NSIDE).conv(ua, va)
+    expected = toolbox.compute_conv(ua, va).sortby("cell")
+
+    assert conv.dims == ("time", "cell")
+    assert conv.dtype == np.float64
+    np.testing.assert_array_equal(conv.cell, ua.cell)
+    np.testing.assert_allclose(conv.values, expected.values, rtol=1e-10, atol=1e-16)
+
+
+def test_operator_hder_matches_compute_hder():
+    ua, _ = get_wind()
+    dvar_dtheta, dvar_dphi = toolbox.ShallowCircOperator(NSIDE).hder(ua)
+    ring = ua.isel(cell=toolbox.nest2ring_index(ua, NSIDE))
+    for t in range(ua.sizes["time"]):
+        expected = toolbox.compute_hder(ring.values[t], NSIDE)
+        nest = hp.nest2ring(NSIDE, np.arange(ua.cell.size))
+        np.testing.assert_allclose(dvar_dtheta.values[t], expected[0][nest], rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(dvar_dphi.values[t], expected[1][nest], rtol=1e-12, atol=1e-12)
+
+
+def test_operator_conv_in_workers():
+    ua, va = get_wind(ntime=5)
+    np.testing.assert_allclose(
+        toolbox.ShallowCircOperator(NSIDE, max_workers=2).conv(ua, va).values,
+        toolbox.ShallowCircOperator(NSIDE).conv(ua, va).values,
+        rtol=1e-12, atol=1e-16,
+    )
+
+
+def test_operator_needs_all_cells_in_order():
+    ua, va = get_wind()
+    op = toolbox.ShallowCircOperator(NSIDE)
+    with pytest.raises(ValueError):
+        op.conv(ua.isel(cell=slice(1, None)), va.isel(cell=slice(1, None)))
+    with pytest.raises(ValueError):
+        op.hder(ua.isel(cell=toolbox.nest2ring_index(ua, NSIDE)))
@@ -1,12 +1,23 @@
+import sys
+from multiprocessing import Pool
+from pathlib import Path
+
 import intake
-import easygems.healpix as egh
-import cartopy.crs as ccrs
+import numpy as np
+import pandas as pd
+import healpy as hp
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+import cartopy.crs as ccrs
 import cartopy.feature as cf
-import pandas as pd
 
-# Add this to the environment by running "conda install gif" while in the easygems env
-import gif
+# Add this to the environment by running "conda install imageio" while in the easygems env
+# (writing .mp4 files additionally needs "conda install imageio-ffmpeg")
+import imageio.v2 as imageio
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "hk25-LocExt"))
+from healpix_plot import HpResampler
 
 data_source = "um_glm_n1280_GAL9"
 zoom_level = 5
@@ -14,27 +25,89 @@ date_window = "2020-02" # To subset the data from the catalogue
 observable = "rlut" #  toa_outgoing_longwave_flux
 
 gif_pd_timerange = pd.date_range('2020-02-20 00:00:00', '2020-02-25 00:00:00', freq='2h')
-gif_filename = "example_rlut_Feb.gif"
+gif_filename = "example_rlut_Feb.gif" # Use a .mp4 ending to write a video instead
+frame_duration = 50 # Milliseconds per frame
+
+cmap = "bone_r"
+vmin, vmax = None, None # Fixed colour range, None scales every frame to its own range
+central_longitude = -135.5808361
+figsize = (8, 4)
+dpi = 100
+
+n_workers = 4 # Number of rendering processes
+load_batch = 4 * n_workers # Number of time steps loaded (and held in memory) at once
 
-cat = intake.open_catalog("https://digital-earths-global-hackathon.github.io/catalog/catalog.yaml")["UK"]
-ds = cat[data_source](zoom=zoom_level).to_dask()
+# Figure, image and resampler of the current rendering process, set up once by
+# init_renderer and re-used for every frame
+_renderer = {}
 
-fragment_da = ds[observable].sel(time=date_window) # Part of the DataArray used to generate the gif
 
-@gif.frame
-def worldmap(in_data, **kwargs):
-    projection = ccrs.Robinson(central_longitude=-135.5808361)
+def init_renderer(nside):
+    projection = ccrs.Robinson(central_longitude=central_longitude)
     fig, ax = plt.subplots(
-        figsize=(8, 4), subplot_kw={"projection": projection}, constrained_layout=True
+        figsize=figsize, dpi=dpi, subplot_kw={"projection": projection}, constrained_layout=True
     )
     ax.set_global()
-
-    egh.healpix_show(in_data, ax=ax, **kwargs)
     ax.add_feature(cf.COASTLINE, linewidth=0.8)
     ax.add_feature(cf.BORDERS, linewidth=0.4)
 
+    # Fix the layout once so that the axes (and hence the resampler) stay the same
+    fig.canvas.draw()
+    fig.set_layout_engine("none")
+
+    _, _, nx, ny = np.array(ax.bbox.bounds, dtype=int)
+    xlims = ax.get_xlim()
+    ylims = ax.get_ylim()
+    image = ax.imshow(
+        np.full((ny, nx), np.nan),
+        extent=xlims + ylims,
+        origin="lower",
+        cmap=cmap,
+        vmin=vmin,
+        vmax=vmax,
+    )
+    _renderer.update(
+        fig=fig,
+        image=image,
+        resampler=HpResampler(projection, xlims, ylims, nx, ny, nside, method="nearest"),
+    )
+
+
+def render_frame(values):
+    image = _renderer["image"]
+    image.set_data(_renderer["resampler"](values))
+    if vmin is None or vmax is None:
+        image.norm.vmin, image.norm.vmax = vmin, vmax
+        image.autoscale_None()
+
+    fig = _renderer["fig"]
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()
+
+
+def get_writer(filename):
+    if Path(filename).suffix.lower() == ".gif":
+        # The PIL GIF writer appends every frame to the file directly
+        return imageio.get_writer(
+            filename, format="GIF-PIL", mode="I", duration=frame_duration / 1000, loop=0
+        )
+    return imageio.get_writer(filename, mode="I", fps=1000 / frame_duration)
+
+
+def write_frames(da, times, filename):
+    nside = hp.npix2nside(da.shape[-1])
+    with Pool(n_workers, initializer=init_renderer, initargs=(nside,)) as pool, \
+            get_writer(filename) as writer:
+        for start in range(0, len(times), load_batch):
+            values = da.sel(time=times[start:start + load_batch]).values
+            for frame in pool.imap(render_frame, values):
+                writer.append_data(frame)
+
 
-frames = [worldmap(fragment_da.sel(time=t), cmap="bone_r") for t in gif_pd_timerange] ;
-gif.save(frames, gif_filename, duration=50)
+if __name__ == "__main__":
+    cat = intake.open_catalog("https://digital-earths-global-hackathon.github.io/catalog/catalog.yaml")["UK"]
+    ds = cat[data_source](zoom=zoom_level).to_dask()
 
+    fragment_da = ds[observable].sel(time=date_window) # Part of the DataArray used to generate the gif
 
+    write_frames(fragment_da, gif_pd_timerange, gif_filename)